@@ -0,0 +1,628 @@
+"""
+ESP32 UDP Lab - Benchmarks del monitor serial
+Mide el costo de las partes críticas de esp32_serial_monitor.py sin pantalla
+(QT_QPA_PLATFORM=offscreen) y con un dispositivo simulado (pty o loop://).
+Compara contra una línea base en JSON y marca las regresiones.
+Autor: Daniel Araque Studios
+
+Uso:
+    python benchmarks/bench_monitor.py                    # comparar con baseline.json
+    python benchmarks/bench_monitor.py --update-baseline  # guardar nueva línea base
+    python benchmarks/bench_monitor.py --only parse --threshold 0.15
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication, QFrame, QGridLayout, QScrollArea, QVBoxLayout, QWidget
+
+import esp32_protocol
+import esp32_serial_monitor as monitor
+import esp32_shared_state
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25   # 25 % peor que la línea base -> regresión
+THEME_PANELS = 32         # Paneles de dispositivo abiertos al medir el cambio de tema
+FRAME_BUDGET_MS = 1000.0 / 60
+
+
+# ===============================
+#  Dispositivo simulado
+# ===============================
+def device_cycle(seq, millis):
+    """Líneas que imprime main.ino en un ciclo de 250 ms"""
+    return [
+        f"🔄 Leyendo sensores... 🌡️ {22 + seq % 7 * 0.1:.1f}°C, 💧 {33 + seq % 5 * 0.2:.1f}% "
+        f"☀️ {seq % 100}% (raw:{seq * 37 % 4096})",
+        f"📤 [{seq}] UDP → 192.168.43.138:4211",
+        f"   📋 TEXTO: 23.0;33.3;{seq % 100};0;1;0;0;0;1",
+        "   📊 Formato: temp;hum;luz;led1;led2;led3;led4;error_dht;wifi_ok",
+        f"   ⏱️  Timestamp: {millis}",
+    ]
+
+
+STATUS_BLOCK = [
+    "═══════════════════════════════════════",
+    "📊 ESTADO ACTUAL DEL SISTEMA",
+    "⏱️  Tiempo funcionamiento: 3723 segundos",
+    "   📶 WiFi: CONECTADO",
+    "   🏠 IP ESP32: 192.168.43.57",
+    "   📱 IP Teléfono: 192.168.43.138",
+    "   🔧 RSSI: -61 dBm",
+    "   🌡️  Temperatura: 23.0°C",
+    "   💧 Humedad: 33.3%",
+    "   ☀️  Luminosidad: 45%",
+    "   ⚠️  Error DHT11: NO",
+    "   LED 1 (GPIO 5): 🟢 ON",
+    "   LED 2 (GPIO 18): 🔴 OFF",
+    "   📤 Mensajes enviados: 14892",
+    "   📥 Comandos recibidos: 12",
+]
+
+
+def device_lines(count):
+    """Generar `count` líneas con la mezcla real del firmware"""
+    lines = []
+    seq, millis = 0, 1000
+    while len(lines) < count:
+        seq += 1
+        millis += 250
+        lines.extend(device_cycle(seq, millis))
+        if seq % 20 == 0:
+            lines.append("🔍 DEBUG: Escuchando puerto 4210 - Sin paquetes recibidos")
+        if seq % 120 == 0:
+            lines.extend(STATUS_BLOCK)
+    return lines[:count]
+
+
+class FakeDevice:
+    """Extremo "ESP32" de un pty (POSIX) o de un puerto loop:// de pyserial"""
+
+    def __init__(self):
+        self.master_fd = None
+        self.port = None
+        self.thread = None
+        if hasattr(os, "openpty"):
+            import tty
+            self.master_fd, slave_fd = os.openpty()
+            tty.setraw(self.master_fd)
+            self.port = os.ttyname(slave_fd)
+            self._slave_fd = slave_fd
+        else:
+            self.port = "loop://"
+
+    def write_lines(self, lines, serial_thread):
+        """Escribir las líneas desde un hilo aparte (como lo haría la placa)"""
+        payload = "".join(f"{line}\r\n" for line in lines).encode("utf-8")
+
+        def writer():
+            view = memoryview(payload)
+            step = 4096
+            for start in range(0, len(view), step):
+                block = view[start:start + step]
+                if self.master_fd is not None:
+                    while block:
+                        written = os.write(self.master_fd, block)
+                        block = block[written:]
+                else:
+                    serial_thread.serial_port.write(block)
+
+        self.thread = threading.Thread(target=writer, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            os.close(self._slave_fd)
+
+
+# ===============================
+#  Utilidades de medición
+# ===============================
+def repeat(function, repeats=5):
+    """Mediana de varias ejecuciones (segundos)"""
+    samples = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (None si no se puede medir)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def process_events(app, seconds=0.0):
+    """Procesar eventos de Qt durante un tiempo"""
+    deadline = time.perf_counter() + seconds
+    app.processEvents()
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+# ===============================
+#  Benchmarks
+# ===============================
+def bench_serial_ingest(app, window):
+    """Líneas/s que SerialThread lee del puerto y emite"""
+    lines = device_lines(20000)
+    device = FakeDevice()
+    thread = monitor.SerialThread()
+    # Cola sin límite práctico: se mide la lectura, no la política de descarte
+    thread.line_queue = monitor.LineQueue(capacity=len(lines))
+    received = 0
+
+    if not thread.connect_serial(device.port):
+        raise RuntimeError(f"No se pudo abrir el dispositivo simulado {device.port}")
+    thread.start()
+    started = time.perf_counter()
+    device.write_lines(lines, thread)
+    deadline = started + 60
+    while received < len(lines) and time.perf_counter() < deadline:
+        batch = thread.line_queue.take(len(lines))
+        received += len(batch)
+        if not batch:
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    thread.disconnect_serial()
+    thread.wait(2000)
+    device.close()
+    return {"serial_ingest_lines_per_s": (received / elapsed, "lines/s", True)}
+
+
+def bench_backlog(app, window):
+    """Ráfaga más rápida que la UI: cola acotada, bloqueo de la UI y tiempo en ponerse al día"""
+    thread = window.serial_thread
+    thread.line_queue = monitor.LineQueue()
+    lines = device_lines(50000)
+    chunks = [("\n".join(lines[i:i + 500]) + "\n").encode("utf-8")
+              for i in range(0, len(lines), 500)]
+
+    # Un timer de 5 ms mide cuánto tarda la UI en volver al bucle de eventos
+    ticks = []
+    timer = QTimer()
+    timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+    timer.start(5)
+
+    def produce():
+        for chunk in chunks:
+            thread.process_chunk(chunk, time.monotonic())
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    while producer.is_alive():
+        process_events(app, 0.005)
+    burst_end = time.perf_counter()
+    while len(thread.line_queue):
+        process_events(app, 0.001)
+    caught_up = time.perf_counter()
+    timer.stop()
+
+    stats = thread.line_queue.snapshot()
+    stall = max(b - a for a, b in zip(ticks, ticks[1:])) if len(ticks) > 1 else 0.0
+    thread.line_queue = monitor.LineQueue()
+    window.clear_console()
+    for history in window.history.values():
+        history.clear()
+    return {
+        "backlog_peak_lines_50k_burst": (stats['high_water'], "lines", False),
+        "backlog_ui_stall_ms_50k_burst": (stall * 1e3, "ms", False),
+        "backlog_catchup_ms_50k_burst": ((caught_up - burst_end) * 1e3, "ms", False),
+    }
+
+
+def bench_parse(app, window):
+    """Líneas/s de esp32_protocol.parse_line y de ESP32Monitor.parse_esp32_data"""
+    lines = device_lines(20000)
+
+    def protocol_only():
+        for line in lines:
+            esp32_protocol.parse_line(line)
+
+    def full_parse():
+        for line in lines:
+            window.parse_esp32_data(line)
+
+    return {
+        "parse_line_lines_per_s": (len(lines) / repeat(protocol_only), "lines/s", True),
+        "parse_esp32_data_lines_per_s": (len(lines) / repeat(full_parse, 3), "lines/s", True),
+    }
+
+
+def bench_console(app, window):
+    """Costo de agregar una línea a la consola según el historial ya cargado"""
+    results = {}
+    line = device_lines(1)[0]
+    # Líneas distintas: las repetidas se colapsan y no agregan bloques
+    batch = device_lines(200)
+    for history in (0, 10000, 50000):
+        window.clear_console()
+        for chunk_start in range(0, history, 1000):
+            window.console_text.appendPlainText("\n".join([line] * min(1000, history - chunk_start)))
+        process_events(app)
+
+        def append_batch():
+            for batch_line in batch:
+                window.process_serial_data(batch_line)
+            process_events(app)
+
+        results[f"console_append_us_at_{history}"] = (repeat(append_batch, 3) / 200 * 1e6, "us", False)
+    window.clear_console()
+    return results
+
+
+def bench_search(app, window):
+    """Búsquedas en ConsoleHistory con un millón de líneas del firmware"""
+    lines = device_lines(1000000)
+    history = monitor.ConsoleHistory()
+    for i, line in enumerate(lines):
+        history.append(line, i * 0.05, esp32_protocol.line_type(line), esp32_protocol.line_level(line))
+    del lines
+    queries = {
+        "token": monitor.ConsoleQuery("DEBUG: Escuchando"),
+        "literal": monitor.ConsoleQuery("[123456]"),
+        "regex": monitor.ConsoleQuery(r"raw:40\d\d", regex=True),
+        "filter": monitor.ConsoleQuery("", types=["status"], level="warning"),
+    }
+    results = {"console_history_bytes_per_line": (history.nbytes / history.lines, "B", False)}
+    for name, query in queries.items():
+        results[f"search_{name}_ms_1m_lines"] = (
+            repeat(lambda: history.search(query, monitor.ESP32Monitor.SEARCH_LIMIT), 3) * 1e3,
+            "ms", False)
+    return results
+
+
+def bench_shared(app, window):
+    """Costo de publicar en memoria compartida y de leer el estado desde otro lado"""
+    publisher = esp32_shared_state.StatePublisher(f"esp32_bench_{os.getpid()}")
+    reader = esp32_shared_state.StateReader(publisher.name)
+    events = [event for line in device_lines(20000) for event in esp32_protocol.parse_line(line)]
+    try:
+        def publish():
+            for event in events:
+                publisher.publish(event, 1.0)
+
+        def read():
+            for _ in range(10000):
+                reader.read()
+
+        return {
+            "shared_publish_us_per_event": (repeat(publish) / len(events) * 1e6, "us", False),
+            "shared_read_us": (repeat(read) / 10000 * 1e6, "us", False),
+        }
+    finally:
+        reader.close()
+        publisher.close()
+
+
+def bench_session(app, window):
+    """Guardar y restaurar la instantánea de sesión con historiales de 24 h llenos"""
+    import numpy as np
+    for history in window.history.values():
+        records = np.zeros(history.capacity, dtype=history.HISTORY_DTYPE)
+        records['host_time'] = np.arange(history.capacity) * 0.25
+        records['value'] = 23.0
+        history.extend(records)
+    for line in device_lines(monitor.ESP32Monitor.CONSOLE_MAX_LINES):
+        window.record_console_line(line, 1.0, esp32_protocol.line_type(line), 'info')
+
+    with tempfile.TemporaryDirectory() as directory:
+        window.session_path = os.path.join(directory, "session.snap")
+        save = repeat(window.save_session)
+        size = os.path.getsize(window.session_path)
+
+        def restore():
+            window.restore_session(window.session_path)
+            window.temperature_plot.repaint()
+
+        restore_time = repeat(restore)
+        process_events(app)
+        window.session_path = None
+
+    for history in window.history.values():
+        history.clear()
+    window.clear_console()
+    return {
+        "session_save_ms_24h": (save * 1e3, "ms", False),
+        "session_restore_ms_24h": (restore_time * 1e3, "ms", False),
+        "session_snapshot_mb_24h": (size / 1e6, "MB", False),
+    }
+
+
+def bench_plot(app, window):
+    """Costo de actualizar y repintar la curva según la cantidad de puntos"""
+    import numpy as np
+    results = {}
+    for points in (100, 1000, 10000, 100000):
+        x = np.arange(points, dtype=np.float64)
+        y = 23.0 + np.sin(x / 50.0)
+
+        def update():
+            for _ in range(10):
+                window.temp_curve.setData(x, y)
+                window.temperature_plot.repaint()
+
+        results[f"plot_update_ms_at_{points}"] = (repeat(update, 3) / 10 * 1e3, "ms", False)
+    return results
+
+
+def bench_widgets(app, window):
+    """Costo de actualizar SensorCard y LEDControl"""
+    card = window.temp_card
+    stats = window.sensor_stats.stats('temperature')
+    led = window.led_controls['led1']
+    statuses = ("normal", "warning", "error", "normal")
+
+    def cards():
+        for i in range(1000):
+            card.update_value(f"{20 + i % 10:.1f}", statuses[i % 4])
+            card.update_stats(stats)
+
+    def leds():
+        for i in range(1000):
+            led.set_state(bool(i % 2))
+
+    return {
+        "sensor_card_update_us": (repeat(cards, 3) / 1000 * 1e6, "us", False),
+        "led_control_update_us": (repeat(leds, 3) / 1000 * 1e6, "us", False),
+    }
+
+
+def bench_startup(app, window):
+    """Tiempo desde el arranque del intérprete hasta la ventana visible"""
+    probe = (
+        "import os, sys, time; started = time.perf_counter(); "
+        f"sys.path.insert(0, {ROOT!r}); "
+        "from PyQt6.QtWidgets import QApplication; import esp32_serial_monitor as m; "
+        "app = QApplication([]); w = m.ESP32Monitor(); w.show(); app.processEvents(); "
+        "print(time.perf_counter() - started)"
+    )
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", probe], env=env, check=True,
+                       capture_output=True)
+        samples.append(time.perf_counter() - started)
+    return {"startup_ms": (statistics.median(samples) * 1e3, "ms", False)}
+
+
+def bench_rss(app, window):
+    """Memoria residente tras procesar una sesión larga (1 h a 4 Hz)"""
+    lines = device_lines(4 * 3600 * 5)
+    for start in range(0, len(lines), 2000):
+        for line in lines[start:start + 2000]:
+            window.process_serial_data(line)
+        app.processEvents()
+    gc.collect()
+    value = rss_mb()
+    if value is None:
+        return {}
+    return {"steady_state_rss_mb": (value, "MB", False)}
+
+
+def bench_memory(app, window):
+    """Bytes por lectura de una sesión de 24 h a 4 Hz según la representación"""
+    count = 24 * 3600 * 4
+    results = {}
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        kept = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        return current / count
+
+    def dicts():
+        return [{"sensor": "temperature", "value": 23.0 + i * 1e-6,
+                 "host_time": float(i), "device_ms": i * 250} for i in range(count)]
+
+    def float_lists():
+        return ([float(i) for i in range(count)], [23.0 + i * 1e-6 for i in range(count)])
+
+    def events():
+        return [esp32_protocol.SensorReading("temperature", 23.0 + i * 1e-6, float(i), i * 250)
+                for i in range(count)]
+
+    def history():
+        readings = monitor.ReadingHistory(count)
+        for i in range(count):
+            readings.append(float(i), 23.0 + i * 1e-6, i * 250)
+        return readings
+
+    results["reading_bytes_dict"] = (measure(dicts), "B", False)
+    results["reading_bytes_float_lists"] = (measure(float_lists), "B", False)
+    results["reading_bytes_slotted_event"] = (measure(events), "B", False)
+    results["reading_bytes_history"] = (measure(history), "B", False)
+    return results
+
+
+def device_panel(serial_thread):
+    """Panel de un dispositivo: 3 tarjetas de sensores, 4 LEDs y diagnósticos"""
+    panel = QFrame()
+    layout = QGridLayout(panel)
+    for column, (title, unit, icon, accent) in enumerate((("Temperatura", "°C", "🌡️", "red"),
+                                                          ("Humedad", "%", "💧", "blue"),
+                                                          ("Luminosidad", "%", "☀️", "orange"))):
+        layout.addWidget(monitor.SensorCard(title, unit, icon, accent), 0, column)
+    for column, pin in enumerate((5, 18, 36, 21)):
+        layout.addWidget(monitor.LEDControl(column + 1, pin, serial_thread), 1, column)
+    layout.addWidget(monitor.DiagnosticPanel(serial_thread), 2, 0, 1, 4)
+    return panel
+
+
+def bench_theme(app, window):
+    """Cambio de tema con 32 paneles de dispositivo abiertos
+
+    Mide el bloqueo más largo del event loop (debe caber en un cuadro) y el
+    tiempo hasta que todos los widgets tienen el tema nuevo."""
+    area = QScrollArea()
+    container = QWidget()
+    layout = QVBoxLayout(container)
+    for _ in range(THEME_PANELS):
+        layout.addWidget(device_panel(window.serial_thread))
+    area.setWidget(container)
+    area.setWidgetResizable(True)
+    area.resize(1400, 900)
+    area.show()
+    process_events(app, 0.2)
+
+    blocking, converge = [], []
+    for _ in range(6):
+        gc.collect()
+        started = time.perf_counter()
+        window.toggle_theme()
+        first_slice = time.perf_counter() - started
+        while window.repolisher.is_active:
+            app.processEvents()
+        converge.append(time.perf_counter() - started)
+        blocking.append(max(first_slice, window.repolisher.max_slice))
+
+    area.close()
+    area.deleteLater()
+    process_events(app)
+    if not window.is_dark_mode:
+        window.toggle_theme()
+    worst = max(blocking) * 1e3
+    print(f"   bloqueo máximo {worst:.1f} ms (cuadro: {FRAME_BUDGET_MS:.1f} ms)")
+    return {
+        "theme_switch_block_ms_32_panels": (worst, "ms", False),
+        "theme_switch_converge_ms_32_panels": (statistics.median(converge) * 1e3, "ms", False),
+    }
+
+
+BENCHMARKS = {
+    "ingest": bench_serial_ingest,
+    "backlog": bench_backlog,
+    "parse": bench_parse,
+    "console": bench_console,
+    "search": bench_search,
+    "shared": bench_shared,
+    "session": bench_session,
+    "plot": bench_plot,
+    "widgets": bench_widgets,
+    "startup": bench_startup,
+    "rss": bench_rss,
+    "memory": bench_memory,
+    "theme": bench_theme,
+}
+
+
+# ===============================
+#  Línea base y reporte
+# ===============================
+def compare(results, baseline, threshold):
+    """Listar las métricas que empeoraron más que `threshold`"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("metrics", {}).get(name)
+        if not reference or not reference["value"]:
+            continue
+        ratio = result["value"] / reference["value"]
+        change = 1.0 / ratio - 1.0 if result["higher_is_better"] else ratio - 1.0
+        result["change"] = change
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmarks del ESP32 Serial Monitor")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Archivo JSON de línea base")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Empeoramiento relativo tolerado (0.25 = 25 %%)")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="Ejecutar solo este benchmark (se puede repetir)")
+    parser.add_argument("--output", help="Guardar también los resultados en este JSON")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication([])
+    window = monitor.ESP32Monitor()
+    window.show()
+    process_events(app, 0.2)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"⏱️  {name}...", flush=True)
+        for metric, (value, unit, higher_is_better) in BENCHMARKS[name](app, window).items():
+            results[metric] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+    window.close()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+
+    print(f"\n{'Métrica':<36}{'Valor':>14}  {'Unidad':<8}{'vs base':>9}")
+    for metric, result in results.items():
+        change = result.get("change")
+        marker = "  ❌" if metric in regressions else ""
+        change_text = "--" if change is None else f"{change * 100:+.1f}%"
+        print(f"{metric:<36}{result['value']:>14.2f}  {result['unit']:<8}{change_text:>9}{marker}")
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor() or platform.machine()},
+        "metrics": {name: {k: v for k, v in r.items() if k != "change"} for name, r in results.items()},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        merged = baseline if args.only else {}
+        merged.setdefault("metrics", {}).update(report["metrics"])
+        merged["machine"] = report["machine"]
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2)
+        print(f"\n💾 Línea base actualizada: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regresiones sobre el {args.threshold * 100:.0f}% tolerado: "
+              + ", ".join(regressions))
+        return 1
+    print("\n✅ Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+ESP32 UDP Lab - Analizador de logs offline
+Procesa en paralelo los logs guardados por el monitor serial (💾 Guardar Log)
+y genera series temporales por campo y un resumen estadístico.
+Autor: Daniel Araque Studios
+
+Uso:
+    python esp32_log_analyzer.py sesion1.txt sesion2.txt -o resultados
+    python esp32_log_analyzer.py campaña/*.txt -o resultados --format parquet -j 8
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from array import array
+from multiprocessing import Pool
+
+import numpy as np
+
+import esp32_protocol
+
+
+# Campos que el analizador guarda como series numéricas
+NUMERIC_FIELDS = ('temperature', 'humidity', 'light', 'light_raw',
+                  'led1', 'led2', 'led3', 'led4', 'uptime_s',
+                  'messages_sent', 'commands_received', 'udp_send_seq',
+                  'device_ms', 'wifi_connected', 'dht_error', 'rssi_dbm')
+SENSOR_FIELDS = ('temperature', 'humidity', 'light')
+LED_FIELDS = tuple(f"led{i}" for i in range(1, esp32_protocol.LED_COUNT + 1))
+
+DEFAULT_CHUNK_MB = 16
+SECONDS_PER_DAY = 86400.0
+# millis() se desborda cada 2^32 ms; una caída mayor a esto es un reinicio
+MILLIS_WRAP = 2 ** 32
+
+
+def plan_chunks(paths, chunk_size):
+    """Dividir los archivos en bloques que empiezan y terminan en un salto de línea"""
+    chunks = []
+    for file_index, path in enumerate(paths):
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+                chunks.append((file_index, path, start, end))
+                start = end
+    return chunks
+
+
+def parse_chunk(task):
+    """Parsear un bloque de log (se ejecuta en un proceso del pool)
+
+    Retorna las series por campo como arrays compactos, los contadores y
+    el reloj del bloque: (primera hora, última hora, medianoches cruzadas),
+    con horas del día tal como aparecen en el log (None si ninguna línea
+    tiene marca). Las horas de las series ya suman un día por cada
+    medianoche cruzada dentro del bloque."""
+    file_index, path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='ignore')
+
+    times = {field: array('d') for field in NUMERIC_FIELDS}
+    values = {field: array('d') for field in NUMERIC_FIELDS}
+    counts = {'lines': 0, 'data_lines': 0, 'error_lines': 0, 'boot_banners': 0}
+    first = last = None
+    day_offset = 0.0
+
+    parse_timestamp = esp32_protocol.parse_log_timestamp
+    parse_line = esp32_protocol.parse_line
+    split_repeat = esp32_protocol.split_repeat
+    for line in text.splitlines():
+        # Las líneas repetidas llegan colapsadas como "texto (×N)"
+        line, repeats = split_repeat(line)
+        counts['lines'] += repeats
+        timestamp, data = parse_timestamp(line)
+        if timestamp is None:
+            # Mensajes propios del monitor (sin marca de tiempo)
+            continue
+        if last is None:
+            first = timestamp
+        elif timestamp < last - SECONDS_PER_DAY / 2:
+            day_offset += SECONDS_PER_DAY
+        last = timestamp
+        timestamp += day_offset
+        counts['data_lines'] += repeats
+        if esp32_protocol.is_error_line(data):
+            counts['error_lines'] += repeats
+        if esp32_protocol.BOOT_BANNER in data:
+            counts['boot_banners'] += repeats
+
+        # Solo se conoce la hora de la primera repetición
+        for event in parse_line(data):
+            if event.field in times:
+                times[event.field].append(timestamp)
+                values[event.field].append(float(event.value))
+
+    return file_index, times, values, counts, (first, last, day_offset)
+
+
+def chunk_shifts(results, file_count):
+    """Desplazamiento (s) que lleva cada bloque a una línea de tiempo común
+
+    Todos los campos de un archivo comparten su origen: la primera línea
+    con marca de tiempo. Los bloques siguientes continúan el día del
+    anterior (cruzando medianoche si la hora retrocede), y cada archivo
+    empieza tras el anterior dejando el hueco real entre la última línea
+    de uno y la primera del otro (menos de un día, el log no guarda la
+    fecha). El primer archivo empieza en 0."""
+    shifts = [None] * len(results)
+    position = None    # Fin del archivo anterior en la línea de tiempo
+    previous_last = None
+    for file_index in range(file_count):
+        start = last = None
+        day_offset = 0.0
+        members = []
+        for result_index, result in enumerate(results):
+            chunk_first, chunk_last, chunk_days = result[4]
+            if result[0] != file_index or chunk_first is None:
+                continue
+            if last is not None and chunk_first < last - SECONDS_PER_DAY / 2:
+                day_offset += SECONDS_PER_DAY
+            if start is None:
+                start = chunk_first
+            members.append((result_index, day_offset))
+            day_offset += chunk_days
+            last = chunk_last
+        if start is None:
+            continue
+
+        if position is None:
+            origin = 0.0
+        else:
+            origin = position + (start - previous_last) % SECONDS_PER_DAY
+        for result_index, chunk_offset in members:
+            shifts[result_index] = origin - start + chunk_offset
+        position = origin + last + day_offset - start
+        previous_last = last
+    return shifts
+
+
+def count_resets(series):
+    """Contar reinicios del ESP32 como caídas de un contador creciente"""
+    if len(series) < 2:
+        return 0
+    drops = np.diff(series) < 0
+    # Un desborde de millis() cae casi 2^32: no es un reinicio
+    wraps = np.diff(series) < -(MILLIS_WRAP // 2)
+    return int(np.count_nonzero(drops & ~wraps))
+
+
+def merge_results(results, file_count):
+    """Unir los bloques en series completas por campo (respetando el orden)
+
+    Las horas quedan en segundos desde la primera línea con marca del
+    primer archivo (ver chunk_shifts)."""
+    series = {}
+    totals = {'lines': 0, 'data_lines': 0, 'error_lines': 0, 'boot_banners': 0}
+    # Bloques en orden de archivo (pool.map ya respeta el orden dentro de cada uno)
+    order = sorted(range(len(results)), key=lambda i: results[i][0])
+    shifts = chunk_shifts(results, file_count)
+    for field in NUMERIC_FIELDS:
+        merged_times, merged_values = [], []
+        for result_index in order:
+            _, times, values, _, _ = results[result_index]
+            if shifts[result_index] is None or not len(times[field]):
+                continue
+            merged_times.append(np.frombuffer(times[field], dtype=np.float64) + shifts[result_index])
+            merged_values.append(np.frombuffer(values[field], dtype=np.float64))
+        if merged_times:
+            series[field] = (np.concatenate(merged_times), np.concatenate(merged_values))
+        else:
+            series[field] = (np.zeros(0), np.zeros(0))
+
+    for _, _, _, counts, _ in results:
+        for key, value in counts.items():
+            totals[key] += value
+    return series, totals
+
+
+def summarize(series, totals):
+    """Calcular el resumen por campo y los indicadores globales"""
+    rows = []
+    for field, (times, values) in series.items():
+        if len(values) == 0:
+            continue
+        finite = values[np.isfinite(values)]
+        rows.append({
+            'field': field,
+            'count': int(len(values)),
+            'nan_count': int(len(values) - len(finite)),
+            'min': float(finite.min()) if len(finite) else math.nan,
+            'mean': float(finite.mean()) if len(finite) else math.nan,
+            'max': float(finite.max()) if len(finite) else math.nan,
+            'first_s': float(times[0]),
+            'last_s': float(times[-1]),
+        })
+
+    led_toggles = {field: int(np.count_nonzero(np.diff(series[field][1])))
+                   for field in LED_FIELDS if len(series[field][1]) > 1}
+    device_ms = series['device_ms'][1]
+    uptime = series['uptime_s'][1]
+    indicators = {
+        'lines': totals['lines'],
+        'data_lines': totals['data_lines'],
+        'error_lines': totals['error_lines'],
+        'dht_errors': int(np.count_nonzero(np.isnan(series['temperature'][1]))),
+        'boot_banners': totals['boot_banners'],
+        'uptime_resets': count_resets(device_ms) if len(device_ms) > 1 else count_resets(uptime),
+        'led_toggles': sum(led_toggles.values()),
+    }
+    for field, toggles in led_toggles.items():
+        indicators[f"{field}_toggles"] = toggles
+    return rows, indicators
+
+
+def write_csv(output_dir, series, rows, indicators):
+    """Guardar series y resumen en CSV"""
+    for field, (times, values) in series.items():
+        if len(values) == 0:
+            continue
+        np.savetxt(os.path.join(output_dir, f"series_{field}.csv"),
+                   np.column_stack((times, values)), delimiter=',',
+                   header='time_s,value', comments='', fmt=('%.3f', '%.6g'))
+
+    columns = ['field', 'count', 'nan_count', 'min', 'mean', 'max', 'first_s', 'last_s']
+    with open(os.path.join(output_dir, 'summary.csv'), 'w', encoding='utf-8') as f:
+        f.write(','.join(columns) + '\n')
+        for row in rows:
+            f.write(','.join(str(row[c]) for c in columns) + '\n')
+
+    with open(os.path.join(output_dir, 'indicators.csv'), 'w', encoding='utf-8') as f:
+        f.write('indicator,value\n')
+        for key, value in indicators.items():
+            f.write(f"{key},{value}\n")
+
+
+def write_parquet(output_dir, series, rows, indicators):
+    """Guardar series y resumen en Parquet (requiere pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("❌ El formato parquet requiere pyarrow: pip install pyarrow")
+
+    for field, (times, values) in series.items():
+        if len(values) == 0:
+            continue
+        table = pa.table({'time_s': times, 'value': values})
+        pq.write_table(table, os.path.join(output_dir, f"series_{field}.parquet"))
+
+    pq.write_table(pa.Table.from_pylist(rows), os.path.join(output_dir, 'summary.parquet'))
+    pq.write_table(pa.table({'indicator': list(indicators), 'value': list(indicators.values())}),
+                   os.path.join(output_dir, 'indicators.parquet'))
+
+
+def analyze(paths, workers=None, chunk_size=DEFAULT_CHUNK_MB * 1024 * 1024):
+    """Analizar uno o más logs; retorna (series, filas de resumen, indicadores)"""
+    chunks = plan_chunks(paths, chunk_size)
+    if workers == 1 or len(chunks) <= 1:
+        results = [parse_chunk(chunk) for chunk in chunks]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(parse_chunk, chunks, chunksize=1)
+    series, totals = merge_results(results, len(paths))
+    rows, indicators = summarize(series, totals)
+    return series, rows, indicators
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Analiza logs del ESP32 Serial Monitor en paralelo")
+    parser.add_argument('logs', nargs='+', help="Archivos de log (en orden cronológico)")
+    parser.add_argument('-o', '--output', default='analisis_log',
+                        help="Directorio de salida (por defecto: analisis_log)")
+    parser.add_argument('-f', '--format', choices=('csv', 'parquet'), default='csv',
+                        help="Formato de salida")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Procesos en paralelo (por defecto: núcleos disponibles)")
+    parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_MB,
+                        help="Tamaño de cada bloque en MB")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    total_bytes = sum(os.path.getsize(path) for path in args.logs)
+    series, rows, indicators = analyze(args.logs, args.workers,
+                                       max(1, int(args.chunk_mb * 1024 * 1024)))
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.format == 'parquet':
+        write_parquet(args.output, series, rows, indicators)
+    else:
+        write_csv(args.output, series, rows, indicators)
+
+    elapsed = time.perf_counter() - started
+    print(f"📊 {indicators['lines']} líneas ({total_bytes / 1e6:.1f} MB) en {elapsed:.2f} s "
+          f"→ {total_bytes / 1e6 / elapsed:.1f} MB/s")
+    for row in rows:
+        if row['field'] in SENSOR_FIELDS:
+            print(f"   {row['field']}: n={row['count']} min={row['min']:.1f} "
+                  f"media={row['mean']:.2f} max={row['max']:.1f} (nan={row['nan_count']})")
+    print(f"   ❌ Líneas de error: {indicators['error_lines']} | "
+          f"💡 Cambios de LED: {indicators['led_toggles']} | "
+          f"🔄 Reinicios: {indicators['uptime_resets']}")
+    print(f"✅ Resultados en: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+ESP32 UDP Lab - Protocolo serial
+Patrones de las líneas que imprime main.ino y su conversión a eventos tipados.
+No depende de PyQt6: lo usan el monitor y las herramientas de análisis offline.
+Autor: Daniel Araque Studios
+"""
+
+import math
+import re
+
+
+# Prefijo que agrega el monitor a cada línea de la consola: [HH:MM:SS.mmm]
+LOG_TIMESTAMP_RE = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\.(\d{3})\] ?")
+
+# Sufijo con el que el monitor colapsa líneas idénticas consecutivas: "texto (×N)"
+REPEAT_SUFFIX_RE = re.compile(r" \(×(\d+)\)$")
+
+# Envío UDP en enviarDatosSensores()
+UDP_SEND_RE = re.compile(r"📤 \[(\d+)\] UDP →")
+UDP_TEXT_RE = re.compile(r"TEXTO:\s*(.*)$")
+DEVICE_TIMESTAMP_RE = re.compile(r"Timestamp:\s*(\d+)")
+
+# Bloque de estado de mostrarEstadoSistema()
+IP_ESP32_RE = re.compile(r"IP ESP32:\s*(\S+)")
+IP_PHONE_RE = re.compile(r"IP Teléfono:\s*(\S+)")
+WIFI_RE = re.compile(r"WiFi:\s*(DESCONECTADO|CONECTADO)")
+UPTIME_RE = re.compile(r"Tiempo funcionamiento:\s*(\d+) segundos")
+TEMPERATURE_RE = re.compile(r"Temperatura:\s*([0-9.-]+|nan)")
+HUMIDITY_RE = re.compile(r"Humedad:\s*([0-9.-]+|nan)")
+LIGHT_RE = re.compile(r"Luminosidad:\s*([0-9.-]+)")
+DHT_ERROR_RE = re.compile(r"Error DHT11:\s*(SÍ|NO)")
+MESSAGES_SENT_RE = re.compile(r"Mensajes enviados:\s*(\d+)")
+COMMANDS_RECEIVED_RE = re.compile(r"Comandos recibidos:\s*(\d+)")
+
+# Bloque de mostrarInformacionRed() (comando 'red') y RSSI del bloque de estado
+RSSI_RE = re.compile(r"RSSI:\s*(-?\d+)")
+SSID_RE = re.compile(r"SSID:\s*(.+?)\s*$")
+LINK_STATE_RE = re.compile(r"🔐 Estado:\s*(DESCONECTADO|CONECTADO)")
+IP_LOCAL_RE = re.compile(r"IP Local:\s*(\S+)")
+GATEWAY_RE = re.compile(r"Gateway:\s*(\S+)")
+PHONE_TARGET_RE = re.compile(r"Teléfono destino:\s*(\S+)")
+LOCAL_PORT_RE = re.compile(r"Puerto local \(escucha\):\s*(\d+)")
+REMOTE_PORT_RE = re.compile(r"Puerto remoto \(envío\):\s*(\d+)")
+
+# Lectura periódica de leerSensores() (4 Hz)
+READING_DHT_RE = re.compile(r"🌡️?\s*([0-9.-]+|nan)°C,\s*💧\s*([0-9.-]+|nan)%")
+READING_LDR_RE = re.compile(r"☀️?\s*(\d+)%\s*\(raw:(\d+)\)")
+
+# Estados de LEDs (bloque de estado, comandos UDP y comandos de prueba)
+LED_STATE_RE = re.compile(r"LED (\d+).*?GPIO (\d+).*?(ENCENDIDO|APAGADO|ON|OFF)")
+LED_TEST_RE = re.compile(r"TEST LED (\d+):.*?(ENCENDIDO|APAGADO)")
+LED_ALL_RE = re.compile(r"TODOS LOS LEDs (ENCENDIDOS|APAGADOS)")
+
+# Banner de setup(): el ESP32 arrancó
+BOOT_BANNER = "ESP32 UDP MICROCONTROLLER LAB"
+
+# Líneas que el firmware imprime sin que se lo pidan (la mayoría a 4 Hz):
+# a la velocidad correcta aparecen enteras, a otra solo llega basura
+BAUD_MARKERS = (BOOT_BANNER, "Leyendo sensores", "UDP →", "TEXTO:", "Timestamp:",
+                "ESTADO ACTUAL", "RSSI:")
+
+LED_COUNT = 4
+
+# millis() del ESP32 desconocido (la línea no trae marca del dispositivo)
+NO_DEVICE_TIME = None
+
+# Clasificación de líneas para filtrar el historial de la consola.
+# 'monitor' son los mensajes propios del monitor (no vienen del ESP32).
+LINE_TYPES = ('sensor', 'led', 'udp', 'network', 'status', 'command', 'debug', 'monitor', 'other')
+LINE_LEVELS = ('info', 'warning', 'error')
+UDP_MARKERS = ("UDP", "Formato:")
+COMMAND_MARKERS = ("COMANDO RECIBIDO", "Comando", "Desde:", "Tamaño:", "Procesando")
+STATUS_MARKERS = ("ESTADO", "═", "Memoria libre", "Frecuencia", "ESTADÍSTICAS")
+
+
+# ===============================
+#  Eventos del protocolo
+# ===============================
+class Event:
+    """Evento reconocido en una línea del ESP32
+
+    Todos los eventos exponen `field` y `value`; las subclases usan
+    __slots__ para que millones de eventos no paguen un dict cada uno.
+    Se crean por cada línea parseada, así que los constructores asignan
+    los slots directamente en lugar de encadenar super().__init__."""
+    __slots__ = ('field', 'value')
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.field}={self.value!r})"
+
+
+class SensorReading(Event):
+    """Lectura de un sensor: 'temperature', 'humidity', 'light', 'light_raw'
+    o 'dht_error' (1.0 = error). NaN indica una lectura fallida."""
+    __slots__ = ('host_time', 'device_ms')
+
+    def __init__(self, sensor, value, host_time=None, device_ms=NO_DEVICE_TIME):
+        self.field = sensor
+        self.value = float(value)
+        self.host_time = host_time
+        self.device_ms = device_ms
+
+    @property
+    def sensor(self):
+        return self.field
+
+
+class LedState(Event):
+    """Estado de un LED; `field` es 'led1'..'led4'"""
+    __slots__ = ('led', 'gpio')
+
+    def __init__(self, led, is_on, gpio=None):
+        self.field = f"led{led}"
+        self.value = bool(is_on)
+        self.led = led
+        self.gpio = gpio
+
+    @property
+    def is_on(self):
+        return self.value
+
+
+class CounterUpdate(Event):
+    """Contador del firmware: 'uptime_s', 'messages_sent', 'commands_received',
+    'udp_send_seq' (número del envío UDP) o 'device_ms' (millis())"""
+    __slots__ = ()
+
+    def __init__(self, counter, value):
+        self.field = counter
+        self.value = int(value)
+
+
+class NetworkInfo(Event):
+    """Dato de red: 'ip_esp32', 'ip_phone', 'wifi_connected', 'rssi_dbm', 'ssid',
+    'gateway', 'local_port' o 'remote_port'"""
+    __slots__ = ()
+
+
+class UdpPayload(Event):
+    """Texto de un mensaje UDP impreso como 'TEXTO:' ('udp_payload')"""
+    __slots__ = ()
+
+    def __init__(self, text):
+        self.field = 'udp_payload'
+        self.value = text
+
+
+def parse_log_timestamp(line):
+    """Separar el prefijo [HH:MM:SS.mmm] de una línea de log
+
+    Retorna (segundos desde medianoche, texto) o (None, línea) si no tiene."""
+    match = LOG_TIMESTAMP_RE.match(line)
+    if not match:
+        return None, line
+    hours, minutes, seconds, millis = (int(g) for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000.0, line[match.end():]
+
+
+def split_repeat(line):
+    """Separar el sufijo de repeticiones ' (×N)' de una línea de log
+
+    Retorna (línea sin sufijo, repeticiones)."""
+    if not line.endswith(")") or "(×" not in line:
+        return line, 1
+    match = REPEAT_SUFFIX_RE.search(line)
+    if not match:
+        return line, 1
+    return line[:match.start()], int(match.group(1))
+
+
+def parse_rssi(data):
+    """RSSI en dBm de una línea con 'RSSI:' (None si no lo tiene)
+
+    Es la única parte que necesita el muestreo de enlace de SerialThread."""
+    if "RSSI:" not in data:
+        return None
+    match = RSSI_RE.search(data)
+    return int(match.group(1)) if match else None
+
+
+def baud_score(sample):
+    """Líneas del firmware reconocidas en bytes leídos a una velocidad de prueba
+
+    Solo se juzgan las líneas completas (entre el primer y el último salto
+    de línea). Retorna -1 si no son UTF-8 válido, lo habitual al leer con
+    una velocidad equivocada."""
+    start = sample.find(b"\n")
+    end = sample.rfind(b"\n")
+    if start == end:
+        return 0
+    try:
+        text = sample[start + 1:end].decode('utf-8')
+    except UnicodeDecodeError:
+        return -1
+    return sum(1 for line in text.split("\n") if any(marker in line for marker in BAUD_MARKERS))
+
+
+def is_error_line(line):
+    """Indicar si la línea reporta un error del firmware"""
+    return "❌" in line
+
+
+def line_level(line):
+    """Nivel de la línea: 'error' (❌), 'warning' (⚠️) o 'info'"""
+    if "❌" in line:
+        return 'error'
+    if "⚠" in line:
+        return 'warning'
+    return 'info'
+
+
+def line_type(data, events=None):
+    """Tipo de la línea (uno de LINE_TYPES) según los eventos que contiene
+
+    `events` es el resultado de parse_line(data) si quien llama ya lo tiene."""
+    if events is None:
+        events = parse_line(data)
+    if events:
+        event = events[0]
+        if isinstance(event, SensorReading):
+            return 'sensor'
+        if isinstance(event, LedState):
+            return 'led'
+        if isinstance(event, UdpPayload) or event.field in ('udp_send_seq', 'device_ms'):
+            return 'udp'
+        if isinstance(event, NetworkInfo):
+            return 'network'
+        return 'status'
+    if "DEBUG:" in data:
+        return 'debug'
+    if any(marker in data for marker in COMMAND_MARKERS):
+        return 'command'
+    if any(marker in data for marker in UDP_MARKERS):
+        return 'udp'
+    if any(marker in data for marker in STATUS_MARKERS):
+        return 'status'
+    return 'other'
+
+
+def parse_line(data):
+    """Extraer los eventos de una línea del ESP32
+
+    Retorna una lista (normalmente de 0 o 1 elementos) de SensorReading,
+    LedState, CounterUpdate, NetworkInfo o UdpPayload. Las lecturas salen
+    sin marcas de tiempo: las completa quien conoce el reloj del host."""
+    events = []
+
+    # Envíos UDP (4 Hz, se revisan primero)
+    if "UDP →" in data:
+        match = UDP_SEND_RE.search(data)
+        if match:
+            events.append(CounterUpdate('udp_send_seq', match.group(1)))
+        return events
+
+    if "TEXTO:" in data:
+        events.append(UdpPayload(UDP_TEXT_RE.search(data).group(1).strip()))
+        return events
+
+    if "Timestamp:" in data:
+        match = DEVICE_TIMESTAMP_RE.search(data)
+        if match:
+            events.append(CounterUpdate('device_ms', match.group(1)))
+        return events
+
+    if "Formato:" in data:
+        # Descripción fija del mensaje UDP: no trae datos
+        return events
+
+    # Lectura periódica (4 Hz): DHT11 y, si no hubo error, la luminosidad
+    if "Leyendo sensores" in data:
+        if "Error leyendo DHT11" in data:
+            events.append(SensorReading('dht_error', True))
+            events.append(SensorReading('temperature', math.nan))
+            events.append(SensorReading('humidity', math.nan))
+        else:
+            match = READING_DHT_RE.search(data)
+            if match:
+                events.append(SensorReading('temperature', match.group(1)))
+                events.append(SensorReading('humidity', match.group(2)))
+        if "raw:" in data:
+            match = READING_LDR_RE.search(data)
+            if match:
+                events.append(SensorReading('light', match.group(1)))
+                events.append(SensorReading('light_raw', match.group(2)))
+        return events
+
+    # Buscar información de red
+    if "IP ESP32:" in data:
+        match = IP_ESP32_RE.search(data)
+        if match:
+            events.append(NetworkInfo('ip_esp32', match.group(1)))
+
+    elif "IP Teléfono:" in data:
+        match = IP_PHONE_RE.search(data)
+        if match:
+            events.append(NetworkInfo('ip_phone', match.group(1)))
+
+    elif "WiFi:" in data:
+        match = WIFI_RE.search(data)
+        if match:
+            events.append(NetworkInfo('wifi_connected', match.group(1) == "CONECTADO"))
+
+    elif "Tiempo funcionamiento:" in data:
+        match = UPTIME_RE.search(data)
+        if match:
+            events.append(CounterUpdate('uptime_s', match.group(1)))
+
+    # Buscar datos de sensores
+    elif "Temperatura:" in data:
+        match = TEMPERATURE_RE.search(data)
+        if match:
+            events.append(SensorReading('temperature', match.group(1)))
+
+    elif "Humedad:" in data:
+        match = HUMIDITY_RE.search(data)
+        if match:
+            events.append(SensorReading('humidity', match.group(1)))
+
+    elif "Luminosidad:" in data:
+        match = LIGHT_RE.search(data)
+        if match:
+            events.append(SensorReading('light', match.group(1)))
+
+    elif "Error DHT11:" in data:
+        match = DHT_ERROR_RE.search(data)
+        if match:
+            events.append(SensorReading('dht_error', match.group(1) == "SÍ"))
+
+    # Información de red detallada (llega con menos frecuencia)
+    elif "RSSI:" in data:
+        rssi = parse_rssi(data)
+        if rssi is not None:
+            events.append(NetworkInfo('rssi_dbm', rssi))
+
+    elif "SSID:" in data:
+        match = SSID_RE.search(data)
+        if match:
+            events.append(NetworkInfo('ssid', match.group(1)))
+
+    elif "🔐 Estado:" in data:
+        match = LINK_STATE_RE.search(data)
+        if match:
+            events.append(NetworkInfo('wifi_connected', match.group(1) == "CONECTADO"))
+
+    elif "IP Local:" in data:
+        match = IP_LOCAL_RE.search(data)
+        if match:
+            events.append(NetworkInfo('ip_esp32', match.group(1)))
+
+    elif "Gateway:" in data:
+        match = GATEWAY_RE.search(data)
+        if match:
+            events.append(NetworkInfo('gateway', match.group(1)))
+
+    elif "Teléfono destino:" in data:
+        match = PHONE_TARGET_RE.search(data)
+        if match:
+            events.append(NetworkInfo('ip_phone', match.group(1)))
+
+    elif "Puerto local" in data:
+        match = LOCAL_PORT_RE.search(data)
+        if match:
+            events.append(NetworkInfo('local_port', int(match.group(1))))
+
+    elif "Puerto remoto" in data:
+        match = REMOTE_PORT_RE.search(data)
+        if match:
+            events.append(NetworkInfo('remote_port', int(match.group(1))))
+
+    # Luminosidad en su propia línea (tras un error del DHT11)
+    if "raw:" in data:
+        match = READING_LDR_RE.search(data)
+        if match:
+            events.append(SensorReading('light', match.group(1)))
+            events.append(SensorReading('light_raw', match.group(2)))
+            return events
+
+    # Buscar estados de LEDs
+    if "LED" in data:
+        match = LED_STATE_RE.search(data)
+        if match:
+            events.append(LedState(int(match.group(1)), match.group(3) in ("ENCENDIDO", "ON"),
+                                   int(match.group(2))))
+        else:
+            match = LED_TEST_RE.search(data)
+            if match:
+                events.append(LedState(int(match.group(1)), match.group(2) == "ENCENDIDO"))
+            else:
+                match = LED_ALL_RE.search(data)
+                if match:
+                    is_on = match.group(1) == "ENCENDIDOS"
+                    events.extend(LedState(i, is_on) for i in range(1, LED_COUNT + 1))
+
+    # Buscar contadores de mensajes (las regex solo si aparece la etiqueta)
+    if "Mensajes enviados:" in data:
+        match = MESSAGES_SENT_RE.search(data)
+        if match:
+            events.append(CounterUpdate('messages_sent', match.group(1)))
+
+    if "Comandos recibidos:" in data:
+        match = COMMANDS_RECEIVED_RE.search(data)
+        if match:
+            events.append(CounterUpdate('commands_received', match.group(1)))
+
+    return events
@@ -4,38 +4,146 @@ Interfaz moderna en PyQt6 para monitorear el ESP32 UDP Lab
 Autor: Daniel Araque Studios
 """
 
+import os
 import sys
+import argparse
+import cProfile
+import functools
 import serial
 import serial.tools.list_ports
 import json
 import re
+import math
+import socket
+import time
+import threading
+from array import array
+from collections import OrderedDict, deque
 from datetime import datetime
+from string import Template
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QGridLayout, QLabel, QPushButton, 
-                            QComboBox, QTextEdit, QGroupBox, QFrame, QSplitter,
-                            QStatusBar, QMenuBar, QMenu, QScrollArea, QProgressBar)
+                            QComboBox, QPlainTextEdit, QGroupBox, QFrame, QSplitter,
+                            QStatusBar, QMenuBar, QMenu, QScrollArea, QProgressBar,
+                            QSpinBox, QLineEdit, QCheckBox)
 from PyQt6.QtCore import QThread, pyqtSignal, QTimer, Qt, QPropertyAnimation, QEasingCurve
-from PyQt6.QtGui import QFont, QPixmap, QIcon, QPalette, QColor, QAction
+from PyQt6.QtGui import QFont, QPixmap, QIcon, QPalette, QColor, QAction, QTextCursor
 import pyqtgraph as pg
+import numpy as np
+
+import esp32_protocol
+import esp32_session
+import esp32_shared_state
 
 
 class SerialThread(QThread):
-    """Hilo para manejar la comunicación serial sin bloquear la UI"""
-    data_received = pyqtSignal(str)
+    """Hilo para manejar la comunicación serial sin bloquear la UI
+    
+    Las líneas no viajan una por señal: van a `line_queue` (LineQueue,
+    acotada) y la UI las saca por lotes al recibir `lines_ready`."""
+    lines_ready = pyqtSignal()             # line_queue pasó de vacía a tener líneas
+    capture_error = pyqtSignal(str)
     connection_status = pyqtSignal(bool)
+    reconnecting = pyqtSignal(int, float)  # intento, espera (s)
+    reconnected = pyqtSignal(str, float)   # puerto, tiempo caído (s)
+    link_sample = pyqtSignal(int, float)   # RSSI (dBm), time.monotonic() de la línea
+    baud_detected = pyqtSignal(int, int)   # velocidad (0 = no detectada), líneas reconocidas
+    
+    # Velocidades ofrecidas (8N1); el ESP32 arranca a DEFAULT_BAUDRATE
+    BAUD_RATES = (9600, 57600, 115200, 230400, 460800, 921600, 1000000, 1500000, 2000000)
+    DEFAULT_BAUDRATE = 115200
+    # Orden de prueba de la detección automática: primero la del firmware
+    AUTO_BAUD_ORDER = (115200, 2000000, 1500000, 1000000, 921600, 460800, 230400, 57600, 9600)
+    BAUD_PROBE_TIME = 0.8   # s escuchando cada velocidad (el firmware imprime a 4 Hz)
+    
+    # Backoff exponencial para la reconexión automática
+    RECONNECT_BASE_DELAY = 0.25
+    RECONNECT_MAX_DELAY = 8.0
+    # Límite de una línea incompleta antes de forzar su emisión
+    MAX_PARTIAL_LINE = 64 * 1024
+    
+    # Cola de comandos salientes (la drena el propio hilo de E/S)
+    COMMAND_QUEUE_SIZE = 64
+    DEFAULT_COMMAND_RATE = 5.0   # comandos/s (0 = sin límite)
+    COMMAND_BURST = 4            # comandos que pueden salir juntos
+    # Comandos que solo imprimen información: repetirlos no aporta nada
+    IDEMPOTENT_COMMANDS = {"status", "estado", "red", "network", "help", "ayuda"}
+    # Comandos que alternan un LED: dos pendientes iguales se anulan
+    TOGGLE_COMMANDS = {"test1", "test2", "test3", "test4"}
+    # Comandos que fijan todos los LEDs y dejan sin efecto los anteriores
+    LED_OVERRIDE_COMMANDS = {"allon", "alloff"}
     
     def __init__(self):
         super().__init__()
         self.serial_port = None
         self.is_running = False
-        
-    def connect_serial(self, port, baudrate=115200):
-        """Conectar al puerto serial"""
+        self.port_name = None
+        self.baudrate = self.DEFAULT_BAUDRATE
+        self.serial_number = None
+        self.auto_reconnect = True
+        
+        # Bytes de una línea aún sin terminar (se conservan entre reconexiones)
+        self._partial_line = b""
+        
+        # Estadísticas de caídas
+        self.reconnect_count = 0
+        self.total_downtime = 0.0
+        self.last_downtime = 0.0
+        self.down_since = None
+        
+        # Cola de comandos y limitador de tasa (token bucket)
+        self._command_lock = threading.Lock()
+        self._commands = deque()
+        self.command_rate = self.DEFAULT_COMMAND_RATE
+        self._command_tokens = float(self.COMMAND_BURST)
+        self._last_refill = time.monotonic()
+        
+        # Estadísticas de comandos
+        self.commands_sent = 0
+        self.commands_coalesced = 0
+        self.commands_dropped = 0
+        self.write_calls = 0
+        
+        # Cambios de velocidad pedidos por la UI (los aplica el hilo de E/S)
+        self.requested_baudrate = None
+        self.detect_baud = False
+        
+        # Líneas hacia la UI y copia en disco (SerialCapture, None = sin captura)
+        self.line_queue = LineQueue()
+        self.capture = None
+        
+        # Tráfico recibido (para ThroughputProbe)
+        self.bytes_received = 0
+        self.lines_received = 0
+        
+        # Consultas periódicas de la calidad del enlace WiFi
+        self.link_sampler = LinkQualitySampler()
+        
+        # Perfilador solicitado por ProfilerSession (None = desactivado)
+        self.profiler = None
+        self.profiler_active = False
+        self.thread_ident = None
+        
+    def connect_serial(self, port, baudrate=DEFAULT_BAUDRATE, auto_baud=False):
+        """Conectar al puerto serial (acepta también URLs de pyserial, p. ej. loop://)
+        
+        Con `auto_baud` el hilo detecta la velocidad al arrancar (ver
+        detect_baudrate); mientras tanto el puerto queda abierto a `baudrate`."""
         try:
             if self.serial_port and self.serial_port.is_open:
                 self.serial_port.close()
                 
-            self.serial_port = serial.Serial(port, baudrate, timeout=1)
+            self.serial_port = serial.serial_for_url(port, baudrate, timeout=1)
+            self.port_name = port
+            self.baudrate = baudrate
+            self.serial_number = self.lookup_serial_number(port)
+            self._partial_line = b""
+            self.down_since = None
+            with self._command_lock:
+                self._commands.clear()
+            self.link_sampler.reset(time.monotonic())
+            self.requested_baudrate = None
+            self.detect_baud = auto_baud
             self.is_running = True
             self.connection_status.emit(True)
             return True
@@ -51,54 +159,1960 @@ class SerialThread(QThread):
         self.connection_status.emit(False)
     
     def send_command(self, command):
-        """Enviar comando al ESP32"""
-        try:
-            if self.serial_port and self.serial_port.is_open:
-                self.serial_port.write(f"{command}\n".encode('utf-8'))
-                return True
-        except Exception as e:
+        """Encolar un comando para el ESP32
+        
+        No escribe en el puerto: el hilo de E/S drena la cola respetando
+        `command_rate`, así la UI nunca se bloquea. Retorna False si no hay
+        conexión o la cola está llena."""
+        if not self.is_running:
             return False
-        return False
+        
+        with self._command_lock:
+            queued = self._commands
+            
+            if command in self.IDEMPOTENT_COMMANDS and command in queued:
+                self.commands_coalesced += 1
+                return True
+            
+            if command in self.TOGGLE_COMMANDS and command in queued:
+                # Dos alternancias seguidas del mismo LED se anulan
+                queued.remove(command)
+                self.commands_coalesced += 2
+                return True
+            
+            if command in self.LED_OVERRIDE_COMMANDS:
+                superseded = self.TOGGLE_COMMANDS | self.LED_OVERRIDE_COMMANDS
+                kept = [c for c in queued if c not in superseded]
+                self.commands_coalesced += len(queued) - len(kept)
+                queued.clear()
+                queued.extend(kept)
+            
+            if len(queued) >= self.COMMAND_QUEUE_SIZE:
+                self.commands_dropped += 1
+                return False
+            
+            queued.append(command)
+        return True
+    
+    def set_baudrate(self, baudrate):
+        """Pedir un cambio de velocidad sin reconectar (lo aplica el hilo de E/S)
+        
+        None pide detectarla de nuevo con detect_baudrate."""
+        if baudrate is None:
+            self.detect_baud = True
+        else:
+            self.requested_baudrate = int(baudrate)
+    
+    def detect_baudrate(self):
+        """Probar AUTO_BAUD_ORDER hasta leer líneas válidas del firmware
+        
+        Corre en el hilo de E/S. En cada velocidad escucha hasta
+        BAUD_PROBE_TIME y se queda con la primera cuyas líneas completas son
+        UTF-8 válido con marcas conocidas (esp32_protocol.baud_score). Las
+        líneas leídas a la velocidad buena no se pierden: se emiten. Si
+        ninguna sirve vuelve a la velocidad anterior. Retorna la detectada o None."""
+        previous = self.baudrate
+        # Lo que quedó a medias se leyó a la velocidad anterior
+        self._partial_line = b""
+        for baudrate in self.AUTO_BAUD_ORDER:
+            if not self.is_running:
+                return None
+            self.serial_port.baudrate = baudrate
+            self.serial_port.reset_input_buffer()
+            sample, score = b"", 0
+            deadline = time.monotonic() + self.BAUD_PROBE_TIME
+            while self.is_running and time.monotonic() < deadline:
+                waiting = self.serial_port.in_waiting
+                if not waiting:
+                    self.msleep(10)
+                    continue
+                sample += self.serial_port.read(waiting)
+                score = esp32_protocol.baud_score(sample)
+                if score != 0:
+                    break
+            if score > 0:
+                self.baudrate = baudrate
+                self.baud_detected.emit(baudrate, score)
+                # Descartar la primera línea, que pudo empezar a medias
+                self.process_chunk(sample[sample.find(b"\n") + 1:], time.monotonic())
+                return baudrate
+        self.serial_port.baudrate = previous
+        self.baud_detected.emit(0, 0)
+        return None
+    
+    def set_command_rate(self, rate):
+        """Configurar la tasa máxima de comandos por segundo (0 = sin límite)"""
+        self.command_rate = max(0.0, float(rate))
+    
+    def pending_commands(self):
+        """Número de comandos en espera de ser escritos"""
+        with self._command_lock:
+            return len(self._commands)
+    
+    def flush_commands(self):
+        """Escribir los comandos permitidos por el limitador en un solo write()"""
+        with self._command_lock:
+            if not self._commands:
+                return
+            
+            now = time.monotonic()
+            if self.command_rate > 0:
+                elapsed = now - self._last_refill
+                self._command_tokens = min(float(self.COMMAND_BURST),
+                                           self._command_tokens + elapsed * self.command_rate)
+                allowed = min(int(self._command_tokens), len(self._commands))
+            else:
+                allowed = len(self._commands)
+            self._last_refill = now
+            
+            if allowed == 0:
+                return
+            batch = [self._commands.popleft() for _ in range(allowed)]
+            if self.command_rate > 0:
+                self._command_tokens -= allowed
+        
+        payload = "".join(f"{command}\n" for command in batch).encode('utf-8')
+        try:
+            self.serial_port.write(payload)
+        except Exception:
+            # Devolver el lote a la cola para reenviarlo tras reconectar
+            with self._command_lock:
+                self._commands.extendleft(reversed(batch))
+            raise
+        self.commands_sent += len(batch)
+        self.write_calls += 1
+    
+    @staticmethod
+    def lookup_serial_number(port):
+        """Obtener el número de serie USB del puerto (None si no tiene)"""
+        for info in serial.tools.list_ports.comports():
+            if info.device == port:
+                return info.serial_number
+        return None
+    
+    def resolve_port(self):
+        """Buscar el puerto actual del dispositivo por número de serie
+        
+        Tras un reset la placa puede reaparecer con otro nombre
+        (p. ej. /dev/ttyUSB0 -> /dev/ttyUSB1)."""
+        if self.serial_number:
+            for info in serial.tools.list_ports.comports():
+                if info.serial_number == self.serial_number:
+                    return info.device
+        return self.port_name
     
     def run(self):
         """Ejecutar el hilo de lectura serial"""
+        self.thread_ident = threading.get_ident()
+        active_profiler = None
         while self.is_running:
+            # cProfile es por hilo: el propio hilo activa el perfilador pedido
+            if self.profiler is not active_profiler:
+                active_profiler = self.switch_profiler(active_profiler, self.profiler)
             try:
-                if self.serial_port and self.serial_port.is_open:
-                    if self.serial_port.in_waiting > 0:
-                        data = self.serial_port.readline().decode('utf-8', errors='ignore').strip()
-                        if data:
-                            self.data_received.emit(data)
+                if not (self.serial_port and self.serial_port.is_open):
+                    raise serial.SerialException("Puerto serial cerrado")
+                if self.detect_baud:
+                    self.detect_baud = False
+                    self.detect_baudrate()
+                if self.requested_baudrate is not None:
+                    self.serial_port.baudrate = self.baudrate = self.requested_baudrate
+                    self.requested_baudrate = None
+                now = time.monotonic()
+                if self.link_sampler.due(now) and self.send_command(LinkQualitySampler.COMMAND):
+                    self.link_sampler.requested(now)
+                self.flush_commands()
+                waiting = self.serial_port.in_waiting
+                if waiting > 0:
+                    self.process_chunk(self.serial_port.read(waiting), time.monotonic())
+                    continue
+                if self.capture is not None:
+                    self.flush_capture(now)
                 self.msleep(10)  # Pausa pequeña para evitar saturar CPU
             except Exception as e:
-                self.connection_status.emit(False)
+                if not self.is_running:
+                    break
+                if not self.auto_reconnect:
+                    self.connection_status.emit(False)
+                    break
+                self.reconnect()
+        self.switch_profiler(active_profiler, None)
+    
+    def switch_profiler(self, current, requested):
+        """Desactivar el perfilador actual y activar el solicitado en este hilo"""
+        if current is not None:
+            current.disable()
+        self.profiler_active = False
+        if requested is not None:
+            try:
+                requested.enable()
+                self.profiler_active = True
+            except ValueError:
+                # Python 3.12+: ya hay un perfilador global que cubre este hilo
+                pass
+        return requested
+    
+    def process_chunk(self, chunk, host_time=None):
+        """Separar un bloque de bytes en líneas completas y entregarlas
+        
+        Cada línea sale con el instante de lectura (`host_time`), tomado en
+        este hilo y no al procesarla en la UI. Si hay captura activa, las
+        líneas se escriben en ella tal como llegaron (bytes sin decodificar);
+        luego se decodifican y se encolan para la UI, que puede descartar o
+        fusionar si va atrasada. La última línea incompleta
+        queda en el buffer hasta que llegue el resto, incluso si entre
+        medias hubo una reconexión."""
+        if host_time is None:
+            host_time = time.monotonic()
+        self.bytes_received += len(chunk)
+        buffer = self._partial_line + chunk
+        lines = buffer.split(b"\n")
+        self._partial_line = lines.pop()
+        self.lines_received += len(lines)
+        if len(self._partial_line) > self.MAX_PARTIAL_LINE:
+            lines.append(self._partial_line)
+            self._partial_line = b""
+        
+        capture = self.capture
+        if capture is not None and lines:
+            try:
+                capture.write_lines(lines, host_time)
+            except OSError as e:
+                self.stop_capture()
+                self.capture_error.emit(f"Captura detenida ({capture.path}): {e}")
+        
+        decoded = []
+        for raw in lines:
+            data = raw.decode('utf-8', errors='ignore').strip()
+            if data:
+                decoded.append(data)
+        if not decoded:
+            return
+        
+        if self.line_queue.put_many(decoded, host_time):
+            self.lines_ready.emit()
+        
+        for data in decoded:
+            # El RSSI se extrae aquí para no esperar al parseo de la UI
+            if "RSSI:" in data:
+                rssi = esp32_protocol.parse_rssi(data)
+                if rssi is not None:
+                    self.link_sampler.observed(host_time)
+                    self.link_sample.emit(rssi, host_time)
+    
+    def start_capture(self, path, wall_offset):
+        """Copiar a `path` los bytes de todas las líneas recibidas desde ahora
+        
+        La captura es opcional (menú Archivo o --capture). OSError si no se
+        puede abrir el archivo."""
+        capture = SerialCapture(path, wall_offset)
+        self.stop_capture()
+        self.capture = capture
+        return capture
+    
+    def stop_capture(self):
+        """Terminar la captura en curso; retorna la que estaba activa (o None)"""
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.close()
+        return capture
+    
+    def flush_capture(self, now):
+        """Volcar la captura a disco cada SerialCapture.FLUSH_INTERVAL s sin datos"""
+        capture = self.capture
+        if capture is None:
+            return
+        try:
+            capture.flush(now)
+        except OSError as e:
+            self.stop_capture()
+            self.capture_error.emit(f"Captura detenida ({capture.path}): {e}")
+    
+    def reconnect(self):
+        """Reabrir el puerto con backoff exponencial hasta lograrlo
+        
+        Retorna True si se recuperó la conexión, False si se canceló."""
+        self.down_since = time.monotonic()
+        self.connection_status.emit(False)
+        try:
+            if self.serial_port:
+                self.serial_port.close()
+        except Exception:
+            pass
+        
+        attempt = 0
+        delay = self.RECONNECT_BASE_DELAY
+        while self.is_running:
+            attempt += 1
+            self.reconnecting.emit(attempt, delay)
+            if not self.interruptible_sleep(delay):
+                return False
+            
+            port = self.resolve_port()
+            try:
+                new_port = serial.serial_for_url(port, self.baudrate, timeout=1)
+            except Exception:
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+                continue
+            
+            if not self.is_running:
+                new_port.close()
+                return False
+            
+            self.serial_port = new_port
+            self.port_name = port
+            self.last_downtime = time.monotonic() - self.down_since
+            self.total_downtime += self.last_downtime
+            self.reconnect_count += 1
+            self.down_since = None
+            self.link_sampler.reset(time.monotonic())
+            self.connection_status.emit(True)
+            self.reconnected.emit(port, self.last_downtime)
+            return True
+        return False
+    
+    def interruptible_sleep(self, seconds):
+        """Dormir en pasos cortos para poder cancelar al desconectar"""
+        deadline = time.monotonic() + seconds
+        while self.is_running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            self.msleep(int(min(remaining, 0.05) * 1000) + 1)
+        return False
+
+
+class LineQueue:
+    """Cola acotada de líneas entre SerialThread y la UI
+    
+    El hilo de E/S agrega las líneas de cada bloque leído y la UI las saca
+    por lotes. Solo se avisa a la UI (`put_many` retorna True) cuando la
+    cola pasa de vacía a tener líneas, así la cola de eventos de Qt no
+    crece con el tráfico. Si la UI se atrasa se aplica `policy`:
+    
+    - 'coalesce': desde la mitad de la capacidad, una lectura de sensores
+      nueva reemplaza a la que sigue pendiente (solo importa la última) y
+      la reemplazada deja de ocupar lugar; si aun así se llena, se
+      descartan las líneas más antiguas.
+    - 'drop_oldest': se descartan las líneas más antiguas.
+    - 'drop_newest': se descartan las que llegan con la cola llena.
+    
+    Es segura entre hilos. La captura en disco no pasa por aquí."""
+    
+    POLICIES = ('coalesce', 'drop_oldest', 'drop_newest')
+    DEFAULT_CAPACITY = 4096
+    SENSOR_MARKER = "Leyendo sensores"
+    
+    def __init__(self, capacity=DEFAULT_CAPACITY, policy='coalesce'):
+        self._lock = threading.Lock()
+        self.capacity = int(capacity)
+        self.set_policy(policy)
+        self._items = deque()          # [línea, host_time]; línea None = reemplazada
+        self._live = 0                 # Entradas no reemplazadas (la profundidad real)
+        self._pending_sensor = None    # Última lectura de sensores aún en la cola
+        self._notified = False
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+    
+    def __len__(self):
+        return self._live
+    
+    def set_policy(self, policy):
+        """Elegir la política de saturación (una de POLICIES)"""
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política desconocida: {policy!r}")
+        self.policy = policy
+    
+    def put_many(self, lines, host_time):
+        """Encolar las líneas de un bloque; retorna True si hay que avisar a la UI"""
+        with self._lock:
+            items = self._items
+            coalesce = self.policy == 'coalesce'
+            for line in lines:
+                entry = [line, host_time]
+                if coalesce and self.SENSOR_MARKER in line:
+                    pending = self._pending_sensor
+                    if pending is not None and self._live >= self.capacity // 2:
+                        # Queda en la deque como entrada muerta, sin contar
+                        pending[0] = None
+                        self._live -= 1
+                        self.coalesced += 1
+                    self._pending_sensor = entry
+                if self._live >= self.capacity:
+                    if self.policy == 'drop_newest':
+                        self.dropped += 1
+                        continue
+                    # Descartar la línea viva más antigua (y las muertas delante)
+                    while True:
+                        oldest = items.popleft()
+                        if oldest is self._pending_sensor:
+                            self._pending_sensor = None
+                        if oldest[0] is not None:
+                            break
+                    self._live -= 1
+                    self.dropped += 1
+                items.append(entry)
+                self._live += 1
+                self.enqueued += 1
+            if len(items) - self._live > self.capacity:
+                # Demasiadas entradas muertas (la UI no saca): compactar
+                self._items = items = deque(entry for entry in items if entry[0] is not None)
+            self.high_water = max(self.high_water, self._live)
+            notify = self._live > 0 and not self._notified
+            if notify:
+                self._notified = True
+            return notify
+    
+    def take(self, limit):
+        """Sacar hasta `limit` líneas como (línea, host_time) en orden de llegada"""
+        batch = []
+        with self._lock:
+            items = self._items
+            while items and len(batch) < limit:
+                entry = items.popleft()
+                if entry is self._pending_sensor:
+                    self._pending_sensor = None
+                if entry[0] is not None:
+                    batch.append((entry[0], entry[1]))
+            self._live -= len(batch)
+            if not items:
+                self._notified = False
+        return batch
+    
+    def snapshot(self):
+        """Profundidad y contadores actuales"""
+        with self._lock:
+            return {
+                'depth': self._live,
+                'capacity': self.capacity,
+                'high_water': self.high_water,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'policy': self.policy,
+            }
+
+
+class SerialCapture:
+    """Copia en disco de todas las líneas recibidas, en el formato de 💾 Guardar Log
+    
+    La escribe el hilo de E/S antes de decodificar y encolar las líneas para
+    la UI: no la afectan los descartes de LineQueue y cada línea se guarda
+    con sus bytes originales (incluidos los espacios y los bytes que no son
+    UTF-8 válido), tras la marca de tiempo. Solo se quita el fin de línea
+    (LF, y el CR que agrega println). esp32_log_analyzer.py la procesa
+    igual que un log guardado. Se abre en modo append binario."""
+    
+    FLUSH_INTERVAL = 1.0   # s entre volcados a disco cuando el puerto está inactivo
+    
+    def __init__(self, path, wall_offset):
+        self.path = path
+        self.wall_offset = wall_offset   # host_time + wall_offset = hora real
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        self._last_flush = time.monotonic()
+        self.lines = 0
+    
+    def write_lines(self, lines, host_time):
+        """Agregar las líneas (bytes, sin el LF) de un bloque; todas comparten la hora de lectura"""
+        timestamp = datetime.fromtimestamp(self.wall_offset + host_time).strftime("%H:%M:%S.%f")[:-3]
+        prefix = f"[{timestamp}] ".encode('ascii')
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(b"".join(prefix + line.removesuffix(b"\r") + b"\n" for line in lines))
+            self.lines += len(lines)
+    
+    def flush(self, now):
+        """Volcar a disco si pasó FLUSH_INTERVAL desde el último volcado"""
+        if now - self._last_flush < self.FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+    
+    def close(self):
+        """Cerrar el archivo (las escrituras posteriores se ignoran)"""
+        with self._lock:
+            file, self._file = self._file, None
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+
+
+class ThroughputProbe:
+    """Tasa efectiva del enlace serial frente a lo que permite la velocidad
+    
+    Recibe muestras de los contadores de SerialThread (bytes_received,
+    lines_received) y calcula bytes/s y líneas/s sobre la ventana más
+    reciente (`window` s; math.inf = desde la primera muestra). En 8N1
+    cada byte ocupa 10 bits, así que a `baudrate` caben baudrate / 10 bytes/s."""
+    
+    BITS_PER_BYTE = 10
+    SATURATION = 0.9   # Uso del enlace a partir del cual la velocidad es el cuello de botella
+    
+    def __init__(self, window=2.0):
+        self.window = window
+        self.samples = deque()   # (instante, bytes, líneas)
+    
+    def reset(self):
+        """Olvidar las muestras anteriores"""
+        self.samples.clear()
+    
+    def sample(self, now, bytes_total, lines_total):
+        """Registrar los contadores acumulados en el instante `now`"""
+        self.samples.append((now, bytes_total, lines_total))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+    
+    def rates(self, baudrate):
+        """dict con bytes_per_s, lines_per_s, utilization y seconds (None sin datos)"""
+        if len(self.samples) < 2:
+            return None
+        (start, first_bytes, first_lines), (end, last_bytes, last_lines) = self.samples[0], self.samples[-1]
+        seconds = end - start
+        if seconds <= 0 or last_bytes < first_bytes:
+            # Sin tiempo transcurrido o los contadores se reiniciaron
+            return None
+        bytes_per_s = (last_bytes - first_bytes) / seconds
+        return {
+            'bytes_per_s': bytes_per_s,
+            'lines_per_s': (last_lines - first_lines) / seconds,
+            'utilization': bytes_per_s * self.BITS_PER_BYTE / baudrate if baudrate else math.nan,
+            'seconds': seconds,
+        }
+
+
+class LinkQualitySampler:
+    """Calendario de las consultas 'red' que miden el RSSI del ESP32
+    
+    Lo usa el hilo de E/S: cada `interval` segundos encola el comando por
+    la cola no bloqueante de SerialThread (con su limitador de tasa). Un
+    RSSI que llegue por otra vía (el bloque de estado que el firmware
+    imprime cada 30 s o un 'status' manual) cuenta como muestra y
+    aplaza la siguiente consulta, así el enlace serial no recibe más de
+    un comando por intervalo."""
+    
+    COMMAND = "red"
+    DEFAULT_INTERVAL = 15.0   # s entre muestras (0 = desactivado)
+    STARTUP_DELAY = 2.0       # s tras conectar antes de la primera consulta
+    RESPONSE_TIMEOUT = 3.0    # s esperando el RSSI antes de darla por perdida
+    
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = float(interval)
+        self.reset(time.monotonic())
+    
+    def reset(self, now):
+        """Reiniciar el calendario (al conectar o reconectar)"""
+        self.next_due = now + self.STARTUP_DELAY
+        self.awaiting_since = None
+        self.requests = 0
+        self.samples = 0
+        self.timeouts = 0
+    
+    def set_interval(self, seconds):
+        """Configurar el intervalo entre muestras (0 = desactivado)"""
+        self.interval = max(0.0, float(seconds))
+    
+    def due(self, now):
+        """Indica si toca enviar una consulta"""
+        if self.awaiting_since is not None:
+            if now - self.awaiting_since < self.RESPONSE_TIMEOUT:
+                return False
+            self.awaiting_since = None
+            self.timeouts += 1
+        return self.interval > 0 and now >= self.next_due
+    
+    def requested(self, now):
+        """Registrar una consulta encolada"""
+        self.requests += 1
+        self.awaiting_since = now
+        self.next_due = now + self.interval
+    
+    def observed(self, now):
+        """Registrar un RSSI recibido (pedido o no)"""
+        self.samples += 1
+        self.awaiting_since = None
+        self.next_due = now + self.interval
+
+
+class RollingStats:
+    """Estadísticas móviles de un sensor sobre un buffer circular de NumPy
+    
+    `push` es O(1): media y desviación salen de sumas acumuladas, la tasa
+    de cambio de los extremos de la ventana y la EWMA de su recurrencia.
+    Mínimo y máximo se calculan vectorizados solo cuando se consultan.
+    `push_many` procesa bloques completos (reproducciones) sin bucles."""
+    
+    # Cada cuántas muestras se recalculan las sumas para evitar deriva numérica
+    RESYNC_EVERY = 4096
+    
+    def __init__(self, window=40, ewma_alpha=0.2):
+        self.window = int(window)
+        self.ewma_alpha = float(ewma_alpha)
+        self.values = np.zeros(self.window, dtype=np.float64)
+        self.times = np.zeros(self.window, dtype=np.float64)
+        self.reset()
+    
+    def reset(self):
+        """Vaciar la ventana"""
+        self.index = 0          # Próxima posición a escribir
+        self.count = 0          # Muestras válidas en la ventana
+        self.total = 0          # Muestras procesadas desde el reset
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self.ewma = math.nan
+        self.last = math.nan
+    
+    def push(self, value, timestamp):
+        """Agregar una muestra"""
+        value = float(value)
+        i = self.index
+        if self.count == self.window:
+            old = self.values[i]
+            self._sum -= old
+            self._sumsq -= old * old
+        else:
+            self.count += 1
+        
+        self.values[i] = value
+        self.times[i] = timestamp
+        self._sum += value
+        self._sumsq += value * value
+        self.index = (i + 1) % self.window
+        self.total += 1
+        
+        self.ewma = value if math.isnan(self.ewma) else \
+            self.ewma + self.ewma_alpha * (value - self.ewma)
+        self.last = value
+        
+        if self.total % self.RESYNC_EVERY == 0:
+            self._resync()
+    
+    def push_many(self, values, timestamps):
+        """Agregar un bloque de muestras de forma vectorizada"""
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return
+        
+        # EWMA en forma cerrada: e_n = (1-a)^n e_0 + sum a (1-a)^(n-1-k) x_k
+        decay = 1.0 - self.ewma_alpha
+        weights = self.ewma_alpha * decay ** np.arange(n - 1, -1, -1)
+        if math.isnan(self.ewma):
+            # La primera muestra inicializa la EWMA (e_0 = x_0)
+            weights[0] = decay ** (n - 1)
+            self.ewma = float(np.dot(weights, values))
+        else:
+            self.ewma = float(decay ** n * self.ewma + np.dot(weights, values))
+        
+        # Solo las últimas `window` muestras quedan en el buffer
+        tail = min(n, self.window)
+        positions = (self.index + np.arange(n - tail, n)) % self.window
+        self.values[positions] = values[-tail:]
+        self.times[positions] = timestamps[-tail:]
+        self.index = (self.index + n) % self.window
+        self.count = min(self.window, self.count + n)
+        self.total += n
+        self.last = float(values[-1])
+        self._resync()
+    
+    def _resync(self):
+        """Recalcular las sumas acumuladas a partir del buffer"""
+        valid = self._ordered_values()
+        self._sum = float(valid.sum())
+        self._sumsq = float(np.dot(valid, valid))
+    
+    def _ordered_values(self):
+        """Valores de la ventana (sin orden garantizado si aún no está llena)"""
+        return self.values if self.count == self.window else self.values[:self.count]
+    
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else math.nan
+    
+    @property
+    def std(self):
+        if self.count < 2:
+            return math.nan
+        mean = self._sum / self.count
+        variance = max(0.0, self._sumsq / self.count - mean * mean)
+        return math.sqrt(variance)
+    
+    @property
+    def min(self):
+        return float(self._ordered_values().min()) if self.count else math.nan
+    
+    @property
+    def max(self):
+        return float(self._ordered_values().max()) if self.count else math.nan
+    
+    @property
+    def rate(self):
+        """Tasa de cambio (unidades/s) entre los extremos de la ventana"""
+        if self.count < 2:
+            return math.nan
+        newest = (self.index - 1) % self.window
+        oldest = self.index % self.window if self.count == self.window else 0
+        dt = self.times[newest] - self.times[oldest]
+        if dt <= 0:
+            return math.nan
+        return float((self.values[newest] - self.values[oldest]) / dt)
+
+
+class ReadingHistory:
+    """Historial de lecturas de un sensor en un buffer circular de NumPy
+    
+    Cada lectura ocupa 17 bytes (HISTORY_DTYPE, el mismo registro que el
+    anillo de memoria compartida) en lugar de los objetos float/int de
+    Python de una lista; 24 h a 4 Hz son 5.9 MB por sensor. Si la lectura
+    tiene millis() medido del ESP32 lo indica `has_device_ms`."""
+    
+    HISTORY_DTYPE = esp32_shared_state.READING_DTYPE
+    # Los bloques se copian como bytes opacos: NumPy copia campo a campo
+    # los dtypes estructurados y así es un memcpy (~10x más rápido)
+    _RAW_DTYPE = np.dtype(f"V{HISTORY_DTYPE.itemsize}")
+    DEFAULT_CAPACITY = 24 * 3600 * 4   # 24 h a 4 Hz
+    
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=self.HISTORY_DTYPE)
+        self.index = 0       # Próxima posición a escribir
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        """Vaciar el historial"""
+        self.index = 0
+        self.count = 0
+    
+    def append(self, host_time, value, device_ms=None):
+        """Agregar una lectura (O(1)); retorna su posición en el buffer"""
+        position = self.index
+        self.data[position] = (host_time, 0 if device_ms is None else device_ms,
+                               value, device_ms is not None)
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        return position
+    
+    def restamp(self, position, host_time, device_ms):
+        """Corregir las marcas de tiempo de una lectura ya guardada"""
+        self.data[position]['host_time'] = host_time
+        self.data[position]['device_ms'] = device_ms
+        self.data[position]['has_device_ms'] = True
+    
+    def extend(self, records, time_shift=0.0):
+        """Agregar un bloque de registros con HISTORY_DTYPE
+        
+        `time_shift` se suma a su host_time (p. ej. al restaurar una sesión)."""
+        records = np.asarray(records, dtype=self.HISTORY_DTYPE)[-self.capacity:]
+        raw, data = records.view(self._RAW_DTYPE), self.data.view(self._RAW_DTYPE)
+        # Como mucho dos copias contiguas (hasta el final del buffer y desde el inicio)
+        head = min(len(records), self.capacity - self.index)
+        data[self.index:self.index + head] = raw[:head]
+        data[:len(records) - head] = raw[head:]
+        if time_shift:
+            self.data['host_time'][self.index:self.index + head] += time_shift
+            self.data['host_time'][:len(records) - head] += time_shift
+        self.index = (self.index + len(records)) % self.capacity
+        self.count = min(self.capacity, self.count + len(records))
+    
+    def latest(self, n=None):
+        """Las últimas `n` lecturas en orden cronológico (copia)"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.index - n) % self.capacity
+        data = self.data.view(self._RAW_DTYPE)
+        if start + n <= self.capacity:
+            return data[start:start + n].copy().view(self.HISTORY_DTYPE)
+        return np.concatenate((data[start:], data[:self.index])).view(self.HISTORY_DTYPE)
+    
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class ConsoleQuery:
+    """Búsqueda sobre ConsoleHistory: texto (o regex) y filtros de tipo/nivel
+
+    El texto no distingue mayúsculas. Una regex inválida lanza re.error."""
+    __slots__ = ('text', 'regex', 'types', 'level', 'pattern')
+
+    def __init__(self, text="", regex=False, types=None, level=None):
+        self.text = text
+        self.regex = regex
+        self.types = frozenset(types) if types else None
+        self.level = level
+        self.pattern = re.compile(text if regex else re.escape(text),
+                                  re.IGNORECASE | re.MULTILINE) if text else None
+
+    @property
+    def is_empty(self):
+        return self.pattern is None and self.types is None and self.level is None
+
+    def accepts(self, text, line_type, level):
+        """Indicar si una línea cumple la búsqueda (para las líneas en vivo)"""
+        if self.types is not None and line_type not in self.types:
+            return False
+        if self.level is not None and level != self.level:
+            return False
+        return self.pattern is None or self.pattern.search(text) is not None
+
+
+class ConsoleHistory:
+    """Historial completo de la consola con índice invertido
+
+    El texto de las líneas se guarda en UTF-8 dentro de un solo bytearray
+    (separadas por '\\n') y sus metadatos en arrays compactos. Las líneas
+    idénticas consecutivas se colapsan en una entrada con contador.
+
+    El índice va de token (en minúsculas), de tipo de línea y de nivel a la
+    lista creciente de entradas que los contienen, así una búsqueda solo
+    revisa candidatas. Los tokens numéricos (millis(), secuencias, IPs) no
+    se indexan porque harían crecer el vocabulario con cada línea: esas
+    búsquedas recorren el texto por bloques, de lo más nuevo a lo más viejo."""
+
+    TOKEN_RE = re.compile(r"\w{2,}")
+    LINE_TYPES = esp32_protocol.LINE_TYPES
+    # Entrada exportada para la instantánea de sesión (el texto va aparte)
+    TAIL_DTYPE = np.dtype([('start', '<u8'), ('first_time', '<f8'), ('last_time', '<f8'),
+                           ('count', '<u4'), ('type', 'u1')])
+    SCAN_BLOCK = 32768    # Entradas decodificadas por bloque al recorrer el texto
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def clear(self):
+        """Vaciar el historial y el índice"""
+        self.corpus = bytearray()
+        self.starts = array('Q')        # Inicio de cada entrada en corpus
+        self.first_time = array('d')    # time.monotonic() de la primera aparición
+        self.last_time = array('d')     # ... y de la última repetición
+        self.counts = array('I')        # Repeticiones de la entrada
+        self.types = array('B')         # Posición del tipo en LINE_TYPES
+        self.tokens = {}                # token -> array('I') de entradas
+        self.by_type = {}               # tipo de línea -> array('I')
+        self.by_level = {}              # nivel -> array('I')
+        self.lines = 0                  # Líneas recibidas (con repeticiones)
+        self._last_text = None
+
+    def append(self, text, host_time, line_type='other', level='info'):
+        """Agregar una línea; retorna (entrada, colapsada)
+
+        Si `text` repite la línea anterior solo aumenta su contador."""
+        self.lines += 1
+        if text == self._last_text:
+            entry = len(self.starts) - 1
+            self.counts[entry] += 1
+            self.last_time[entry] = host_time
+            return entry, True
+
+        entry = len(self.starts)
+        self._last_text = text
+        self.starts.append(len(self.corpus))
+        self.corpus += text.replace("\n", " ").encode('utf-8')
+        self.corpus += b"\n"
+        self.first_time.append(host_time)
+        self.last_time.append(host_time)
+        self.counts.append(1)
+        self.types.append(self.LINE_TYPES.index(line_type))
+
+        for token in set(self.TOKEN_RE.findall(text.lower())):
+            if token.isdigit():
+                continue
+            postings = self.tokens.get(token)
+            if postings is None:
+                postings = self.tokens[token] = array('I')
+            postings.append(entry)
+        self.by_type.setdefault(line_type, array('I')).append(entry)
+        self.by_level.setdefault(level, array('I')).append(entry)
+        return entry, False
+
+    def text(self, entry):
+        """Texto de una entrada"""
+        start = self.starts[entry]
+        end = self.starts[entry + 1] if entry + 1 < len(self.starts) else len(self.corpus)
+        return self.corpus[start:end - 1].decode('utf-8')
+
+    def entry(self, entry):
+        """(texto, tipo, primera vez, última vez, repeticiones) de una entrada"""
+        return (self.text(entry), self.LINE_TYPES[self.types[entry]], self.first_time[entry],
+                self.last_time[entry], self.counts[entry])
+
+    def export_tail(self, n):
+        """Las últimas `n` entradas como (texto UTF-8, array TAIL_DTYPE) para guardarlas"""
+        first = max(0, len(self.starts) - n)
+        base = self.starts[first] if first < len(self.starts) else len(self.corpus)
+        tail = np.zeros(len(self.starts) - first, dtype=self.TAIL_DTYPE)
+        tail['start'] = np.frombuffer(self.starts, dtype=np.uint64)[first:] - base
+        tail['first_time'] = np.frombuffer(self.first_time, dtype=np.float64)[first:]
+        tail['last_time'] = np.frombuffer(self.last_time, dtype=np.float64)[first:]
+        tail['count'] = np.frombuffer(self.counts, dtype=np.uint32)[first:]
+        tail['type'] = np.frombuffer(self.types, dtype=np.uint8)[first:]
+        return np.frombuffer(self.corpus, dtype=np.uint8)[base:].copy(), tail
+    
+    def restore_tail(self, corpus, tail, time_shift=0.0):
+        """Agregar entradas exportadas con `export_tail` (desplazando sus horas)"""
+        text = bytes(corpus).decode('utf-8', errors='replace').split("\n")
+        for line, (_, first_time, last_time, count, line_type) in zip(text, tail.tolist()):
+            entry, _ = self.append(line, first_time + time_shift,
+                                   self.LINE_TYPES[line_type], esp32_protocol.line_level(line))
+            self.counts[entry] += count - 1
+            self.last_time[entry] = last_time + time_shift
+            self.lines += count - 1
+    
+    @property
+    def nbytes(self):
+        arrays = (self.starts, self.first_time, self.last_time, self.counts, self.types,
+                  *self.tokens.values(), *self.by_type.values(), *self.by_level.values())
+        return len(self.corpus) + sum(a.itemsize * len(a) for a in arrays)
+
+    def _postings(self, postings):
+        # Copia: una vista impediría que el array siga creciendo
+        return np.array(postings, dtype=np.uint32) if postings else np.zeros(0, np.uint32)
+
+    def _union(self, postings):
+        """Unión ordenada de listas de entradas"""
+        if len(postings) == 1:
+            return postings[0]
+        mask = np.zeros(len(self), dtype=bool)
+        for entries in postings:
+            mask[entries] = True
+        return np.flatnonzero(mask).astype(np.uint32)
+
+    def _intersect(self, candidates, entries):
+        """Intersección ordenada (None = todas las entradas)"""
+        if candidates is None:
+            return entries
+        mask = np.zeros(len(self), dtype=bool)
+        mask[candidates] = True
+        return entries[mask[entries]]
+
+    def _token_candidates(self, text):
+        """Entradas que pueden contener `text` según el índice de tokens
+
+        Los tokens del medio de la búsqueda deben aparecer completos; el
+        primero y el último pueden ser parte de un token más largo.
+        Retorna None si la búsqueda no tiene tokens indexables."""
+        text = text.lower()
+        candidates = None
+        for match in self.TOKEN_RE.finditer(text):
+            token = match.group()
+            if token.isdigit():
+                continue
+            open_start = match.start() == 0
+            open_end = match.end() == len(text)
+            if not open_start and not open_end:
+                found = self._postings(self.tokens.get(token))
+            else:
+                if open_start and open_end:
+                    keys = [key for key in self.tokens if token in key]
+                elif open_start:
+                    keys = [key for key in self.tokens if key.endswith(token)]
+                else:
+                    keys = [key for key in self.tokens if key.startswith(token)]
+                found = self._union([self._postings(self.tokens[key]) for key in keys])
+            candidates = self._intersect(candidates, found)
+            if not len(candidates):
+                break
+        return candidates
+
+    def search(self, query, limit=1000):
+        """Entradas que cumplen `query` (ConsoleQuery), las `limit` más recientes
+
+        Retorna un array de índices de entrada en orden cronológico."""
+        candidates = None
+        if query.types is not None:
+            candidates = self._union([self._postings(self.by_type.get(t)) for t in query.types])
+        if query.level is not None:
+            candidates = self._intersect(candidates, self._postings(self.by_level.get(query.level)))
+        if query.pattern is not None and not query.regex:
+            found = self._token_candidates(query.text)
+            if found is not None:
+                candidates = self._intersect(candidates, found)
+
+        if query.pattern is None:
+            return candidates[-limit:] if candidates is not None else \
+                np.arange(max(0, len(self) - limit), len(self), dtype=np.uint32)
+        if candidates is not None and len(candidates) <= len(self) // 8:
+            return self._verify(query.pattern, candidates, limit)
+        needle = self._literal(query)
+        if needle is not None:
+            return self._scan(query.pattern, candidates, limit, needle)
+        return self._scan(query.pattern, candidates, limit)
+
+    @staticmethod
+    def _literal(query):
+        """Texto de búsqueda en UTF-8 y minúsculas para recorrer los bytes
+
+        Solo si bytes.lower() (que pliega ASCII) basta: el texto no es regex
+        y no tiene letras no ASCII con mayúscula/minúscula (á, Í, ñ...)."""
+        if query.regex:
+            return None
+        text = query.text.lower()
+        if any(ord(char) > 127 and char.upper() != char for char in text):
+            return None
+        return text.encode('utf-8')
+
+    def _verify(self, pattern, candidates, limit):
+        """Revisar una a una las candidatas, de la más nueva a la más vieja"""
+        hits = []
+        for entry in candidates[::-1]:
+            if pattern.search(self.text(int(entry))):
+                hits.append(entry)
+                if len(hits) >= limit:
+                    break
+        return np.array(hits[::-1], dtype=np.uint32)
+
+    def _scan(self, pattern, candidates, limit, needle=None):
+        """Recorrer el texto por bloques desde el final hasta juntar `limit`
+
+        Con `needle` se busca en los bytes (str.find en C, sin decodificar);
+        si no, se decodifica el bloque y se aplica la regex."""
+        allowed = None
+        if candidates is not None:
+            allowed = np.zeros(len(self), dtype=bool)
+            allowed[candidates] = True
+
+        blocks = []
+        found = 0
+        end = len(self)
+        while end > 0 and found < limit:
+            first = max(0, end - self.SCAN_BLOCK)
+            stop = self.starts[end] if end < len(self) else len(self.corpus)
+            if needle is not None:
+                hits = self._scan_bytes(needle, first, end, stop, allowed)
+                blocks.append(hits)
+                found += len(hits)
+                end = first
+                continue
+            block = self.corpus[self.starts[first]:stop].decode('utf-8')
+            hits = []
+            line, pos = first, 0
+            match = pattern.search(block)
+            while match:
+                line += block.count("\n", pos, match.start())
+                if allowed is None or allowed[line]:
+                    hits.append(line)
+                pos = block.find("\n", match.start()) + 1
+                if pos == 0:
+                    break
+                line += 1
+                match = pattern.search(block, pos)
+            blocks.append(hits)
+            found += len(hits)
+            end = first
+        hits = [entry for block in reversed(blocks) for entry in block]
+        return np.array(hits[-limit:], dtype=np.uint32)
+
+    def _scan_bytes(self, needle, first, end, stop, allowed):
+        """Entradas de [first, end) cuyo texto contiene `needle` (en minúsculas)"""
+        base = self.starts[first]
+        block = bytes(self.corpus[base:stop]).lower()
+        offsets = []
+        pos = block.find(needle)
+        while pos >= 0:
+            offsets.append(pos)
+            # Saltar al inicio de la línea siguiente: una coincidencia por entrada
+            pos = block.find(b"\n", pos)
+            if pos < 0:
                 break
+            pos = block.find(needle, pos + 1)
+        if not offsets:
+            return []
+        starts = np.array(self.starts[first:end], dtype=np.int64) - base
+        entries = first + np.searchsorted(starts, offsets, side='right') - 1
+        if allowed is not None:
+            entries = entries[allowed[entries]]
+        return entries.tolist()
+
+
+# Umbrales por sensor: fuera de 'warning' -> advertencia, fuera de 'error' -> error.
+# Los rangos de error corresponden al rango de medida del DHT11 y del LDR.
+SENSOR_THRESHOLDS = {
+    'temperature': {'warning': (15.0, 35.0), 'error': (0.0, 50.0), 'spike': 2.0},
+    'humidity': {'warning': (30.0, 80.0), 'error': (20.0, 90.0), 'spike': 5.0},
+    'light': {'warning': (5.0, 95.0), 'error': (0.0, 100.0), 'spike': 25.0},
+}
+
+
+class SensorStatsEngine:
+    """Estadísticas móviles y alarmas por umbral para cada sensor
+    
+    Cada clave (p. ej. 'temperature' o 'dev1/temperature') tiene su propia
+    ventana. `update` devuelve el estado para `SensorCard.update_value`:
+    'error' para lecturas NaN o fuera de rango físico, 'warning' para
+    valores fuera del rango esperado o picos, 'normal' en otro caso."""
+    
+    # Un pico es una muestra a más de SPIKE_SIGMAS desviaciones de la media
+    SPIKE_SIGMAS = 4.0
+    SPIKE_MIN_SAMPLES = 8
+    
+    def __init__(self, window=40, ewma_alpha=0.2, thresholds=None):
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+        self.thresholds = dict(SENSOR_THRESHOLDS if thresholds is None else thresholds)
+        self.sensors = {}
+        self.spike_count = {}
+        self.error_count = {}
+    
+    def stats(self, key):
+        """Obtener (o crear) las estadísticas de un sensor"""
+        stats = self.sensors.get(key)
+        if stats is None:
+            stats = RollingStats(self.window, self.ewma_alpha)
+            self.sensors[key] = stats
+            self.spike_count[key] = 0
+            self.error_count[key] = 0
+        return stats
+    
+    def limits(self, key):
+        """Umbrales aplicables a una clave ('dev1/temperature' usa 'temperature')"""
+        return self.thresholds.get(key.rsplit('/', 1)[-1], {})
+    
+    def update(self, key, value, timestamp):
+        """Registrar una lectura y devolver el estado resultante"""
+        stats = self.stats(key)
+        if value is None or math.isnan(value):
+            self.error_count[key] += 1
+            return "error"
+        
+        limits = self.limits(key)
+        status = "normal"
+        error_low, error_high = limits.get('error', (-math.inf, math.inf))
+        warning_low, warning_high = limits.get('warning', (-math.inf, math.inf))
+        if not error_low <= value <= error_high:
+            self.error_count[key] += 1
+            status = "error"
+        elif self.is_spike(stats, value, limits):
+            self.spike_count[key] += 1
+            status = "warning"
+        elif not warning_low <= value <= warning_high:
+            status = "warning"
+        
+        stats.push(value, timestamp)
+        return status
+    
+    def update_many(self, key, values, timestamps):
+        """Registrar un bloque de lecturas y devolver sus estados (vectorizado)
+        
+        Los picos se evalúan contra la ventana previa al bloque."""
+        stats = self.stats(key)
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        limits = self.limits(key)
+        
+        invalid = np.isnan(values)
+        low, high = limits.get('error', (-np.inf, np.inf))
+        error = invalid | (values < low) | (values > high)
+        low, high = limits.get('warning', (-np.inf, np.inf))
+        warning = (values < low) | (values > high)
+        if stats.count >= self.SPIKE_MIN_SAMPLES:
+            tolerance = max(self.SPIKE_SIGMAS * stats.std, limits.get('spike', 0.0))
+            spikes = ~error & (np.abs(values - stats.mean) > tolerance)
+            self.spike_count[key] += int(spikes.sum())
+            warning |= spikes
+        
+        statuses = np.where(error, "error", np.where(warning, "warning", "normal"))
+        self.error_count[key] += int(error.sum())
+        stats.push_many(values[~invalid], timestamps[~invalid])
+        return statuses
+    
+    def is_spike(self, stats, value, limits):
+        """Detectar un salto brusco respecto a la ventana actual"""
+        if stats.count < self.SPIKE_MIN_SAMPLES:
+            return False
+        # El mínimo evita falsos picos cuando la señal es casi constante
+        tolerance = max(self.SPIKE_SIGMAS * stats.std, limits.get('spike', 0.0))
+        return abs(value - stats.mean) > tolerance
+
+
+class ClockSync:
+    """Relación entre millis() del ESP32 y time.monotonic() del host
+    
+    Cada línea `Timestamp:` aporta un par (millis, llegada al host). La
+    llegada siempre se atrasa respecto del instante real (latencia USB,
+    sondeo del hilo serial), nunca se adelanta: por eso la recta se ajusta
+    sobre la envolvente inferior (el par de menor retardo en cada tramo de
+    la ventana) y luego se desplaza para quedar bajo todos los pares. La
+    pendiente da la deriva entre relojes; un millis() que retrocede es un
+    reinicio (se descarta la ventana) salvo que sea el desborde de 2^32 ms."""
+    
+    WINDOW = 600.0          # s de historia usados en el ajuste
+    MAX_PAIRS = 4096
+    BUCKETS = 16            # tramos de la envolvente inferior
+    MIN_SPAN = 10.0         # s mínimos para estimar la deriva
+    MILLIS_WRAP = 2 ** 32
+    
+    def __init__(self):
+        self.reboots = 0
+        self.reset()
+    
+    def reset(self):
+        """Olvidar los pares (nuevo arranque del ESP32 o del puerto)"""
+        self.device = np.zeros(self.MAX_PAIRS)   # s del dispositivo, desenrollados
+        self.host = np.zeros(self.MAX_PAIRS)     # s de time.monotonic()
+        self.index = 0
+        self.count = 0
+        self.wraps = 0
+        self.last_device_ms = None
+        self.slope = 1.0
+        self.offset = None      # host = offset + slope * device
+        self.dispersion = math.nan
+        self._dirty = False
+    
+    @property
+    def is_synced(self):
+        return self.count > 0
+    
+    @property
+    def drift_ppm(self):
+        """Cuánto adelanta (+) o atrasa (-) el reloj del host frente al ESP32"""
+        return (self.slope - 1.0) * 1e6
+    
+    def add_pair(self, device_ms, host_time):
+        """Registrar un par; retorna True si detectó un reinicio del ESP32"""
+        rebooted = False
+        if self.last_device_ms is not None and device_ms < self.last_device_ms:
+            if self.last_device_ms - device_ms > self.MILLIS_WRAP // 2:
+                self.wraps += 1
+            else:
+                self.reboots += 1
+                self.reset()
+                rebooted = True
+        self.last_device_ms = device_ms
+        
+        self.device[self.index] = (device_ms + self.wraps * self.MILLIS_WRAP) / 1000.0
+        self.host[self.index] = host_time
+        self.index = (self.index + 1) % self.MAX_PAIRS
+        self.count = min(self.count + 1, self.MAX_PAIRS)
+        self._dirty = True
+        return rebooted
+    
+    def _pairs(self):
+        """Pares de la ventana en orden cronológico"""
+        start = (self.index - self.count) % self.MAX_PAIRS
+        order = (start + np.arange(self.count)) % self.MAX_PAIRS
+        device, host = self.device[order], self.host[order]
+        recent = device >= device[-1] - self.WINDOW
+        return device[recent], host[recent]
+    
+    def fit(self):
+        """Recalcular pendiente y desplazamiento (solo si hay pares nuevos)"""
+        if not self._dirty or self.count == 0:
+            return
+        self._dirty = False
+        device, host = self._pairs()
+        # Se ajusta el retardo host - dispositivo: números chicos y bien condicionados
+        delay = host - device
+        span = device[-1] - device[0]
+        
+        slope = 0.0
+        if span >= self.MIN_SPAN:
+            bucket = np.minimum(((device - device[0]) / span * self.BUCKETS).astype(np.int64),
+                                self.BUCKETS - 1)
+            bounds = np.searchsorted(bucket, np.arange(self.BUCKETS + 1))
+            lows = [start + np.argmin(delay[start:end])
+                    for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+            if len(lows) >= 2:
+                slope = float(np.polyfit(device[lows] - device[0], delay[lows], 1)[0])
+        
+        residual = delay - slope * device
+        self.slope = 1.0 + slope
+        self.offset = float(residual.min())
+        self.dispersion = float(np.mean(residual - self.offset))
+    
+    def to_host(self, device_ms):
+        """Instante del host (time.monotonic()) que corresponde a un millis()"""
+        self.fit()
+        if self.offset is None:
+            return None
+        device = (device_ms + self.wraps * self.MILLIS_WRAP) / 1000.0
+        return self.offset + self.slope * device
+    
+    def to_device(self, host_time):
+        """millis() estimado del ESP32 en un instante del host"""
+        self.fit()
+        if self.offset is None:
+            return None
+        device = (host_time - self.offset) / self.slope
+        return int(round(device * 1000.0)) % self.MILLIS_WRAP
+    
+    def snapshot(self):
+        """Estado actual del ajuste"""
+        self.fit()
+        return {
+            'pairs': self.count,
+            'offset_s': self.offset,
+            'drift_ppm': self.drift_ppm,
+            'dispersion_ms': self.dispersion * 1000.0,
+            'reboots': self.reboots,
+        }
+
+
+class UdpDeliveryAnalyzer:
+    """Correlación entre los envíos UDP que reporta el ESP32 y los datagramas recibidos
+    
+    El firmware imprime por serial cada envío (`📤 [N] UDP`, `TEXTO:` y
+    `Timestamp:`), pero el datagrama no lleva número de secuencia. Cada
+    datagrama recibido se empareja con el envío pendiente de igual contenido
+    más cercano en el tiempo, dentro de MATCH_WINDOW (menor que el periodo
+    para no confundir envíos consecutivos con los mismos valores). Así se
+    obtienen pérdidas, duplicados, reordenamientos y la distribución de
+    intervalos entre llegadas frente al periodo nominal. Es seguro usarlo
+    desde el hilo receptor y desde la UI a la vez."""
+    
+    NOMINAL_PERIOD = 0.250   # s, 4 Hz en enviarDatosSensores()
+    MATCH_WINDOW = 0.200     # s entre la línea serial y el datagrama
+    LOSS_TIMEOUT = 2.0       # s sin llegar el datagrama -> perdido
+    HISTORY_SIZE = 512       # envíos entregados recordados para duplicados
+    # Histograma de intervalos entre llegadas (ms)
+    HISTOGRAM_EDGES = np.arange(0.0, 510.0, 10.0)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Reiniciar todos los contadores"""
+        with self._lock:
+            self._pending_sent = OrderedDict()    # seq -> (payload, device_ms, host_time)
+            self._pending_received = deque()      # (payload, host_time) sin envío conocido
+            self._delivered = OrderedDict()       # seq -> payload, últimos entregados
+            self._delivered_payloads = {}         # payload -> veces en _delivered
+            self.sent = 0
+            self.received = 0
+            self.delivered = 0
+            self.lost = 0
+            self.duplicates = 0
+            self.reordered = 0
+            self.unmatched = 0
+            self.jitter = 0.0                     # estimador RFC 3550 (s)
+            self.histogram = np.zeros(len(self.HISTOGRAM_EDGES), dtype=np.int64)
+            self._interval_sum = 0.0
+            self._interval_count = 0
+            self._latency_sum = 0.0
+            self._latency_count = 0
+            self.latency_min = math.inf
+            self.latency_max = -math.inf
+            self._last_seq = None
+            self._highest_delivered = None
+            self._last_delivery = None            # (seq, device_ms, host_time)
+    
+    def record_sent(self, seq, payload, device_ms, host_time):
+        """Registrar un envío reportado por el firmware
+        
+        `host_time` es el instante del envío en el reloj del host; con el
+        reloj sincronizado (ClockSync) la latencia medida es de extremo a extremo."""
+        with self._lock:
+            if self._last_seq is not None and seq <= self._last_seq:
+                # El contador volvió a empezar: el ESP32 se reinició
+                self._start_new_epoch()
+            self._last_seq = seq
+            self.sent += 1
+            
+            # El datagrama pudo llegar antes que la línea serial
+            best, best_gap = None, self.MATCH_WINDOW
+            for index, (received_payload, arrival) in enumerate(self._pending_received):
+                gap = abs(arrival - host_time)
+                if received_payload == payload and gap <= best_gap:
+                    best, best_gap = index, gap
+            if best is not None:
+                _, arrival = self._pending_received[best]
+                del self._pending_received[best]
+                self._deliver(seq, payload, device_ms, host_time, arrival)
+                return
+            self._pending_sent[seq] = (payload, device_ms, host_time)
+    
+    def record_received(self, payload, host_time):
+        """Registrar un datagrama recibido en el socket del host"""
+        with self._lock:
+            self.received += 1
+            best, best_gap = None, self.MATCH_WINDOW
+            for seq, (sent_payload, _, sent_at) in self._pending_sent.items():
+                gap = abs(sent_at - host_time)
+                if sent_payload == payload and gap <= best_gap:
+                    best, best_gap = seq, gap
+            if best is not None:
+                _, device_ms, sent_at = self._pending_sent.pop(best)
+                self._deliver(best, payload, device_ms, sent_at, host_time)
+                return
+            self._pending_received.append((payload, host_time))
+    
+    def expire(self, now):
+        """Cerrar como perdidos los envíos que superaron LOSS_TIMEOUT"""
+        with self._lock:
+            limit = now - self.LOSS_TIMEOUT
+            while self._pending_sent:
+                seq, (_, _, sent_at) = next(iter(self._pending_sent.items()))
+                if sent_at > limit:
+                    break
+                del self._pending_sent[seq]
+                self.lost += 1
+            
+            while self._pending_received and self._pending_received[0][1] <= limit:
+                payload, _ = self._pending_received.popleft()
+                if payload in self._delivered_payloads:
+                    self.duplicates += 1
+                else:
+                    self.unmatched += 1
+    
+    def _start_new_epoch(self):
+        """Descartar el estado de secuencia tras un reinicio del ESP32"""
+        self.lost += len(self._pending_sent)
+        self._pending_sent.clear()
+        self._delivered.clear()
+        self._delivered_payloads.clear()
+        self._highest_delivered = None
+        self._last_delivery = None
+    
+    def _deliver(self, seq, payload, device_ms, sent_at, arrival):
+        """Contabilizar un envío emparejado con su datagrama"""
+        self.delivered += 1
+        
+        latency = arrival - sent_at
+        self._latency_sum += latency
+        self._latency_count += 1
+        self.latency_min = min(self.latency_min, latency)
+        self.latency_max = max(self.latency_max, latency)
+        
+        if self._highest_delivered is not None and seq < self._highest_delivered:
+            self.reordered += 1
+        else:
+            self._highest_delivered = seq
+        
+        if self._last_delivery is not None:
+            last_seq, last_device_ms, last_arrival = self._last_delivery
+            interval = arrival - last_arrival
+            if seq == last_seq + 1:
+                index = np.searchsorted(self.HISTOGRAM_EDGES, interval * 1000.0, side='right') - 1
+                self.histogram[max(0, index)] += 1
+                self._interval_sum += interval
+                self._interval_count += 1
+            if device_ms is not None and last_device_ms is not None:
+                transit_delta = interval - (device_ms - last_device_ms) / 1000.0
+                self.jitter += (abs(transit_delta) - self.jitter) / 16.0
+        self._last_delivery = (seq, device_ms, arrival)
+        
+        self._delivered[seq] = payload
+        self._delivered_payloads[payload] = self._delivered_payloads.get(payload, 0) + 1
+        if len(self._delivered) > self.HISTORY_SIZE:
+            _, old_payload = self._delivered.popitem(last=False)
+            remaining = self._delivered_payloads[old_payload] - 1
+            if remaining:
+                self._delivered_payloads[old_payload] = remaining
+            else:
+                del self._delivered_payloads[old_payload]
+    
+    def snapshot(self):
+        """Copia consistente de las métricas actuales"""
+        with self._lock:
+            closed = self.delivered + self.lost
+            return {
+                'sent': self.sent,
+                'received': self.received,
+                'delivered': self.delivered,
+                'lost': self.lost,
+                'pending': len(self._pending_sent),
+                'duplicates': self.duplicates,
+                'reordered': self.reordered,
+                'unmatched': self.unmatched,
+                'loss_rate': self.lost / closed if closed else 0.0,
+                'jitter_ms': self.jitter * 1000.0,
+                'mean_interval_ms': (self._interval_sum / self._interval_count * 1000.0
+                                     if self._interval_count else math.nan),
+                'latency_ms': (self._latency_sum / self._latency_count * 1000.0
+                               if self._latency_count else math.nan),
+                'latency_sum_ms': self._latency_sum * 1000.0,
+                'latency_count': self._latency_count,
+                'latency_min_ms': self.latency_min * 1000.0 if self._latency_count else math.nan,
+                'latency_max_ms': self.latency_max * 1000.0 if self._latency_count else math.nan,
+                'histogram': self.histogram.copy(),
+            }
+
+
+class LinkQualityHistory:
+    """Serie temporal del RSSI alineada con la entrega UDP
+    
+    Cada muestra de RSSI guarda, en un buffer circular de NumPy, la pérdida
+    y la latencia UDP del intervalo transcurrido desde la muestra anterior
+    (diferencias de los contadores de UdpDeliveryAnalyzer). Un envío se
+    declara perdido LOSS_TIMEOUT después de salir, así que las pérdidas
+    llegan a la fila siguiente con ese retraso como máximo."""
+    
+    LINK_DTYPE = np.dtype([
+        ('host_time', '<f8'),    # time.monotonic() de la línea con el RSSI
+        ('rssi_dbm', '<i2'),
+        ('delivered', '<u4'),    # entregados en el intervalo
+        ('lost', '<u4'),         # perdidos en el intervalo
+        ('loss_rate', '<f4'),    # NaN si no se cerró ningún envío o no se escuchaba UDP
+        ('latency_ms', '<f4'),   # media del intervalo (NaN sin entregas)
+        ('jitter_ms', '<f4'),    # estimador RFC 3550 al tomar la muestra
+    ])
+    DEFAULT_CAPACITY = 8192   # ~34 h a una muestra cada 15 s
+    
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=self.LINK_DTYPE)
+        self.index = 0
+        self.count = 0
+        self._previous = None   # contadores UDP de la muestra anterior
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        """Vaciar el historial"""
+        self.index = 0
+        self.count = 0
+        self._previous = None
+    
+    def record(self, host_time, rssi, udp):
+        """Agregar una muestra de RSSI con la entrega UDP desde la anterior
+        
+        `udp` es un UdpDeliveryAnalyzer.snapshot(), o None si no se está
+        escuchando UDP: la fila queda sin pérdida ni latencia (NaN) y
+        correlation() la ignora."""
+        if udp is None:
+            # La próxima escucha reinicia el analizador y cuenta desde cero
+            self._previous = None
+            self.data[self.index] = (host_time, rssi, 0, 0, math.nan, math.nan, math.nan)
+        else:
+            counters = (udp['delivered'], udp['lost'], udp['latency_sum_ms'], udp['latency_count'])
+            previous = self._previous
+            if previous is None or any(now < before for now, before in zip(counters, previous)):
+                # Primera muestra o el analizador se reinició
+                previous = (0, 0, 0.0, 0)
+            self._previous = counters
+            
+            delivered, lost, latency_sum, latency_count = (
+                now - before for now, before in zip(counters, previous))
+            closed = delivered + lost
+            self.data[self.index] = (
+                host_time, rssi, delivered, lost,
+                lost / closed if closed else math.nan,
+                latency_sum / latency_count if latency_count else math.nan,
+                udp['jitter_ms'],
+            )
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+    
+    def extend(self, records, time_shift=0.0):
+        """Agregar un bloque de muestras con LINK_DTYPE (p. ej. de una sesión anterior)
+        
+        `time_shift` se suma a su host_time."""
+        records = np.asarray(records, dtype=self.LINK_DTYPE)[-self.capacity:]
+        # Como mucho dos copias contiguas (hasta el final del buffer y desde el inicio)
+        head = min(len(records), self.capacity - self.index)
+        self.data[self.index:self.index + head] = records[:head]
+        self.data[:len(records) - head] = records[head:]
+        if time_shift:
+            self.data['host_time'][self.index:self.index + head] += time_shift
+            self.data['host_time'][:len(records) - head] += time_shift
+        self.index = (self.index + len(records)) % self.capacity
+        self.count = min(self.capacity, self.count + len(records))
+    
+    def latest(self, n=None):
+        """Las últimas `n` muestras en orden cronológico (copia)"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.index - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.data[start:start + n].copy()
+        return np.concatenate((self.data[start:], self.data[:self.index]))
+    
+    def correlation(self, field, n=None):
+        """Coeficiente de Pearson entre el RSSI y `field` (NaN sin datos suficientes)"""
+        samples = self.latest(n)
+        values = samples[field].astype(np.float64)
+        valid = np.isfinite(values)
+        if np.count_nonzero(valid) < 3:
+            return math.nan
+        rssi = samples['rssi_dbm'][valid].astype(np.float64)
+        values = values[valid]
+        if rssi.std() == 0 or values.std() == 0:
+            return math.nan
+        return float(np.corrcoef(rssi, values)[0, 1])
+
+
+class UdpListenerThread(QThread):
+    """Hilo que recibe los datagramas de sensores del ESP32 en el host"""
+    listener_error = pyqtSignal(str)
+    
+    def __init__(self, analyzer, port=4211):
+        super().__init__()
+        self.analyzer = analyzer
+        self.port = port
+        self.is_running = False
+    
+    def stop(self):
+        """Detener la escucha"""
+        self.is_running = False
+    
+    def run(self):
+        """Recibir datagramas y registrarlos con su hora de llegada"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("", self.port))
+            sock.settimeout(0.2)
+        except OSError as e:
+            self.listener_error.emit(f"No se pudo abrir el puerto UDP {self.port}: {e}")
+            return
+        
+        self.is_running = True
+        with sock:
+            while self.is_running:
+                try:
+                    payload, _ = sock.recvfrom(2048)
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    self.listener_error.emit(f"Error en socket UDP: {e}")
+                    break
+                arrival = time.monotonic()
+                self.analyzer.record_received(payload.decode('utf-8', errors='ignore').strip(), arrival)
+
+
+class ProfilerSession:
+    """Captura de perfil acotada para el hilo de la UI y SerialThread
+    
+    Combina cProfile por hilo (archivos .pstats) con un muestreador de pilas
+    de todos los hilos (archivo .collapsed para flamegraph.pl o speedscope).
+    Mientras no hay sesión activa no se instala ningún hook: SerialThread
+    solo compara una referencia por vuelta de su bucle."""
+    
+    SAMPLE_INTERVAL = 0.005  # s entre muestras de pilas
+    
+    def __init__(self, serial_thread, output_dir):
+        self.serial_thread = serial_thread
+        self.output_dir = output_dir
+        self.gui_profiler = None
+        self.serial_profiler = None
+        self.samples = {}
+        self.thread_names = {}
+        self.started_at = None
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+    
+    @property
+    def is_active(self):
+        return self.started_at is not None
+    
+    def start(self):
+        """Empezar a perfilar"""
+        if self.is_active:
+            return
+        self.started_at = datetime.now()
+        self.samples = {}
+        self.thread_names = {threading.get_ident(): "gui"}
+        if self.serial_thread.thread_ident is not None:
+            self.thread_names[self.serial_thread.thread_ident] = "serial"
+        
+        self.gui_profiler = cProfile.Profile()
+        self.gui_profiler.enable()
+        self.serial_profiler = cProfile.Profile()
+        self.serial_thread.profiler = self.serial_profiler
+        
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample_stacks, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+    
+    def stop(self):
+        """Terminar la captura y escribirla en disco; retorna las rutas creadas"""
+        if not self.is_active:
+            return []
+        self.gui_profiler.disable()
+        self._stop_sampling.set()
+        self._sampler.join()
+        
+        # Esperar a que SerialThread desactive su perfilador en su propio hilo
+        self.serial_thread.profiler = None
+        deadline = time.monotonic() + 0.5
+        while self.serial_thread.profiler_active and time.monotonic() < deadline:
+            time.sleep(0.005)
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"profile_{self.started_at.strftime('%Y%m%d_%H%M%S')}")
+        paths = []
+        
+        self.gui_profiler.dump_stats(f"{prefix}_gui.pstats")
+        paths.append(f"{prefix}_gui.pstats")
+        if not self.serial_thread.profiler_active and self.serial_profiler.getstats():
+            self.serial_profiler.dump_stats(f"{prefix}_serial.pstats")
+            paths.append(f"{prefix}_serial.pstats")
+        
+        with open(f"{prefix}.collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        paths.append(f"{prefix}.collapsed")
+        
+        self.started_at = None
+        self.gui_profiler = None
+        self.serial_profiler = None
+        return paths
+    
+    def _sample_stacks(self):
+        """Muestrear periódicamente las pilas de la UI y del hilo serial"""
+        while not self._stop_sampling.wait(self.SAMPLE_INTERVAL):
+            if self.serial_thread.thread_ident is not None:
+                self.thread_names.setdefault(self.serial_thread.thread_ident, "serial")
+            frames = sys._current_frames()
+            for ident, name in list(self.thread_names.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    key = name + ";" + ";".join(reversed(stack))
+                    self.samples[key] = self.samples.get(key, 0) + 1
+
+
+# ===============================
+#  Estilos (una sola hoja para toda la aplicación)
+# ===============================
+# Paletas por tema; los colores de acento son los mismos en ambos
+THEMES = {
+    'dark': {
+        'window': '#2c3e50', 'text': '#ecf0f1', 'muted': '#bdc3c7', 'subtle': '#95a5a6',
+        'border': '#34495e', 'input': '#34495e', 'input_border': '#555',
+        'group_bg': 'rgba(52, 73, 94, 0.3)', 'frame_bg': 'rgba(52, 73, 94, 0.2)',
+        'card_bg': 'rgba(255, 255, 255, 0.05)', 'status_bg': '#34495e',
+        'console_bg': '#1e1e1e', 'console_text': '#ffffff',
+    },
+    'light': {
+        'window': '#f5f6fa', 'text': '#2c3e50', 'muted': '#7f8c8d', 'subtle': '#95a5a6',
+        'border': '#bdc3c7', 'input': '#ffffff', 'input_border': '#bdc3c7',
+        'group_bg': 'rgba(255, 255, 255, 0.6)', 'frame_bg': 'rgba(255, 255, 255, 0.5)',
+        'card_bg': 'rgba(0, 0, 0, 0.03)', 'status_bg': '#ecf0f1',
+        'console_bg': '#ffffff', 'console_text': '#2c3e50',
+    },
+}
+DEFAULT_THEME = 'dark'
+
+ACCENTS = {
+    'red': ('#e74c3c', '#c0392b'),
+    'blue': ('#3498db', '#2980b9'),
+    'orange': ('#f39c12', '#d68910'),
+    'green': ('#27ae60', '#229954'),
+    'purple': ('#9b59b6', '#8e44ad'),
+}
+
+# Reglas que dependen del tema. Se generan una vez por tema: las del tema por
+# defecto sin prefijo y las demás bajo la propiedad `theme` de la ventana
+# ($scope para descendientes, $self para la ventana misma).
+THEME_RULES = Template("""
+QMainWindow$self { background-color: $window; color: $text; }
+$scope QGroupBox { border: 2px solid $border; background-color: $group_bg; color: $text; }
+$scope QComboBox, $scope QSpinBox, $scope QLineEdit { background-color: $input; border: 1px solid $input_border; color: $text; }
+$scope QCheckBox { color: $text; }
+QStatusBar$self, $scope QStatusBar { background-color: $status_bg; color: $text; border-top: 1px solid $input_border; }
+$scope QFrame { background-color: $frame_bg; border: 1px solid $border; }
+$scope QLabel { color: $text; background: transparent; border: none; }
+$scope QPlainTextEdit#console { background-color: $console_bg; color: $console_text; border: 1px solid $input_border; }
+$scope QFrame#sensorCard, $scope QFrame#ledControl, $scope QFrame#diagnosticPanel, $scope QFrame#networkPanel { background-color: $card_bg; }
+$scope QFrame#ledControl { border-color: $border; }
+$scope QLabel#sensorUnit, $scope QLabel#ledPin { color: $muted; }
+$scope QLabel#sensorStats { color: $subtle; }
+""")
+
+# Estructura y acentos: iguales en todos los temas. Van después de las reglas
+# de tema para ganar los empates de especificidad (p. ej. QStatusBar[state]).
+BASE_RULES = Template("""
+QGroupBox { font-weight: bold; border-radius: 8px; margin-top: 1ex; padding-top: 8px; }
+QGroupBox::title { subcontrol-origin: margin; left: 10px; padding: 0 5px 0 5px; }
+QPushButton {
+    background-color: $blue; border: none; color: white; padding: 8px 16px;
+    text-align: center; font-size: 12px; font-weight: bold; border-radius: 6px; margin: 2px;
+}
+QPushButton:hover { background-color: $blue_hover; }
+QPushButton:pressed { background-color: #21618c; }
+QPushButton[role="success"] { background-color: $green; }
+QPushButton[role="success"]:hover { background-color: $green_hover; }
+QPushButton[role="danger"] { background-color: $red; }
+QPushButton[role="danger"]:hover { background-color: $red_hover; }
+QPushButton[role="accent"] { background-color: $purple; }
+QPushButton[role="accent"]:hover { background-color: $purple_hover; }
+QComboBox, QSpinBox, QLineEdit { border-radius: 4px; padding: 4px; font-size: 11px; }
+QComboBox::drop-down { border: none; }
+QComboBox::down-arrow { width: 12px; height: 12px; }
+QStatusBar[state="connected"] { background-color: $green; }
+QStatusBar[state="disconnected"] { background-color: $red; }
+QStatusBar[state="reconnecting"] { background-color: $orange; }
+QFrame { border-radius: 8px; margin: 2px; }
+QLabel { margin: 0; }
+
+QLabel#dashboardTitle { font-size: 18px; font-weight: bold; color: $blue; margin: 10px; }
+QLabel#consoleTitle { font-size: 16px; font-weight: bold; color: #2ecc71; margin: 5px; }
+QLabel#infoLabel { margin: 2px; }
+QPlainTextEdit#console { border-radius: 5px; padding: 5px; }
+
+QFrame#sensorCard { border: 2px solid $blue; border-radius: 15px; margin: 5px; padding: 6px; }
+QFrame#sensorCard[accent="red"] { border-color: $red; }
+QFrame#sensorCard[accent="orange"] { border-color: $orange; }
+QFrame#sensorCard[accent="green"] { border-color: $green; }
+QFrame#sensorCard[accent="purple"] { border-color: $purple; }
+QLabel#sensorIcon { font-size: 24px; }
+QLabel#cardTitle { font-weight: bold; font-size: 14px; }
+QLabel#sensorValue { font-size: 28px; font-weight: bold; color: $blue; }
+QLabel#sensorValue[accent="red"] { color: $red; }
+QLabel#sensorValue[accent="orange"] { color: $orange; }
+QLabel#sensorValue[accent="green"] { color: $green; }
+QLabel#sensorValue[accent="purple"] { color: $purple; }
+QLabel#sensorValue[status="normal"] { color: $blue; }
+QLabel#sensorValue[status="warning"] { color: $orange; }
+QLabel#sensorValue[status="error"] { color: $red; }
+QLabel#sensorValue[status="success"] { color: $green; }
+QLabel#sensorUnit { font-size: 12px; }
+QLabel#sensorStats { font-size: 10px; }
+
+QFrame#ledControl { border-width: 2px; border-style: solid; border-radius: 10px; margin: 5px; padding: 10px; }
+QLabel#ledPin { font-size: 10px; }
+QLabel#ledVisual { font-size: 30px; }
+QPushButton#ledButton { background-color: $red; border-radius: 5px; padding: 5px; }
+QPushButton#ledButton:hover { background-color: $red_hover; }
+QPushButton#ledButton[on="true"] { background-color: $green; }
+QPushButton#ledButton[on="true"]:hover { background-color: $green_hover; }
+QLabel#ledStatus { color: $red; font-size: 10px; }
+QLabel#ledStatus[on="true"] { color: $green; }
+
+QFrame#diagnosticPanel, QFrame#networkPanel {
+    border: 2px solid $purple; border-radius: 10px; margin: 5px; padding: 15px;
+}
+QFrame#networkPanel { border-color: $orange; }
+QFrame#diagnosticPanel QPushButton { padding: 8px; border-radius: 5px; }
+QLabel#panelTitle { font-weight: bold; font-size: 16px; margin-bottom: 10px; }
+QLabel#panelField { font-size: 12px; }
+QLabel#panelField[state="ok"] { color: $green; }
+QLabel#panelField[state="error"] { color: $red; }
+QLabel#panelField[quality="excellent"] { color: $green; }
+QLabel#panelField[quality="good"] { color: $orange; }
+QLabel#panelField[quality="weak"] { color: $red; }
+QLabel#udpStats { color: $blue; font-size: 12px; }
+QLabel#ipInfo { color: $orange; font-size: 12px; }
+""")
+
+
+@functools.lru_cache(maxsize=None)
+def build_stylesheet():
+    """Hoja de estilos de la aplicación con todos los temas (se construye una vez)"""
+    accents = {}
+    for name, (color, hover) in ACCENTS.items():
+        accents[name] = color
+        accents[f"{name}_hover"] = hover
+    
+    parts = []
+    for theme, colors in THEMES.items():
+        if theme == DEFAULT_THEME:
+            scope = {'scope': '', 'self': ''}
+        else:
+            scope = {'scope': f'*[theme="{theme}"]', 'self': f'[theme="{theme}"]'}
+        parts.append(THEME_RULES.substitute(colors, **scope))
+    parts.append(BASE_RULES.substitute(accents))
+    return "".join(parts)
+
+
+def set_style_property(widget, name, value):
+    """Cambiar una propiedad dinámica y recalcular solo el estilo de ese widget"""
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    # polish() de la hoja de estilos descarta las reglas en caché del widget;
+    # no hace falta el unpolish() previo
+    widget.style().polish(widget)
+
+
+class StyleRepolisher:
+    """Recalcula el estilo de muchos widgets en tandas de menos de un cuadro
+    
+    Cambiar la hoja de la aplicación repule todos los widgets de una vez;
+    con el tema como propiedad de cada ventana basta repulir sus
+    descendientes, primero los visibles y el resto en las vueltas
+    siguientes del event loop."""
+    
+    FRAME_BUDGET = 0.008   # Segundos de trabajo por vuelta (medio cuadro a 60 Hz)
+    
+    def __init__(self):
+        self.pending = deque()
+        self.max_slice = 0.0
+        self.timer = QTimer()
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.run_slice)
+    
+    @property
+    def is_active(self):
+        return bool(self.pending)
+    
+    def schedule(self, roots, started=None):
+        """Encolar los descendientes de `roots`, los visibles primero
+        
+        `started` es el inicio del trabajo de esta vuelta (perf_counter);
+        la primera tanda solo usa lo que queda del presupuesto."""
+        if started is None:
+            started = time.perf_counter()
+        visible, hidden = [], []
+        for root in roots:
+            for widget in root.findChildren(QWidget):
+                if widget.isVisible() and not widget.visibleRegion().isEmpty():
+                    visible.append(widget)
+                else:
+                    hidden.append(widget)
+        self.pending = deque(visible + hidden)
+        self.max_slice = 0.0
+        self.run_slice(started)
+        if self.pending:
+            self.timer.start()
+    
+    def run_slice(self, started=None):
+        """Repulir widgets hasta agotar el presupuesto de esta vuelta"""
+        if started is None:
+            started = time.perf_counter()
+        deadline = started + self.FRAME_BUDGET
+        while self.pending and time.perf_counter() < deadline:
+            widget = self.pending.popleft()
+            try:
+                widget.style().polish(widget)
+                widget.update()
+            except RuntimeError:
+                # El widget se destruyó mientras esperaba en la cola
+                continue
+        self.max_slice = max(self.max_slice, time.perf_counter() - started)
+        if not self.pending:
+            self.timer.stop()
 
 
 class SensorCard(QFrame):
     """Widget personalizado para mostrar datos de sensores"""
     
-    def __init__(self, title, unit, icon="", color="#3498db"):
+    def __init__(self, title, unit, icon="", accent="blue"):
         super().__init__()
+        self.setObjectName("sensorCard")
+        self.setProperty("accent", accent)
         self.setFrameStyle(QFrame.Shape.Box)
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: rgba(255, 255, 255, 0.05);
-                border: 2px solid {color};
-                border-radius: 15px;
-                margin: 5px;
-                padding: 10px;
-            }}
-        """)
         
         layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
         
         # Título con icono
         title_layout = QHBoxLayout()
         icon_label = QLabel(icon)
-        icon_label.setStyleSheet("font-size: 24px;")
+        icon_label.setObjectName("sensorIcon")
         title_label = QLabel(title)
-        title_label.setStyleSheet("font-weight: bold; color: #ecf0f1; font-size: 14px;")
+        title_label.setObjectName("cardTitle")
         
         title_layout.addWidget(icon_label)
         title_layout.addWidget(title_label)
@@ -106,45 +2120,47 @@ class SensorCard(QFrame):
         
         # Valor principal
         self.value_label = QLabel("--")
-        self.value_label.setStyleSheet(f"""
-            font-size: 28px; 
-            font-weight: bold; 
-            color: {color};
-            margin: 10px 0;
-        """)
+        self.value_label.setObjectName("sensorValue")
+        self.value_label.setProperty("accent", accent)
         self.value_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Unidad
         unit_label = QLabel(unit)
-        unit_label.setStyleSheet("color: #bdc3c7; font-size: 12px;")
+        unit_label.setObjectName("sensorUnit")
         unit_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
+        # Estadísticas móviles
+        self.stats_label = QLabel("μ -- | σ -- | -- … --")
+        self.stats_label.setObjectName("sensorStats")
+        self.stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        
         layout.addLayout(title_layout)
         layout.addWidget(self.value_label)
         layout.addWidget(unit_label)
+        layout.addWidget(self.stats_label)
         
         self.setLayout(layout)
-        self.setFixedHeight(120)
+        self.setFixedHeight(140)
     
     def update_value(self, value, status="normal"):
         """Actualizar el valor mostrado"""
         self.value_label.setText(str(value))
         
-        # Cambiar color según estado
-        colors = {
-            "normal": "#3498db",
-            "warning": "#f39c12",
-            "error": "#e74c3c",
-            "success": "#27ae60"
-        }
-        
-        color = colors.get(status, "#3498db")
-        self.value_label.setStyleSheet(f"""
-            font-size: 28px; 
-            font-weight: bold; 
-            color: {color};
-            margin: 10px 0;
-        """)
+        # Cambiar color según estado (normal, warning, error, success)
+        set_style_property(self.value_label, "status", status)
+    
+    def update_stats(self, stats):
+        """Mostrar media, desviación, rango y tendencia de la ventana"""
+        if stats.count == 0:
+            return
+        std = stats.std
+        rate = stats.rate
+        self.stats_label.setText(
+            f"μ {stats.mean:.1f} | σ {0.0 if math.isnan(std) else std:.2f} | "
+            f"{stats.min:.1f} … {stats.max:.1f} | "
+            f"{0.0 if math.isnan(rate) else rate:+.2f}/s"
+        )
+        self.stats_label.setToolTip(f"EWMA: {stats.ewma:.2f} | Muestras: {stats.count}")
 
 
 class LEDControl(QFrame):
@@ -157,54 +2173,36 @@ class LEDControl(QFrame):
         self.is_on = False
         self.serial_thread = serial_thread
         
+        self.setObjectName("ledControl")
         self.setFrameStyle(QFrame.Shape.Box)
-        self.setStyleSheet("""
-            QFrame {
-                background-color: rgba(255, 255, 255, 0.05);
-                border: 2px solid #34495e;
-                border-radius: 10px;
-                margin: 5px;
-                padding: 10px;
-            }
-        """)
         
         layout = QVBoxLayout()
         
         # Título
         title = QLabel(f"LED {led_number}")
-        title.setStyleSheet("font-weight: bold; color: #ecf0f1; font-size: 14px;")
+        title.setObjectName("cardTitle")
         title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Pin info
         pin_info = QLabel(f"GPIO {gpio_pin}")
-        pin_info.setStyleSheet("color: #bdc3c7; font-size: 10px;")
+        pin_info.setObjectName("ledPin")
         pin_info.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # LED visual
         self.led_visual = QLabel("⚫")
-        self.led_visual.setStyleSheet("font-size: 30px;")
+        self.led_visual.setObjectName("ledVisual")
         self.led_visual.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Botón de control
         self.control_btn = QPushButton("OFF")
-        self.control_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 5px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #c0392b;
-            }
-        """)
+        self.control_btn.setObjectName("ledButton")
+        self.control_btn.setProperty("on", False)
         self.control_btn.clicked.connect(self.toggle_led)
         
         # Estado
         self.status_label = QLabel("APAGADO")
-        self.status_label.setStyleSheet("color: #e74c3c; font-size: 10px;")
+        self.status_label.setObjectName("ledStatus")
+        self.status_label.setProperty("on", False)
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         layout.addWidget(title)
@@ -235,39 +2233,13 @@ class LEDControl(QFrame):
         if self.is_on:
             self.led_visual.setText("🟢")
             self.control_btn.setText("ON")
-            self.control_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #27ae60;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #229954;
-                }
-            """)
             self.status_label.setText("ENCENDIDO")
-            self.status_label.setStyleSheet("color: #27ae60; font-size: 10px;")
         else:
             self.led_visual.setText("⚫")
             self.control_btn.setText("OFF")
-            self.control_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #e74c3c;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #c0392b;
-                }
-            """)
             self.status_label.setText("APAGADO")
-            self.status_label.setStyleSheet("color: #e74c3c; font-size: 10px;")
+        set_style_property(self.control_btn, "on", self.is_on)
+        set_style_property(self.status_label, "on", self.is_on)
 
 
 class DiagnosticPanel(QFrame):
@@ -277,34 +2249,27 @@ class DiagnosticPanel(QFrame):
         super().__init__()
         self.serial_thread = serial_thread
         
+        self.setObjectName("diagnosticPanel")
         self.setFrameStyle(QFrame.Shape.Box)
-        self.setStyleSheet("""
-            QFrame {
-                background-color: rgba(255, 255, 255, 0.05);
-                border: 2px solid #9b59b6;
-                border-radius: 10px;
-                margin: 5px;
-                padding: 15px;
-            }
-        """)
         
         layout = QVBoxLayout()
         
         # Título
         title = QLabel("🔧 Diagnósticos y Pruebas")
-        title.setStyleSheet("font-weight: bold; color: #ecf0f1; font-size: 16px; margin-bottom: 10px;")
+        title.setObjectName("panelTitle")
         
         # Información de conexión
         self.connection_info = QLabel("📡 Estado: Desconectado")
-        self.connection_info.setStyleSheet("color: #e74c3c; font-size: 12px;")
+        self.connection_info.setObjectName("panelField")
+        self.connection_info.setProperty("state", "error")
         
         # Estadísticas UDP
         self.udp_stats = QLabel("📊 Mensajes UDP: 0 enviados, 0 recibidos")
-        self.udp_stats.setStyleSheet("color: #3498db; font-size: 12px;")
+        self.udp_stats.setObjectName("udpStats")
         
         # IP Information
         self.ip_info = QLabel("🌐 ESP32: --.--.--.-- | Teléfono: --.--.--.--")
-        self.ip_info.setStyleSheet("color: #f39c12; font-size: 12px;")
+        self.ip_info.setObjectName("ipInfo")
         
         # Botones de prueba
         test_layout = QGridLayout()
@@ -313,70 +2278,21 @@ class DiagnosticPanel(QFrame):
         self.test_buttons = []
         for i in range(1, 5):
             btn = QPushButton(f"Test LED {i}")
-            btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #3498db;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #2980b9;
-                }
-            """)
             btn.clicked.connect(lambda checked, x=i: self.send_test_command(f"test{x}"))
             test_layout.addWidget(btn, 0, i-1)
             self.test_buttons.append(btn)
         
         # Botones globales
         all_on_btn = QPushButton("🟢 Todos ON")
-        all_on_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #27ae60;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 8px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #229954;
-            }
-        """)
+        all_on_btn.setProperty("role", "success")
         all_on_btn.clicked.connect(lambda: self.send_test_command("allon"))
         
         all_off_btn = QPushButton("🔴 Todos OFF")
-        all_off_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 8px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #c0392b;
-            }
-        """)
+        all_off_btn.setProperty("role", "danger")
         all_off_btn.clicked.connect(lambda: self.send_test_command("alloff"))
         
         status_btn = QPushButton("📊 Estado Sistema")
-        status_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #9b59b6;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 8px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #8e44ad;
-            }
-        """)
+        status_btn.setProperty("role", "accent")
         status_btn.clicked.connect(lambda: self.send_test_command("status"))
         
         test_layout.addWidget(all_on_btn, 1, 0)
@@ -404,12 +2320,12 @@ class DiagnosticPanel(QFrame):
         """Actualizar estado de conexión"""
         if connected:
             self.connection_info.setText("📡 Estado: ✅ Conectado")
-            self.connection_info.setStyleSheet("color: #27ae60; font-size: 12px;")
+            set_style_property(self.connection_info, "state", "ok")
             if esp32_ip and phone_ip:
                 self.ip_info.setText(f"🌐 ESP32: {esp32_ip} | Teléfono: {phone_ip}")
         else:
             self.connection_info.setText("📡 Estado: ❌ Desconectado")
-            self.connection_info.setStyleSheet("color: #e74c3c; font-size: 12px;")
+            set_style_property(self.connection_info, "state", "error")
             self.ip_info.setText("🌐 ESP32: --.--.--.-- | Teléfono: --.--.--.--")
     
     def update_udp_stats(self, sent=0, received=0):
@@ -423,44 +2339,26 @@ class NetworkInfo(QFrame):
     def __init__(self):
         super().__init__()
         
+        self.setObjectName("networkPanel")
         self.setFrameStyle(QFrame.Shape.Box)
-        self.setStyleSheet("""
-            QFrame {
-                background-color: rgba(255, 255, 255, 0.05);
-                border: 2px solid #f39c12;
-                border-radius: 10px;
-                margin: 5px;
-                padding: 15px;
-            }
-        """)
         
         layout = QVBoxLayout()
         
         # Título
         title = QLabel("🌐 Información de Red")
-        title.setStyleSheet("font-weight: bold; color: #ecf0f1; font-size: 16px; margin-bottom: 10px;")
+        title.setObjectName("panelTitle")
         
         # WiFi Info
         self.wifi_ssid = QLabel("📡 SSID: --")
-        self.wifi_ssid.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.wifi_status = QLabel("🔐 Estado: --")
-        self.wifi_status.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.esp32_ip = QLabel("🏠 IP ESP32: --")
-        self.esp32_ip.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.gateway_ip = QLabel("🌍 Gateway: --")
-        self.gateway_ip.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.phone_ip = QLabel("📱 IP Teléfono: --")
-        self.phone_ip.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.rssi = QLabel("📶 RSSI: -- dBm")
-        self.rssi.setStyleSheet("color: #ecf0f1; font-size: 12px;")
-        
         self.ports = QLabel("🔌 Puertos: Local -- | Remoto --")
-        self.ports.setStyleSheet("color: #ecf0f1; font-size: 12px;")
+        for label in (self.wifi_ssid, self.wifi_status, self.esp32_ip, self.gateway_ip,
+                      self.phone_ip, self.rssi, self.ports):
+            label.setObjectName("panelField")
         
         layout.addWidget(title)
         layout.addWidget(self.wifi_ssid)
@@ -472,66 +2370,112 @@ class NetworkInfo(QFrame):
         layout.addWidget(self.ports)
         
         self.setLayout(layout)
-    
-    def update_network_info(self, data):
-        """Actualizar información de red"""
-        if "SSID:" in data:
-            ssid = data.split("SSID:")[1].strip()
-            self.wifi_ssid.setText(f"📡 SSID: {ssid}")
         
-        if "IP Local:" in data:
-            ip = data.split("IP Local:")[1].strip()
-            self.esp32_ip.setText(f"🏠 IP ESP32: {ip}")
-        
-        if "Gateway:" in data:
-            gateway = data.split("Gateway:")[1].strip()
-            self.gateway_ip.setText(f"🌍 Gateway: {gateway}")
-        
-        if "Teléfono destino:" in data:
-            phone = data.split("Teléfono destino:")[1].strip()
-            self.phone_ip.setText(f"📱 IP Teléfono: {phone}")
-        
-        if "RSSI:" in data:
-            rssi_value = data.split("RSSI:")[1].strip()
-            self.rssi.setText(f"📶 RSSI: {rssi_value}")
-            
-            # Cambiar color según intensidad de señal
-            try:
-                rssi_num = int(rssi_value.split()[0])
-                if rssi_num > -50:
-                    color = "#27ae60"  # Excelente
-                elif rssi_num > -70:
-                    color = "#f39c12"  # Buena
-                else:
-                    color = "#e74c3c"  # Débil
-                self.rssi.setStyleSheet(f"color: {color}; font-size: 12px;")
-            except:
-                pass
-        
-        if "Puerto local (escucha):" in data and "Puerto remoto (envío):" in data:
-            local_port = data.split("Puerto local (escucha):")[1].split()[0]
-            remote_port = data.split("Puerto remoto (envío):")[1].split()[0]
-            self.ports.setText(f"🔌 Puertos: Local {local_port} | Remoto {remote_port}")
+        self.local_port = "--"
+        self.remote_port = "--"
+    
+    def update_network_info(self, field, value):
+        """Actualizar un dato de red (evento NetworkInfo de esp32_protocol)"""
+        if field == 'ssid':
+            self.wifi_ssid.setText(f"📡 SSID: {value}")
+        elif field == 'wifi_connected':
+            self.wifi_status.setText("🔐 Estado: CONECTADO" if value else "🔐 Estado: DESCONECTADO")
+        elif field == 'ip_esp32':
+            self.esp32_ip.setText(f"🏠 IP ESP32: {value}")
+        elif field == 'gateway':
+            self.gateway_ip.setText(f"🌍 Gateway: {value}")
+        elif field == 'ip_phone':
+            self.phone_ip.setText(f"📱 IP Teléfono: {value}")
+        elif field == 'rssi_dbm':
+            self.update_rssi(value)
+        elif field in ('local_port', 'remote_port'):
+            # El firmware imprime cada puerto en su propia línea
+            setattr(self, field, value)
+            self.ports.setText(f"🔌 Puertos: Local {self.local_port} | Remoto {self.remote_port}")
+    
+    def update_rssi(self, rssi):
+        """Mostrar el RSSI y colorearlo según la intensidad de la señal"""
+        self.rssi.setText(f"📶 RSSI: {rssi} dBm")
+        if rssi > -50:
+            quality = "excellent"
+        elif rssi > -70:
+            quality = "good"
+        else:
+            quality = "weak"
+        set_style_property(self.rssi, "quality", quality)
 
 
 class ESP32Monitor(QMainWindow):
     """Ventana principal de la aplicación"""
     
+    PROFILE_DEFAULT_SECONDS = 30
+    THROUGHPUT_PROBE_SECONDS = 5
+    # Vaciado de SerialThread.line_queue: lotes hasta agotar el presupuesto de un cuadro
+    DRAIN_BATCH = 64
+    DRAIN_BUDGET_MS = 16
+    QUEUE_POLICY_LABELS = {
+        'coalesce': '🔀 Solo última lectura',
+        'drop_oldest': '⏮️ Descartar antiguas',
+        'drop_newest': '⏭️ Descartar nuevas',
+    }
+    PLOT_POINTS = 100
+    CYCLE_WINDOW = 0.1   # s entre la lectura de sensores y el Timestamp de su envío
+    CONSOLE_MAX_LINES = 5000   # Líneas en pantalla; el historial completo está en ConsoleHistory
+    SEARCH_LIMIT = 1000
+    SEARCH_DELAY_MS = 150
+    SNAPSHOT_INTERVAL_MS = 60000
+    # Últimos datos del dispositivo que se guardan en la instantánea de sesión
+    DEVICE_INFO_FIELDS = {'uptime_s', 'messages_sent', 'commands_received', 'ip_esp32', 'ip_phone',
+                          'wifi_connected', 'ssid', 'gateway', 'local_port', 'remote_port',
+                          *(f"led{i}" for i in range(1, esp32_protocol.LED_COUNT + 1))}
+    LINE_TYPE_LABELS = {
+        'sensor': '🌡️ Sensores', 'led': '💡 LEDs', 'udp': '📤 UDP', 'network': '🌐 Red',
+        'status': '📊 Estado', 'command': '📥 Comandos', 'debug': '🔍 Debug',
+        'monitor': '🖥️ Monitor', 'other': '📄 Otros',
+    }
+    
     def __init__(self):
         super().__init__()
         self.serial_thread = SerialThread()
         self.is_dark_mode = True
-        self.sensor_data = {}
-        self.led_states = {}
-        
+        self.sensor_data = {}      # sensor -> última SensorReading
+        self.led_states = {}       # 'ledN' -> último LedState
+        self.device_info = {}      # campo de DEVICE_INFO_FIELDS -> último valor
+        self.history = {sensor: ReadingHistory() for sensor in ('temperature', 'humidity', 'light')}
+        self.session_start = time.monotonic()
+        self.wall_offset = time.time() - time.monotonic()
+        self.clock_sync = ClockSync()
+        self._cycle_readings = []  # (SensorReading, posición en history, posición compartida, llegada)
+        self.shared_state = None   # StatePublisher si se publica el estado
+        self.console_history = ConsoleHistory()
+        self.console_query = None  # ConsoleQuery activa (None = consola en vivo)
+        self._console_tail = None  # Entrada del historial en la última línea visible
+        self.sensor_stats = SensorStatsEngine()
+        self.udp_analyzer = UdpDeliveryAnalyzer()
+        self.link_history = LinkQualityHistory()
+        self.throughput = ThroughputProbe()
+        self.throughput_probe = None   # ThroughputProbe de la medición en curso
+        self._queue_dropped = 0        # Descartes ya informados de line_queue
+        self.udp_listener = None
+        self._pending_udp_send = None
+        self._ui_ticks = 0
+        self.profile_dir = "profiles"
+        self.profiler_session = ProfilerSession(self.serial_thread, self.profile_dir)
+        self.session_path = None   # Instantánea de sesión (None = no se guarda)
+        
+        self.repolisher = StyleRepolisher()
+        self.apply_theme()
         self.init_ui()
         self.setup_connections()
-        self.apply_dark_theme()
         
         # Timer para actualizar información
         self.update_timer = QTimer()
         self.update_timer.timeout.connect(self.update_ui)
         self.update_timer.start(100)  # Actualizar cada 100ms
+        
+        # Timer para guardar la instantánea de sesión
+        self.snapshot_timer = QTimer()
+        self.snapshot_timer.timeout.connect(self.save_session)
     
     def init_ui(self):
         """Inicializar la interfaz de usuario"""
@@ -598,8 +2542,60 @@ class ESP32Monitor(QMainWindow):
         self.connect_btn = QPushButton("🔗 Conectar")
         self.connect_btn.clicked.connect(self.toggle_connection)
         
+        # Velocidad del puerto ("Auto" = detectarla al conectar)
+        baud_layout = QHBoxLayout()
+        baud_layout.addWidget(QLabel("Baudios:"))
+        self.baud_combo = QComboBox()
+        self.baud_combo.addItem("🔍 Auto", None)
+        for baudrate in SerialThread.BAUD_RATES:
+            self.baud_combo.addItem(str(baudrate), baudrate)
+        self.baud_combo.setCurrentIndex(self.baud_combo.findData(SerialThread.DEFAULT_BAUDRATE))
+        self.baud_combo.setToolTip("Debe coincidir con Serial.begin() del firmware; "
+                                   "Auto prueba las velocidades hasta leer líneas válidas")
+        self.baud_combo.currentIndexChanged.connect(self.on_baudrate_changed)
+        baud_layout.addWidget(self.baud_combo)
+        
+        # Tasa máxima de comandos hacia el ESP32
+        rate_layout = QHBoxLayout()
+        rate_layout.addWidget(QLabel("Máx. comandos/s:"))
+        self.command_rate_spin = QSpinBox()
+        self.command_rate_spin.setRange(0, 100)
+        self.command_rate_spin.setSpecialValueText("Sin límite")
+        self.command_rate_spin.setValue(int(self.serial_thread.command_rate))
+        self.command_rate_spin.valueChanged.connect(self.serial_thread.set_command_rate)
+        rate_layout.addWidget(self.command_rate_spin)
+        
+        # Qué sacrificar si la UI no da abasto (la captura en disco conserva todo)
+        policy_layout = QHBoxLayout()
+        policy_layout.addWidget(QLabel("Si la UI se atrasa:"))
+        self.queue_policy_combo = QComboBox()
+        for policy in LineQueue.POLICIES:
+            self.queue_policy_combo.addItem(self.QUEUE_POLICY_LABELS[policy], policy)
+        self.queue_policy_combo.setCurrentIndex(
+            self.queue_policy_combo.findData(self.serial_thread.line_queue.policy))
+        self.queue_policy_combo.setToolTip("Las lecturas de sensores pendientes se reemplazan por la "
+                                           "más nueva; si la cola se llena se descartan líneas")
+        self.queue_policy_combo.currentIndexChanged.connect(self.on_queue_policy_changed)
+        policy_layout.addWidget(self.queue_policy_combo)
+        self.queue_label = QLabel("📥 Cola UI: 0 | Descartadas: 0 | Fusionadas: 0")
+        self.queue_label.setObjectName("infoLabel")
+        
+        # Tráfico efectivo del enlace y medición bajo demanda
+        self.throughput_label = QLabel("📈 -- B/s | -- líneas/s")
+        self.throughput_label.setObjectName("infoLabel")
+        self.throughput_label.setToolTip("Bytes y líneas recibidos por segundo frente a la "
+                                         "capacidad de la velocidad actual (8N1)")
+        self.throughput_btn = QPushButton(f"⏱️ Medir Throughput ({self.THROUGHPUT_PROBE_SECONDS} s)")
+        self.throughput_btn.clicked.connect(self.start_throughput_probe)
+        
         connection_layout.addLayout(port_layout)
+        connection_layout.addLayout(baud_layout)
+        connection_layout.addLayout(rate_layout)
         connection_layout.addWidget(self.connect_btn)
+        connection_layout.addWidget(self.throughput_label)
+        connection_layout.addWidget(self.throughput_btn)
+        connection_layout.addLayout(policy_layout)
+        connection_layout.addWidget(self.queue_label)
         connection_group.setLayout(connection_layout)
         
         # Grupo de información del sistema
@@ -612,10 +2608,12 @@ class ESP32Monitor(QMainWindow):
         self.phone_ip_label = QLabel("IP Teléfono: --")
         self.messages_sent_label = QLabel("Enviados: --")
         self.messages_received_label = QLabel("Recibidos: --")
+        self.clock_label = QLabel("Reloj ESP32: --")
         
         for label in [self.uptime_label, self.wifi_status_label, self.ip_label, 
-                     self.phone_ip_label, self.messages_sent_label, self.messages_received_label]:
-            label.setStyleSheet("color: #ecf0f1; margin: 2px;")
+                     self.phone_ip_label, self.messages_sent_label, self.messages_received_label,
+                     self.clock_label]:
+            label.setObjectName("infoLabel")
             info_layout.addWidget(label)
         
         info_group.setLayout(info_layout)
@@ -638,8 +2636,12 @@ class ESP32Monitor(QMainWindow):
         controls_layout.addWidget(theme_btn)
         controls_group.setLayout(controls_layout)
         
+        # Información de red detallada (comando 'red')
+        self.network_panel = NetworkInfo()
+        
         layout.addWidget(connection_group)
         layout.addWidget(info_group)
+        layout.addWidget(self.network_panel)
         layout.addWidget(controls_group)
         layout.addStretch()
         
@@ -655,16 +2657,21 @@ class ESP32Monitor(QMainWindow):
         
         # Título del dashboard
         title = QLabel("📊 ESP32 UDP Lab Dashboard")
-        title.setStyleSheet("font-size: 18px; font-weight: bold; color: #3498db; margin: 10px;")
+        title.setObjectName("dashboardTitle")
         title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Sensores
         sensors_group = QGroupBox("🌡️ Sensores")
         sensors_layout = QHBoxLayout()
         
-        self.temp_card = SensorCard("Temperatura", "°C", "🌡️", "#e74c3c")
-        self.humidity_card = SensorCard("Humedad", "%", "💧", "#3498db")
-        self.light_card = SensorCard("Luminosidad", "%", "☀️", "#f39c12")
+        self.temp_card = SensorCard("Temperatura", "°C", "🌡️", "red")
+        self.humidity_card = SensorCard("Humedad", "%", "💧", "blue")
+        self.light_card = SensorCard("Luminosidad", "%", "☀️", "orange")
+        self.sensor_cards = {
+            'temperature': self.temp_card,
+            'humidity': self.humidity_card,
+            'light': self.light_card,
+        }
         
         sensors_layout.addWidget(self.temp_card)
         sensors_layout.addWidget(self.humidity_card)
@@ -678,7 +2685,7 @@ class ESP32Monitor(QMainWindow):
         self.led_controls = {}
         led_pins = [5, 18, 36, 21]
         for i, pin in enumerate(led_pins, 1):
-            led_control = LEDControl(i, pin)
+            led_control = LEDControl(i, pin, self.serial_thread)
             self.led_controls[f"led{i}"] = led_control
             leds_layout.addWidget(led_control)
         
@@ -694,22 +2701,113 @@ class ESP32Monitor(QMainWindow):
         self.temperature_plot.setLabel('bottom', 'Tiempo (s)')
         self.temperature_plot.showGrid(x=True, y=True, alpha=0.3)
         
-        # Datos para el gráfico
-        self.temp_data = []
-        self.temp_times = []
+        # Curva alimentada desde self.history['temperature']
         self.temp_curve = self.temperature_plot.plot(pen='r', width=2)
         
         graph_layout.addWidget(self.temperature_plot)
         graph_group.setLayout(graph_layout)
         
+        # Análisis de entrega UDP
+        udp_group = self.create_udp_panel()
+        link_group = self.create_link_panel()
+        
         layout.addWidget(title)
         layout.addWidget(sensors_group)
         layout.addWidget(leds_group)
         layout.addWidget(graph_group)
+        layout.addWidget(udp_group)
+        layout.addWidget(link_group)
         
         panel.setLayout(layout)
         return panel
     
+    def create_udp_panel(self):
+        """Crear panel de análisis de entrega UDP"""
+        udp_group = QGroupBox("📶 Entrega UDP (ESP32 → host)")
+        udp_layout = QHBoxLayout()
+        
+        info_layout = QVBoxLayout()
+        listen_layout = QHBoxLayout()
+        listen_layout.addWidget(QLabel("Puerto:"))
+        self.udp_port_spin = QSpinBox()
+        self.udp_port_spin.setRange(1, 65535)
+        self.udp_port_spin.setValue(4211)
+        self.udp_port_spin.setToolTip("El ESP32 envía a phoneIP:phoneUdpPort; este equipo debe tener esa IP")
+        listen_layout.addWidget(self.udp_port_spin)
+        self.udp_listen_btn = QPushButton("▶️ Escuchar")
+        self.udp_listen_btn.clicked.connect(self.toggle_udp_listener)
+        listen_layout.addWidget(self.udp_listen_btn)
+        
+        self.udp_delivery_label = QLabel("Entregados: 0/0 | Perdidos: 0 (0.0%)")
+        self.udp_anomalies_label = QLabel("Duplicados: 0 | Reordenados: 0 | Sin correlación: 0")
+        self.udp_jitter_label = QLabel("Jitter: -- ms | Intervalo medio: -- ms")
+        self.udp_latency_label = QLabel("Latencia: -- ms")
+        self.udp_latency_label.setToolTip("Envío según el reloj del ESP32 sincronizado → llegada al host")
+        
+        info_layout.addLayout(listen_layout)
+        info_layout.addWidget(self.udp_delivery_label)
+        info_layout.addWidget(self.udp_anomalies_label)
+        info_layout.addWidget(self.udp_jitter_label)
+        info_layout.addWidget(self.udp_latency_label)
+        info_layout.addStretch()
+        
+        # Histograma de intervalos entre llegadas
+        self.jitter_plot = pg.PlotWidget()
+        self.jitter_plot.setBackground('transparent')
+        self.jitter_plot.setLabel('bottom', 'Intervalo entre llegadas (ms)')
+        self.jitter_plot.setLabel('left', 'Datagramas')
+        self.jitter_plot.addLine(x=UdpDeliveryAnalyzer.NOMINAL_PERIOD * 1000.0, pen='y')
+        self.jitter_plot.setFixedHeight(150)
+        edges = UdpDeliveryAnalyzer.HISTOGRAM_EDGES
+        self.jitter_bars = pg.BarGraphItem(x=edges + 5.0, height=np.zeros(len(edges)),
+                                           width=9.0, brush='#3498db')
+        self.jitter_plot.addItem(self.jitter_bars)
+        
+        udp_layout.addLayout(info_layout)
+        udp_layout.addWidget(self.jitter_plot, 1)
+        udp_group.setLayout(udp_layout)
+        return udp_group
+    
+    def create_link_panel(self):
+        """Crear panel de calidad del enlace (RSSI frente a la entrega UDP)"""
+        link_group = QGroupBox("📡 Calidad del Enlace WiFi")
+        link_layout = QHBoxLayout()
+        
+        info_layout = QVBoxLayout()
+        interval_layout = QHBoxLayout()
+        interval_layout.addWidget(QLabel("Muestreo cada (s):"))
+        self.link_interval_spin = QSpinBox()
+        self.link_interval_spin.setRange(0, 600)
+        self.link_interval_spin.setSpecialValueText("Desactivado")
+        self.link_interval_spin.setValue(int(self.serial_thread.link_sampler.interval))
+        self.link_interval_spin.setToolTip("Envía 'red' al ESP32 si no llegó un RSSI en ese intervalo")
+        self.link_interval_spin.valueChanged.connect(self.serial_thread.link_sampler.set_interval)
+        interval_layout.addWidget(self.link_interval_spin)
+        
+        self.link_rssi_label = QLabel("RSSI: -- dBm | Muestras: 0")
+        self.link_correlation_label = QLabel("Correlación RSSI ↔ pérdida: -- | ↔ latencia: --")
+        self.link_correlation_label.setToolTip("Coeficiente de Pearson entre muestras de RSSI y la "
+                                               "entrega UDP del intervalo anterior")
+        
+        info_layout.addLayout(interval_layout)
+        info_layout.addWidget(self.link_rssi_label)
+        info_layout.addWidget(self.link_correlation_label)
+        info_layout.addStretch()
+        
+        # Serie temporal del RSSI
+        self.rssi_plot = pg.PlotWidget()
+        self.rssi_plot.setBackground('transparent')
+        self.rssi_plot.setLabel('left', 'RSSI (dBm)')
+        self.rssi_plot.setLabel('bottom', 'Tiempo (s)')
+        self.rssi_plot.showGrid(x=True, y=True, alpha=0.3)
+        self.rssi_plot.setFixedHeight(150)
+        self.rssi_curve = self.rssi_plot.plot(pen='c', symbol='o', symbolSize=4)
+        
+        link_layout.addLayout(info_layout)
+        link_layout.addWidget(self.rssi_plot, 1)
+        link_group.setLayout(link_layout)
+        return link_group
+    
     def create_console_panel(self):
         """Crear panel de la consola"""
         panel = QFrame()
@@ -718,24 +2816,59 @@ class ESP32Monitor(QMainWindow):
         
         # Título
         title = QLabel("📺 Consola Serial")
-        title.setStyleSheet("font-size: 16px; font-weight: bold; color: #2ecc71; margin: 5px;")
+        title.setObjectName("consoleTitle")
         
-        # Área de texto para la consola
-        self.console_text = QTextEdit()
+        # Área de texto para la consola: QPlainTextEdit descarta las líneas
+        # más viejas sin volver a diagramar todo el documento
+        self.console_text = QPlainTextEdit()
+        self.console_text.setObjectName("console")
         self.console_text.setReadOnly(True)
-        self.console_text.setStyleSheet("""
-            QTextEdit {
-                background-color: #1e1e1e;
-                color: #ffffff;
-                font-family: 'Consolas', 'Monaco', monospace;
-                font-size: 11px;
-                border: 1px solid #555;
-                border-radius: 5px;
-                padding: 5px;
-            }
-        """)
+        # La fuente va en código: si la pusiera la hoja de estilos, cada cambio
+        # de tema volvería a diagramar todo el historial de la consola
+        console_font = QFont()
+        console_font.setFamilies(['Consolas', 'Monaco', 'monospace'])
+        console_font.setStyleHint(QFont.StyleHint.Monospace)
+        console_font.setPixelSize(11)
+        self.console_text.setFont(console_font)
+        self.console_text.document().setMaximumBlockCount(self.CONSOLE_MAX_LINES)
+        
+        # Búsqueda y filtros sobre todo el historial
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("🔍 Buscar en el historial...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_regex_check = QCheckBox("Regex")
+        self.search_type_combo = QComboBox()
+        self.search_type_combo.addItem("Todos los tipos", None)
+        for line_type in esp32_protocol.LINE_TYPES:
+            self.search_type_combo.addItem(self.LINE_TYPE_LABELS[line_type], line_type)
+        self.search_level_combo = QComboBox()
+        self.search_level_combo.addItem("Todos los niveles", None)
+        self.search_level_combo.addItem("⚠️ Advertencias", 'warning')
+        self.search_level_combo.addItem("❌ Errores", 'error')
+        search_layout.addWidget(self.search_edit, 1)
+        search_layout.addWidget(self.search_regex_check)
+        
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.search_type_combo)
+        filter_layout.addWidget(self.search_level_combo)
+        self.search_status_label = QLabel("")
+        self.search_status_label.setObjectName("infoLabel")
+        filter_layout.addWidget(self.search_status_label, 1)
+        
+        # Esperar a que se deje de escribir antes de buscar
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.apply_console_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.search_regex_check.toggled.connect(self.apply_console_search)
+        self.search_type_combo.currentIndexChanged.connect(self.apply_console_search)
+        self.search_level_combo.currentIndexChanged.connect(self.apply_console_search)
         
         layout.addWidget(title)
+        layout.addLayout(search_layout)
+        layout.addLayout(filter_layout)
         layout.addWidget(self.console_text)
         
         panel.setLayout(layout)
@@ -753,6 +2886,15 @@ class ESP32Monitor(QMainWindow):
         save_action.triggered.connect(self.save_log)
         file_menu.addAction(save_action)
         
+        export_link_action = QAction('📡 Exportar Calidad del Enlace', self)
+        export_link_action.triggered.connect(self.export_link_history)
+        file_menu.addAction(export_link_action)
+        
+        self.capture_action = QAction('📼 Capturar Serial a Disco', self)
+        self.capture_action.setCheckable(True)
+        self.capture_action.triggered.connect(self.toggle_capture)
+        file_menu.addAction(self.capture_action)
+        
         exit_action = QAction('❌ Salir', self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
@@ -767,81 +2909,39 @@ class ESP32Monitor(QMainWindow):
         clear_action = QAction('🗑️ Limpiar Consola', self)
         clear_action.triggered.connect(self.clear_console)
         view_menu.addAction(clear_action)
+        
+        # Menú Herramientas
+        tools_menu = menubar.addMenu('🛠️ Herramientas')
+        
+        self.profile_action = QAction(f'⏱️ Perfilar ({self.PROFILE_DEFAULT_SECONDS} s)', self)
+        self.profile_action.setCheckable(True)
+        self.profile_action.triggered.connect(self.toggle_profiling)
+        tools_menu.addAction(self.profile_action)
     
     def setup_connections(self):
         """Configurar conexiones de señales"""
-        self.serial_thread.data_received.connect(self.process_serial_data)
+        self.serial_thread.lines_ready.connect(self.drain_serial_lines)
+        self.serial_thread.capture_error.connect(self.on_capture_error)
         self.serial_thread.connection_status.connect(self.update_connection_status)
+        self.serial_thread.reconnecting.connect(self.update_reconnect_status)
+        self.serial_thread.reconnected.connect(self.on_reconnected)
+        self.serial_thread.link_sample.connect(self.on_link_sample)
+        self.serial_thread.baud_detected.connect(self.on_baud_detected)
     
-    def apply_dark_theme(self):
-        """Aplicar tema oscuro"""
-        if self.is_dark_mode:
-            self.setStyleSheet("""
-                QMainWindow {
-                    background-color: #2c3e50;
-                    color: #ecf0f1;
-                }
-                QGroupBox {
-                    font-weight: bold;
-                    border: 2px solid #34495e;
-                    border-radius: 8px;
-                    margin-top: 1ex;
-                    padding-top: 8px;
-                    background-color: rgba(52, 73, 94, 0.3);
-                    color: #ecf0f1;
-                }
-                QGroupBox::title {
-                    subcontrol-origin: margin;
-                    left: 10px;
-                    padding: 0 5px 0 5px;
-                }
-                QPushButton {
-                    background-color: #3498db;
-                    border: none;
-                    color: white;
-                    padding: 8px 16px;
-                    text-align: center;
-                    font-size: 12px;
-                    font-weight: bold;
-                    border-radius: 6px;
-                    margin: 2px;
-                }
-                QPushButton:hover {
-                    background-color: #2980b9;
-                }
-                QPushButton:pressed {
-                    background-color: #21618c;
-                }
-                QComboBox {
-                    background-color: #34495e;
-                    border: 1px solid #555;
-                    border-radius: 4px;
-                    padding: 4px;
-                    color: #ecf0f1;
-                    font-size: 11px;
-                }
-                QComboBox::drop-down {
-                    border: none;
-                }
-                QComboBox::down-arrow {
-                    width: 12px;
-                    height: 12px;
-                }
-                QLabel {
-                    color: #ecf0f1;
-                }
-                QStatusBar {
-                    background-color: #34495e;
-                    color: #ecf0f1;
-                    border-top: 1px solid #555;
-                }
-                QFrame {
-                    background-color: rgba(52, 73, 94, 0.2);
-                    border: 1px solid #34495e;
-                    border-radius: 8px;
-                    margin: 2px;
-                }
-            """)
+    def apply_theme(self):
+        """Aplicar el tema actual a todas las ventanas de la aplicación"""
+        started = time.perf_counter()
+        app = QApplication.instance()
+        stylesheet = build_stylesheet()
+        if app.styleSheet() != stylesheet:
+            app.setStyleSheet(stylesheet)
+        
+        theme = 'dark' if self.is_dark_mode else 'light'
+        windows = [w for w in app.topLevelWidgets() if w.property("theme") != theme]
+        for window in windows:
+            set_style_property(window, "theme", theme)
+        if windows:
+            self.repolisher.schedule(windows, started)
     
     def refresh_ports(self):
         """Actualizar lista de puertos COM"""
@@ -855,131 +2955,675 @@ class ESP32Monitor(QMainWindow):
         if not self.serial_thread.is_running:
             # Conectar
             selected_port = self.port_combo.currentText().split(" - ")[0]
-            if self.serial_thread.connect_serial(selected_port):
+            baudrate = self.baud_combo.currentData()
+            auto_baud = baudrate is None
+            if auto_baud:
+                baudrate = self.serial_thread.baudrate
+            if self.serial_thread.connect_serial(selected_port, baudrate, auto_baud):
+                self.throughput.reset()
+                if auto_baud:
+                    self.log_message(f"🔍 Detectando la velocidad de {selected_port}...")
                 self.serial_thread.start()
                 self.connect_btn.setText("🔌 Desconectar")
-                self.connect_btn.setStyleSheet("background-color: #e74c3c;")
+                set_style_property(self.connect_btn, "role", "danger")
             else:
-                self.console_text.append(f"❌ Error al conectar al puerto {selected_port}")
+                self.log_message(f"❌ Error al conectar al puerto {selected_port}")
         else:
             # Desconectar
             self.serial_thread.disconnect_serial()
             self.connect_btn.setText("🔗 Conectar")
-            self.connect_btn.setStyleSheet("background-color: #3498db;")
+            set_style_property(self.connect_btn, "role", None)
+    
+    def on_baudrate_changed(self, index):
+        """Aplicar la velocidad elegida (con la conexión abierta, sin reconectar)"""
+        if not self.serial_thread.is_running:
+            return
+        baudrate = self.baud_combo.itemData(index)
+        self.serial_thread.set_baudrate(baudrate)
+        if baudrate is None:
+            self.log_message("🔍 Detectando la velocidad del puerto...")
+        else:
+            self.log_message(f"⚙️ Velocidad cambiada a {baudrate} baudios")
+        self.throughput.reset()
+    
+    def on_baud_detected(self, baudrate, lines):
+        """Informar el resultado de la detección automática de velocidad"""
+        if baudrate:
+            self.log_message(f"✅ Velocidad detectada: {baudrate} baudios "
+                             f"({lines} líneas del firmware reconocidas)")
+        else:
+            self.log_message(f"⚠️ No se detectó la velocidad: se mantiene {self.serial_thread.baudrate} "
+                             "baudios (¿el ESP32 está imprimiendo?)")
+        self.throughput.reset()
+    
+    def update_throughput(self):
+        """Mostrar el tráfico efectivo del enlace serial"""
+        thread = self.serial_thread
+        now = time.monotonic()
+        self.throughput.sample(now, thread.bytes_received, thread.lines_received)
+        if self.throughput_probe is not None:
+            self.throughput_probe.sample(now, thread.bytes_received, thread.lines_received)
+        self.update_queue_status()
+        rates = self.throughput.rates(thread.baudrate)
+        if rates is None or not thread.is_running:
+            return
+        self.throughput_label.setText(
+            f"📈 {rates['bytes_per_s'] / 1024:.1f} KB/s | {rates['lines_per_s']:.1f} líneas/s | "
+            f"{rates['utilization'] * 100:.0f}% de {thread.baudrate} baud"
+        )
+    
+    def on_queue_policy_changed(self, index):
+        """Aplicar la política de saturación elegida a la cola hacia la UI"""
+        self.serial_thread.line_queue.set_policy(self.queue_policy_combo.itemData(index))
+    
+    def update_queue_status(self):
+        """Mostrar la cola hacia la UI y avisar cuando empiezan los descartes"""
+        stats = self.serial_thread.line_queue.snapshot()
+        self.queue_label.setText(
+            f"📥 Cola UI: {stats['depth']}/{stats['capacity']} (máx {stats['high_water']}) | "
+            f"Descartadas: {stats['dropped']} | Fusionadas: {stats['coalesced']}"
+        )
+        if stats['dropped'] > self._queue_dropped:
+            if self._queue_dropped == 0:
+                where = "están en la captura" if self.serial_thread.capture else "sin captura en disco"
+                self.log_message(f"⚠️ La UI no da abasto: se descartan líneas en la consola ({where})")
+            self._queue_dropped = stats['dropped']
+    
+    def toggle_capture(self):
+        """Iniciar o detener la captura del serial a disco desde el menú"""
+        if self.serial_thread.capture is not None:
+            self.stop_capture()
+            return
+        
+        from PyQt6.QtWidgets import QFileDialog
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Capturar Serial a Disco",
+            f"esp32_captura_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            "Text Files (*.txt);;All Files (*)"
+        )
+        if filename:
+            self.start_capture(filename)
+        self.capture_action.setChecked(self.serial_thread.capture is not None)
+    
+    def start_capture(self, path):
+        """Escribir en `path` todas las líneas del ESP32 tal como llegan, sin descartes"""
+        try:
+            self.serial_thread.start_capture(path, self.wall_offset)
+        except OSError as e:
+            self.log_message(f"❌ No se pudo abrir la captura: {e}")
+            return
+        self.capture_action.setChecked(True)
+        self.log_message(f"📼 Capturando el serial en: {path}")
+    
+    def stop_capture(self):
+        """Cerrar la captura en curso"""
+        capture = self.serial_thread.stop_capture()
+        self.capture_action.setChecked(False)
+        if capture is not None:
+            self.log_message(f"✅ Captura guardada en: {capture.path} ({capture.lines} líneas)")
+    
+    def on_capture_error(self, message):
+        """Informar que la captura se detuvo por un error de escritura"""
+        self.capture_action.setChecked(False)
+        self.log_message(f"❌ {message}")
+    
+    def start_throughput_probe(self):
+        """Medir el tráfico durante THROUGHPUT_PROBE_SECONDS y reportarlo en la consola"""
+        if self.throughput_probe is not None:
+            return
+        thread = self.serial_thread
+        self.throughput_probe = ThroughputProbe(window=math.inf)
+        self.throughput_probe.sample(time.monotonic(), thread.bytes_received, thread.lines_received)
+        self.throughput_btn.setEnabled(False)
+        QTimer.singleShot(self.THROUGHPUT_PROBE_SECONDS * 1000, self.finish_throughput_probe)
+    
+    def finish_throughput_probe(self):
+        """Cerrar la medición en curso y reportar bytes/s, líneas/s y uso del enlace"""
+        probe, self.throughput_probe = self.throughput_probe, None
+        self.throughput_btn.setEnabled(True)
+        thread = self.serial_thread
+        probe.sample(time.monotonic(), thread.bytes_received, thread.lines_received)
+        rates = probe.rates(thread.baudrate)
+        if rates is None:
+            self.log_message("⚠️ Medición de throughput inválida (¿se reconectó el puerto?)")
+            return
+        capacity = thread.baudrate / ThroughputProbe.BITS_PER_BYTE
+        self.log_message(
+            f"📈 Throughput a {thread.baudrate} baud en {rates['seconds']:.1f} s: "
+            f"{rates['bytes_per_s']:.0f} B/s, {rates['lines_per_s']:.1f} líneas/s "
+            f"({rates['utilization'] * 100:.0f}% de {capacity:.0f} B/s)"
+        )
+        if rates['utilization'] >= ThroughputProbe.SATURATION:
+            self.log_message("⚠️ El enlace serial está saturado: sube la velocidad (firmware y monitor)")
     
     def update_connection_status(self, connected):
         """Actualizar estado de conexión"""
         if connected:
             self.status_bar.showMessage("✅ Conectado")
-            self.status_bar.setStyleSheet("background-color: #27ae60;")
+            set_style_property(self.status_bar, "state", "connected")
         else:
             self.status_bar.showMessage("❌ Desconectado")
-            self.status_bar.setStyleSheet("background-color: #e74c3c;")
+            set_style_property(self.status_bar, "state", "disconnected")
+    
+    def update_reconnect_status(self, attempt, delay):
+        """Mostrar el progreso de la reconexión automática"""
+        self.status_bar.showMessage(f"🔄 Reconectando... intento {attempt} (espera {delay:.2f} s)")
+        set_style_property(self.status_bar, "state", "reconnecting")
+    
+    def on_reconnected(self, port, downtime):
+        """Registrar en consola una reconexión exitosa"""
+        total = self.serial_thread.total_downtime
+        count = self.serial_thread.reconnect_count
+        self.log_message(
+            f"🔄 Reconectado a {port} tras {downtime:.2f} s sin datos "
+            f"(reconexiones: {count}, caída total: {total:.1f} s)"
+        )
+    
+    def drain_serial_lines(self):
+        """Procesar las líneas de SerialThread.line_queue por lotes
+        
+        Si tras DRAIN_BUDGET_MS aún quedan, se sigue en la próxima vuelta
+        del bucle de eventos para no congelar la UI. Nunca hay más de un
+        aviso pendiente en la cola de eventos de Qt."""
+        queue = self.serial_thread.line_queue
+        deadline = time.perf_counter() + self.DRAIN_BUDGET_MS / 1000.0
+        while True:
+            batch = queue.take(self.DRAIN_BATCH)
+            for data, host_time in batch:
+                self.process_serial_data(data, host_time)
+            if len(batch) < self.DRAIN_BATCH:
+                return
+            if time.perf_counter() >= deadline:
+                QTimer.singleShot(0, self.drain_serial_lines)
+                return
     
-    def process_serial_data(self, data):
+    def process_serial_data(self, data, host_time=None):
         """Procesar datos recibidos del serial"""
-        # Mostrar en consola con timestamp
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        self.console_text.append(f"[{timestamp}] {data}")
+        if host_time is None:
+            host_time = time.monotonic()
+        try:
+            events = esp32_protocol.parse_line(data)
+        except Exception:
+            events = []
+        
+        # Guardar en el historial y mostrar con la hora de llegada
+        self.record_console_line(data, host_time, esp32_protocol.line_type(data, events),
+                                 esp32_protocol.line_level(data))
+        
+        # Parsear datos específicos del ESP32
+        self.parse_esp32_data(data, host_time, events)
+    
+    def record_console_line(self, text, host_time, line_type, level):
+        """Agregar una línea al historial y, si pasa el filtro, a la consola"""
+        entry, collapsed = self.console_history.append(text, host_time, line_type, level)
+        if self.console_query is not None and not self.console_query.accepts(text, line_type, level):
+            return
+        
+        if collapsed and self._console_tail == entry:
+            # Repetición: actualizar el contador de la última línea
+            cursor = QTextCursor(self.console_text.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.movePosition(QTextCursor.MoveOperation.StartOfBlock,
+                                QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(self.format_console_entry(entry))
+        else:
+            self.console_text.appendPlainText(self.format_console_entry(entry))
+            self._console_tail = entry
         
         # Autodesplazar hacia abajo
         scrollbar = self.console_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
-        
-        # Parsear datos específicos del ESP32
-        self.parse_esp32_data(data)
     
-    def parse_esp32_data(self, data):
-        """Parsear datos específicos del ESP32"""
+    def log_message(self, text):
+        """Mostrar un mensaje propio del monitor (sin marca de tiempo)"""
+        self.record_console_line(text, time.monotonic(), 'monitor', esp32_protocol.line_level(text))
+    
+    def format_console_entry(self, entry):
+        """Texto de una entrada del historial tal como se ve en la consola"""
+        text, line_type, first_time, _, count = self.console_history.entry(entry)
+        if count > 1:
+            text = f"{text} (×{count})"
+        if line_type == 'monitor':
+            return text
+        timestamp = datetime.fromtimestamp(self.wall_offset + first_time).strftime("%H:%M:%S.%f")[:-3]
+        return f"[{timestamp}] {text}"
+    
+    def show_console_entries(self, entries):
+        """Reemplazar el contenido de la consola por estas entradas"""
+        self.console_text.setPlainText("\n".join(self.format_console_entry(int(entry))
+                                                 for entry in entries))
+        self._console_tail = int(entries[-1]) if len(entries) else None
+        scrollbar = self.console_text.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+    
+    def apply_console_search(self):
+        """Buscar en el historial con el texto y los filtros del panel"""
+        self.search_timer.stop()
+        line_type = self.search_type_combo.currentData()
         try:
-            # Buscar información de red
-            if "IP ESP32:" in data:
-                ip = data.split("IP ESP32:")[1].strip()
-                self.ip_label.setText(f"IP ESP32: {ip}")
-            
-            elif "IP Teléfono:" in data:
-                phone_ip = data.split("IP Teléfono:")[1].strip()
-                self.phone_ip_label.setText(f"IP Teléfono: {phone_ip}")
-            
-            elif "WiFi:" in data and "CONECTADO" in data:
-                self.wifi_status_label.setText("WiFi: ✅ CONECTADO")
-            
-            elif "Tiempo funcionamiento:" in data:
-                time_match = re.search(r"(\d+) segundos", data)
-                if time_match:
-                    seconds = int(time_match.group(1))
-                    hours, remainder = divmod(seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    self.uptime_label.setText(f"Tiempo: {hours:02d}:{minutes:02d}:{seconds:02d}")
-            
-            # Buscar datos de sensores
-            elif "Temperatura:" in data:
-                temp_match = re.search(r"Temperatura:\s*([0-9.-]+)", data)
-                if temp_match:
-                    temp = float(temp_match.group(1))
-                    self.sensor_data['temperature'] = temp
-                    self.temp_card.update_value(f"{temp:.1f}")
-                    
-                    # Agregar al gráfico
-                    current_time = len(self.temp_data)
-                    self.temp_data.append(temp)
-                    self.temp_times.append(current_time)
-                    
-                    # Mantener solo los últimos 100 puntos
-                    if len(self.temp_data) > 100:
-                        self.temp_data.pop(0)
-                        self.temp_times.pop(0)
-                        self.temp_times = list(range(len(self.temp_data)))
-                    
-                    self.temp_curve.setData(self.temp_times, self.temp_data)
-            
-            elif "Humedad:" in data:
-                hum_match = re.search(r"Humedad:\s*([0-9.-]+)", data)
-                if hum_match:
-                    humidity = float(hum_match.group(1))
-                    self.sensor_data['humidity'] = humidity
-                    self.humidity_card.update_value(f"{humidity:.1f}")
-            
-            elif "Luminosidad:" in data:
-                light_match = re.search(r"Luminosidad:\s*([0-9.-]+)", data)
-                if light_match:
-                    light = float(light_match.group(1))
-                    self.sensor_data['light'] = light
-                    self.light_card.update_value(f"{light:.0f}")
-            
-            # Buscar estados de LEDs
-            led_match = re.search(r"LED (\d+).*?GPIO (\d+).*?(ENCENDIDO|APAGADO|ON|OFF)", data)
-            if led_match:
-                led_num = led_match.group(1)
-                led_key = f"led{led_num}"
-                is_on = led_match.group(3) in ["ENCENDIDO", "ON"]
-                
-                if led_key in self.led_controls:
-                    self.led_controls[led_key].update_status(is_on)
-            
-            # Buscar contadores de mensajes
-            sent_match = re.search(r"Mensajes enviados:\s*(\d+)", data)
-            if sent_match:
-                count = sent_match.group(1)
-                self.messages_sent_label.setText(f"Enviados: {count}")
-            
-            received_match = re.search(r"Comandos recibidos:\s*(\d+)", data)
-            if received_match:
-                count = received_match.group(1)
-                self.messages_received_label.setText(f"Recibidos: {count}")
-                
+            query = ConsoleQuery(self.search_edit.text(), self.search_regex_check.isChecked(),
+                                 [line_type] if line_type else None,
+                                 self.search_level_combo.currentData())
+        except re.error as e:
+            self.search_status_label.setText(f"❌ Regex inválida: {e}")
+            return
+        
+        if query.is_empty:
+            # Volver a la consola en vivo con las últimas líneas
+            self.console_query = None
+            self.search_status_label.setText("")
+            total = len(self.console_history)
+            self.show_console_entries(range(max(0, total - self.CONSOLE_MAX_LINES), total))
+            return
+        
+        started = time.perf_counter()
+        entries = self.console_history.search(query, self.SEARCH_LIMIT)
+        elapsed = (time.perf_counter() - started) * 1e3
+        self.console_query = query
+        more = "+" if len(entries) >= self.SEARCH_LIMIT else ""
+        self.search_status_label.setText(f"🔍 {len(entries)}{more} coincidencias ({elapsed:.0f} ms)")
+        self.show_console_entries(entries)
+    
+    def parse_esp32_data(self, data, host_time=None, events=None):
+        """Parsear datos específicos del ESP32
+        
+        `events` evita volver a parsear si quien llama ya lo hizo."""
+        if host_time is None:
+            host_time = time.monotonic()
+        try:
+            if events is None:
+                events = esp32_protocol.parse_line(data)
+            for event in events:
+                self.apply_event(event, host_time)
         except Exception as e:
             # Error en parsing, ignorar silenciosamente
             pass
     
+    def apply_event(self, event, host_time):
+        """Reflejar en la interfaz un evento reconocido por esp32_protocol
+        
+        `host_time` es la llegada de la línea (time.monotonic())."""
+        field, value = event.field, event.value
+        if self.shared_state is not None:
+            self.shared_state.publish(event, host_time)
+        if field in self.DEVICE_INFO_FIELDS:
+            self.device_info[field] = value
+        
+        # Envíos UDP: seq, TEXTO y Timestamp llegan en líneas consecutivas
+        if field == 'udp_send_seq':
+            self._pending_udp_send = {'seq': value, 'payload': None}
+        
+        elif field == 'udp_payload':
+            if self._pending_udp_send is not None and self._pending_udp_send['payload'] is None:
+                self._pending_udp_send['payload'] = value
+        
+        elif field == 'device_ms':
+            if self.clock_sync.add_pair(value, host_time):
+                self.log_message("🔄 millis() del ESP32 volvió a empezar: reinicio detectado, "
+                                 "se reinicia la sincronización del reloj")
+            sent_at = self.clock_sync.to_host(value)
+            
+            # Sin receptor todo envío acabaría contado como perdido
+            send = self._pending_udp_send
+            if send is not None and send['payload'] is not None and self.udp_listening():
+                self.udp_analyzer.record_sent(send['seq'], send['payload'], value, sent_at)
+            self._pending_udp_send = None
+            
+            # Las lecturas de este ciclo toman la marca del dispositivo
+            for reading, position, shared_position, arrival in self._cycle_readings:
+                if host_time - arrival <= self.CYCLE_WINDOW:
+                    reading.device_ms = value
+                    reading.host_time = sent_at
+                    self.history[reading.sensor].restamp(position, sent_at, value)
+                    if shared_position is not None and self.shared_state is not None:
+                        self.shared_state.restamp(reading.sensor, shared_position, sent_at, value)
+            self._cycle_readings.clear()
+        
+        elif field in self.sensor_cards:
+            # Hasta que llegue el Timestamp del ciclo, la hora del
+            # dispositivo se estima con la sincronización (solo en el evento:
+            # los historiales la guardan como desconocida hasta el restamp)
+            event.host_time = host_time
+            event.device_ms = self.clock_sync.to_device(host_time)
+            self.update_sensor(event)
+        
+        elif field in self.led_controls:
+            self.led_states[field] = event
+            self.led_controls[field].set_state(value)
+        
+        elif field == 'ip_esp32':
+            self.ip_label.setText(f"IP ESP32: {value}")
+            self.network_panel.update_network_info(field, value)
+        
+        elif field == 'ip_phone':
+            self.phone_ip_label.setText(f"IP Teléfono: {value}")
+            self.network_panel.update_network_info(field, value)
+        
+        elif field == 'wifi_connected':
+            self.wifi_status_label.setText("WiFi: ✅ CONECTADO" if value else "WiFi: ❌ DESCONECTADO")
+            self.network_panel.update_network_info(field, value)
+        
+        elif field in ('ssid', 'gateway', 'local_port', 'remote_port'):
+            self.network_panel.update_network_info(field, value)
+        
+        # 'rssi_dbm' llega ya parseado por SerialThread.link_sample (on_link_sample)
+        
+        elif field == 'uptime_s':
+            hours, remainder = divmod(value, 3600)
+            minutes, seconds = divmod(remainder, 60)
+            self.uptime_label.setText(f"Tiempo: {hours:02d}:{minutes:02d}:{seconds:02d}")
+        
+        elif field == 'messages_sent':
+            self.messages_sent_label.setText(f"Enviados: {value}")
+        
+        elif field == 'commands_received':
+            self.messages_received_label.setText(f"Recibidos: {value}")
+    
+    def update_sensor(self, reading):
+        """Registrar una lectura, evaluar alarmas y actualizar su tarjeta"""
+        sensor, value = reading.sensor, reading.value
+        status = self.sensor_stats.update(sensor, value, reading.host_time)
+        card = self.sensor_cards[sensor]
+        
+        if math.isnan(value):
+            card.update_value("ERR", status)
+            return
+        
+        self.sensor_data[sensor] = reading
+        # reading.device_ms es una estimación: el millis() medido lo pone el
+        # Timestamp del ciclo (restamp) y solo entonces se marca como conocido
+        position = self.history[sensor].append(reading.host_time, value)
+        shared_position = None
+        if self.shared_state is not None:
+            shared_position = self.shared_state.append_reading(sensor, reading.host_time, value)
+        arrival = reading.host_time
+        self._cycle_readings = [entry for entry in self._cycle_readings
+                                if arrival - entry[-1] <= self.CYCLE_WINDOW]
+        self._cycle_readings.append((reading, position, shared_position, arrival))
+        decimals = 0 if sensor == 'light' else 1
+        card.update_value(f"{value:.{decimals}f}", status)
+        card.update_stats(self.sensor_stats.stats(sensor))
+        
+        if sensor == 'temperature':
+            self.update_temperature_plot()
+    
+    def update_temperature_plot(self):
+        """Graficar los últimos puntos del historial de temperatura"""
+        points = self.history['temperature'].latest(self.PLOT_POINTS)
+        self.temp_curve.setData(points['host_time'] - self.session_start, points['value'])
+    
     def update_ui(self):
         """Actualizar interfaz periódicamente"""
-        # Aquí puedes agregar actualizaciones periódicas si es necesario
-        pass
+        self._ui_ticks += 1
+        if self._ui_ticks % 5 == 0:  # Cada 500 ms
+            self.update_udp_stats()
+            self.update_clock_status()
+            self.update_throughput()
+    
+    def udp_listening(self):
+        """True mientras el receptor UDP está activo"""
+        return self.udp_listener is not None and self.udp_listener.isRunning()
+    
+    def toggle_udp_listener(self):
+        """Iniciar o detener la escucha de datagramas UDP
+        
+        Al detener, las métricas quedan congeladas: cubren solo el tiempo
+        escuchado y se reinician con la siguiente escucha."""
+        if self.udp_listening():
+            self.udp_listener.stop()
+            self.udp_listener.wait()
+            self.udp_listener = None
+            self.udp_listen_btn.setText("▶️ Escuchar")
+            return
+        
+        self.udp_analyzer.reset()
+        self.udp_listener = UdpListenerThread(self.udp_analyzer, self.udp_port_spin.value())
+        self.udp_listener.listener_error.connect(self.on_udp_listener_error)
+        self.udp_listener.start()
+        self.udp_listen_btn.setText("⏹️ Detener")
+    
+    def on_udp_listener_error(self, message):
+        """Informar de un fallo del receptor UDP"""
+        self.log_message(f"❌ {message}")
+        self.udp_listen_btn.setText("▶️ Escuchar")
+    
+    def update_udp_stats(self):
+        """Refrescar las métricas de entrega UDP (congeladas si no se escucha)"""
+        if self.udp_listening():
+            self.udp_analyzer.expire(time.monotonic())
+        stats = self.udp_analyzer.snapshot()
+        self.udp_delivery_label.setText(
+            f"Entregados: {stats['delivered']}/{stats['sent']} | "
+            f"Perdidos: {stats['lost']} ({stats['loss_rate'] * 100:.1f}%)"
+        )
+        self.udp_anomalies_label.setText(
+            f"Duplicados: {stats['duplicates']} | Reordenados: {stats['reordered']} | "
+            f"Sin correlación: {stats['unmatched']}"
+        )
+        mean_interval = stats['mean_interval_ms']
+        latency = stats['latency_ms']
+        self.udp_jitter_label.setText(
+            f"Jitter: {stats['jitter_ms']:.1f} ms | Intervalo medio: "
+            f"{'--' if math.isnan(mean_interval) else f'{mean_interval:.1f}'} ms"
+        )
+        self.udp_latency_label.setText(
+            "Latencia: -- ms" if math.isnan(latency) else
+            f"Latencia: {latency:.1f} ms (mín {stats['latency_min_ms']:.1f} | "
+            f"máx {stats['latency_max_ms']:.1f})"
+        )
+        self.jitter_bars.setOpts(height=stats['histogram'])
+    
+    def on_link_sample(self, rssi, host_time):
+        """Registrar una muestra de RSSI junto a la entrega UDP desde la anterior"""
+        if self.udp_listening():
+            self.udp_analyzer.expire(host_time)
+            self.link_history.record(host_time, rssi, self.udp_analyzer.snapshot())
+        else:
+            self.link_history.record(host_time, rssi, None)
+        self.network_panel.update_rssi(rssi)
+        
+        self.update_link_plot()
+    
+    def update_link_plot(self):
+        """Graficar el RSSI y su correlación con la entrega UDP"""
+        samples = self.link_history.latest(self.PLOT_POINTS)
+        self.rssi_curve.setData(samples['host_time'] - self.session_start, samples['rssi_dbm'])
+        if len(samples):
+            self.link_rssi_label.setText(f"RSSI: {samples['rssi_dbm'][-1]} dBm | "
+                                         f"Muestras: {len(self.link_history)}")
+        
+        loss = self.link_history.correlation('loss_rate')
+        latency = self.link_history.correlation('latency_ms')
+        self.link_correlation_label.setText(
+            f"Correlación RSSI ↔ pérdida: {'--' if math.isnan(loss) else f'{loss:+.2f}'} | "
+            f"↔ latencia: {'--' if math.isnan(latency) else f'{latency:+.2f}'}"
+        )
+    
+    def export_link_history(self):
+        """Guardar en CSV la serie de RSSI alineada con la entrega UDP"""
+        from PyQt6.QtWidgets import QFileDialog
+        
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Exportar Calidad del Enlace",
+            f"esp32_enlace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "CSV Files (*.csv);;All Files (*)"
+        )
+        
+        if filename:
+            samples = self.link_history.latest()
+            columns = [samples[name].astype(np.float64) for name in LinkQualityHistory.LINK_DTYPE.names]
+            columns[0] = columns[0] - self.session_start
+            np.savetxt(filename, np.column_stack(columns), delimiter=',',
+                       header='time_s,' + ','.join(LinkQualityHistory.LINK_DTYPE.names[1:]),
+                       comments='', fmt=('%.3f', '%d', '%d', '%d', '%.4f', '%.1f', '%.1f'))
+            self.log_message(f"✅ Calidad del enlace guardada en: {filename}")
+    
+    def update_clock_status(self):
+        """Mostrar el estado de la sincronización con el reloj del ESP32"""
+        sync = self.clock_sync.snapshot()
+        if not sync['pairs']:
+            return
+        self.clock_label.setText(
+            f"Reloj ESP32: deriva {sync['drift_ppm']:+.1f} ppm | "
+            f"disp. {sync['dispersion_ms']:.1f} ms | reinicios {sync['reboots']}"
+        )
+    
+    def toggle_profiling(self):
+        """Iniciar o detener la captura de perfil desde el menú"""
+        if self.profiler_session.is_active:
+            self.stop_profiling()
+        else:
+            self.start_profiling(self.PROFILE_DEFAULT_SECONDS)
+    
+    def start_profiling(self, seconds):
+        """Perfilar la UI y SerialThread durante `seconds` segundos"""
+        self.profiler_session.output_dir = self.profile_dir
+        self.profiler_session.start()
+        self.profile_action.setChecked(True)
+        self.log_message(f"⏱️ Perfilado iniciado ({seconds} s)")
+        session_start = self.profiler_session.started_at
+        
+        def finish():
+            # No detener una sesión posterior si esta ya se paró a mano
+            if self.profiler_session.started_at == session_start:
+                self.stop_profiling()
+        
+        QTimer.singleShot(int(seconds * 1000), finish)
+    
+    def stop_profiling(self):
+        """Detener el perfilado y mostrar dónde quedó la captura"""
+        paths = self.profiler_session.stop()
+        self.profile_action.setChecked(False)
+        for path in paths:
+            self.log_message(f"✅ Perfil guardado en: {path}")
+    
+    def start_shared_state(self, name=esp32_shared_state.DEFAULT_NAME):
+        """Publicar el estado del ESP32 en memoria compartida para otros procesos"""
+        try:
+            self.shared_state = esp32_shared_state.StatePublisher(name, wall_offset=self.wall_offset)
+        except (esp32_shared_state.SharedStateError, OSError, ValueError) as e:
+            self.log_message(f"❌ No se pudo publicar el estado compartido: {e}")
+            return
+        self.log_message(f"📡 Estado publicado en memoria compartida: '{name}' "
+                         f"(python esp32_shared_state.py --name {name})")
+    
+    def stop_shared_state(self):
+        """Dejar de publicar y eliminar el segmento compartido"""
+        if self.shared_state is not None:
+            self.shared_state.close()
+            self.shared_state = None
+    
+    def start_session(self, path=esp32_session.DEFAULT_PATH):
+        """Restaurar la sesión anterior y guardarla al cerrar y cada SNAPSHOT_INTERVAL_MS"""
+        self.session_path = path
+        self.restore_session(path)
+        self.snapshot_timer.start(self.SNAPSHOT_INTERVAL_MS)
+    
+    def save_session(self):
+        """Guardar historiales, últimos datos y el final de la consola"""
+        if self.session_path is None:
+            return
+        arrays = {sensor: history.latest() for sensor, history in self.history.items()}
+        arrays['link'] = self.link_history.latest()
+        arrays['console_text'], arrays['console_tail'] = \
+            self.console_history.export_tail(self.CONSOLE_MAX_LINES)
+        metadata = {
+            'saved_at': time.time(),
+            'wall_offset': self.wall_offset,   # host_time + wall_offset = hora real
+            'port': self.serial_thread.port_name,
+            'device': self.device_info,
+        }
+        try:
+            esp32_session.save_snapshot(self.session_path, arrays, metadata)
+        except OSError as e:
+            self.log_message(f"❌ No se pudo guardar la sesión: {e}")
+    
+    def restore_session(self, path):
+        """Mostrar la sesión guardada en `path` (si existe)
+        
+        Las horas guardadas se pasan al time.monotonic() actual con la hora
+        real, así la sesión anterior queda a la izquierda de la nueva en
+        los gráficos. El dashboard se restaura ya; la consola, que hay que
+        reindexar, en la siguiente vuelta del bucle de eventos."""
+        started = time.perf_counter()
+        try:
+            snapshot = esp32_session.SessionSnapshot(path)
+        except esp32_session.SnapshotError as e:
+            if os.path.exists(path):
+                self.log_message(f"⚠️ No se pudo restaurar la sesión: {e}")
+            return
+        except OSError as e:
+            self.log_message(f"⚠️ No se pudo restaurar la sesión: {e}")
+            return
+        
+        shift = snapshot.metadata.get('wall_offset', self.wall_offset) - self.wall_offset
+        readings = 0
+        for sensor, history in self.history.items():
+            if sensor not in snapshot:
+                continue
+            saved = snapshot.array(sensor)
+            if saved.dtype != history.HISTORY_DTYPE:
+                # Instantánea de una versión anterior del historial
+                self.log_message(f"⚠️ Historial de '{sensor}' en formato anterior: no se restaura")
+                continue
+            if not len(saved):
+                continue
+            history.extend(saved, shift)
+            readings += len(saved)
+            records = history.latest(min(len(saved), self.sensor_stats.window))
+            
+            # Última lectura y estadísticas sobre la ventana más reciente
+            last = records[-1]
+            self.sensor_data[sensor] = esp32_protocol.SensorReading(
+                sensor, last['value'], float(last['host_time']),
+                int(last['device_ms']) if last['has_device_ms'] else None)
+            status = self.sensor_stats.update_many(sensor, records['value'], records['host_time'])[-1]
+            card = self.sensor_cards[sensor]
+            decimals = 0 if sensor == 'light' else 1
+            card.update_value(f"{last['value']:.{decimals}f}", str(status))
+            card.update_stats(self.sensor_stats.stats(sensor))
+        self.update_temperature_plot()
+        
+        if 'link' in snapshot:
+            link = snapshot.array('link')
+            self.link_history.extend(link, shift)
+            if len(link):
+                self.network_panel.update_rssi(int(link['rssi_dbm'][-1]))
+                self.update_link_plot()
+        
+        # Últimos datos del dispositivo, como si acabaran de llegar
+        now = time.monotonic()
+        for field, value in snapshot.metadata.get('device', {}).items():
+            if field in self.led_controls:
+                event = esp32_protocol.LedState(int(field[3:]), value)
+            elif field in ('uptime_s', 'messages_sent', 'commands_received'):
+                event = esp32_protocol.CounterUpdate(field, value)
+            else:
+                event = esp32_protocol.NetworkInfo(field, value)
+            self.apply_event(event, now)
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        saved_at = datetime.fromtimestamp(snapshot.metadata.get('saved_at', time.time()))
+        
+        def restore_console():
+            if 'console_tail' in snapshot:
+                self.console_history.restore_tail(snapshot.array('console_text'),
+                                                  snapshot.array('console_tail'), shift)
+                self.show_console_entries(range(max(0, len(self.console_history) - self.CONSOLE_MAX_LINES),
+                                                len(self.console_history)))
+            snapshot.close()
+            self.log_message(f"♻️ Sesión del {saved_at:%Y-%m-%d %H:%M:%S} restaurada: "
+                             f"{readings} lecturas en {elapsed_ms:.1f} ms")
+        
+        QTimer.singleShot(0, restore_console)
     
     def clear_console(self):
-        """Limpiar la consola"""
+        """Limpiar la consola y su historial"""
         self.console_text.clear()
+        self.console_history.clear()
+        self._console_tail = None
     
     def save_log(self):
         """Guardar log de la consola"""
@@ -993,29 +3637,60 @@ class ESP32Monitor(QMainWindow):
         )
         
         if filename:
+            # Todo el historial, no solo lo visible en la consola
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.console_text.toPlainText())
-            self.console_text.append(f"✅ Log guardado en: {filename}")
+                for entry in range(len(self.console_history)):
+                    f.write(self.format_console_entry(entry) + "\n")
+            self.log_message(f"✅ Log guardado en: {filename}")
     
     def toggle_theme(self):
         """Cambiar entre tema claro y oscuro"""
         self.is_dark_mode = not self.is_dark_mode
-        if self.is_dark_mode:
-            self.apply_dark_theme()
-        else:
-            self.setStyleSheet("")  # Tema claro por defecto
+        self.apply_theme()
     
     def closeEvent(self, event):
         """Manejar cierre de la aplicación"""
+        if self.profiler_session.is_active:
+            self.stop_profiling()
+        if self.udp_listener is not None:
+            self.udp_listener.stop()
+            self.udp_listener.wait()
+        self.snapshot_timer.stop()
+        self.save_session()
+        self.stop_shared_state()
         self.serial_thread.disconnect_serial()
         self.serial_thread.quit()
         self.serial_thread.wait()
+        self.serial_thread.stop_capture()
         event.accept()
 
 
+def parse_arguments(argv):
+    """Leer las opciones propias; el resto se pasa a Qt"""
+    parser = argparse.ArgumentParser(description="ESP32 UDP Lab - Serial Monitor")
+    parser.add_argument('--profile', type=float, metavar='SEGUNDOS',
+                        help="Perfilar la UI y el hilo serial durante SEGUNDOS al iniciar")
+    parser.add_argument('--profile-dir', default="profiles",
+                        help="Directorio para las capturas de perfil (por defecto: profiles)")
+    parser.add_argument('--shared-state', default=esp32_shared_state.DEFAULT_NAME, metavar='NOMBRE',
+                        help="Segmento de memoria compartida donde se publica el estado "
+                             f"(por defecto: {esp32_shared_state.DEFAULT_NAME})")
+    parser.add_argument('--no-shared-state', action='store_true',
+                        help="No publicar el estado en memoria compartida")
+    parser.add_argument('--capture', metavar='ARCHIVO',
+                        help="Copiar todas las líneas del serial a ARCHIVO (formato de Guardar Log)")
+    parser.add_argument('--session', default=esp32_session.DEFAULT_PATH, metavar='ARCHIVO',
+                        help="Instantánea que se restaura al iniciar y se guarda al cerrar "
+                             f"(por defecto: {esp32_session.DEFAULT_PATH})")
+    parser.add_argument('--no-session', action='store_true',
+                        help="Empezar sin la sesión anterior y no guardarla")
+    return parser.parse_known_args(argv[1:])
+
+
 def main():
     """Función principal"""
-    app = QApplication(sys.argv)
+    args, qt_args = parse_arguments(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # Configurar aplicación
     app.setApplicationName("ESP32 UDP Lab Serial Monitor")
@@ -1024,8 +3699,18 @@ def main():
     
     # Crear y mostrar ventana principal
     window = ESP32Monitor()
+    window.profile_dir = args.profile_dir
+    if not args.no_session:
+        window.start_session(args.session)
+    if args.capture:
+        window.start_capture(args.capture)
+    if not args.no_shared_state:
+        window.start_shared_state(args.shared_state)
     window.show()
     
+    if args.profile:
+        window.start_profiling(args.profile)
+    
     # Ejecutar aplicación
     sys.exit(app.exec())
 
@@ -0,0 +1,139 @@
+"""
+ESP32 UDP Lab - Instantánea de sesión
+El monitor guarda al cerrar (y periódicamente) lo que tiene en memoria:
+historiales de lecturas, calidad del enlace, últimos datos del dispositivo y
+el final de la consola. Al arrancar mapea el archivo con mmap y solo se leen
+las páginas que se tocan, así el dashboard muestra la sesión anterior sin
+esperar datos nuevos.
+No depende de PyQt6.
+Autor: Daniel Araque Studios
+
+Uso:
+    save_snapshot("sesion.snap", {'temperature': lecturas}, {'wall_offset': offset})
+    with SessionSnapshot("sesion.snap") as snapshot:
+        readings = snapshot.array('temperature')   # vista sobre el mmap (sin copiar)
+
+Formato del archivo (little-endian):
+    [cabecera 16 B][índice JSON][secciones alineadas a 64 B]
+
+La cabecera lleva MAGIC, la versión del formato y la longitud del índice.
+El índice guarda los metadatos y, por sección, su dtype, forma y
+desplazamiento. Se escribe en un temporal que luego se renombra
+(os.replace): un cierre abrupto nunca deja una instantánea a medias.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+
+DEFAULT_PATH = "esp32_session.snap"
+MAGIC = b"ESP32SES"
+FORMAT_VERSION = 1
+HEADER_STRUCT = struct.Struct("<8sII")   # magic, versión, bytes del índice
+ALIGNMENT = 64
+
+
+class SnapshotError(Exception):
+    """El archivo no existe o no es una instantánea de este formato"""
+
+
+def _aligned(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def save_snapshot(path, arrays, metadata=None):
+    """Guardar arrays de NumPy y metadatos (JSON) en `path` de forma atómica
+
+    Retorna los bytes escritos."""
+    arrays = {name: np.asarray(values, order='C') for name, values in arrays.items()}
+    sections, offset = {}, 0
+    for name, values in arrays.items():
+        sections[name] = {
+            'dtype': np.lib.format.dtype_to_descr(values.dtype),
+            'shape': list(values.shape),
+            'offset': offset,   # relativo al inicio de las secciones
+        }
+        offset += _aligned(values.nbytes)
+    index = json.dumps({'metadata': metadata or {}, 'sections': sections},
+                       ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(HEADER_STRUCT.size + len(index))
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, len(index)))
+        f.write(index)
+        f.write(bytes(data_start - f.tell()))
+        for values in arrays.values():
+            f.write(memoryview(values).cast('B'))
+            f.write(bytes(_aligned(values.nbytes) - values.nbytes))
+        size = f.tell()
+    os.replace(temporary, path)
+    return size
+
+
+class SessionSnapshot:
+    """Instantánea mapeada en memoria (solo lectura)
+
+    Las secciones se entregan como vistas de NumPy sobre el mmap: no se
+    copia nada hasta que quien llama lo pide. El mapeo se libera al cerrar
+    y cuando ya no quedan vistas vivas."""
+
+    def __init__(self, path):
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < HEADER_STRUCT.size:
+                    raise SnapshotError(f"'{path}' no es una instantánea de sesión")
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise SnapshotError(f"No existe la instantánea '{path}'") from None
+
+        magic, version, index_size = HEADER_STRUCT.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"'{path}' no es una instantánea de sesión")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise SnapshotError(f"'{path}' usa el formato {version} (se esperaba {FORMAT_VERSION})")
+        try:
+            index = json.loads(self._mmap[HEADER_STRUCT.size:HEADER_STRUCT.size + index_size])
+        except ValueError as e:
+            self.close()
+            raise SnapshotError(f"Índice dañado en '{path}': {e}") from None
+
+        self.path = path
+        self.size = size
+        self.metadata = index['metadata']
+        self._sections = index['sections']
+        self._data_start = _aligned(HEADER_STRUCT.size + index_size)
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def names(self):
+        return list(self._sections)
+
+    def array(self, name):
+        """Vista de solo lectura de una sección (KeyError si no existe)"""
+        section = self._sections[name]
+        dtype = np.lib.format.descr_to_dtype(section['dtype'])
+        shape = tuple(section['shape'])
+        offset = self._data_start + section['offset']
+        if offset + dtype.itemsize * int(np.prod(shape)) > self.size:
+            raise SnapshotError(f"La sección '{name}' está truncada en '{self.path}'")
+        return np.ndarray(shape, dtype, buffer=self._mmap, offset=offset)
+
+    def close(self):
+        """Soltar el mapeo (las vistas que sigan vivas lo mantienen abierto)"""
+        self._mmap = None
@@ -0,0 +1,404 @@
+"""
+ESP32 UDP Lab - Estado en memoria compartida
+El monitor serial publica el último estado del ESP32 y un anillo de lecturas
+recientes en un segmento de multiprocessing.shared_memory. Otros procesos del
+mismo equipo lo leen sin abrir el puerto serial ni raspar logs.
+No depende de PyQt6.
+Autor: Daniel Araque Studios
+
+Uso (lector):
+    from esp32_shared_state import StateReader
+    with StateReader() as reader:
+        state = reader.read()                      # dict con el último estado
+        readings = reader.latest('temperature', 100)
+
+    python esp32_shared_state.py            # imprimir el estado actual
+    python esp32_shared_state.py --watch    # imprimir cada actualización
+
+Formato del segmento (little-endian, ver HEADER_DTYPE / STATE_DTYPE):
+    [cabecera 128 B][estado 128 B][anillo temperatura][anillo humedad][anillo luz]
+
+Sincronización tipo seqlock: el escritor incrementa `seq` antes y después de
+cada escritura, así `seq` es impar mientras escribe. El lector copia lo que
+necesita y la copia es válida si `seq` era par y no cambió entremedio.
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import esp32_protocol
+
+
+DEFAULT_NAME = "esp32_udp_lab"
+MAGIC = b"ESP32LAB"
+LAYOUT_VERSION = 2   # 2: las lecturas marcan aparte si traen millis()
+DEFAULT_RING_CAPACITY = 4096   # ~17 min a 4 Hz por sensor
+
+RING_SENSORS = ('temperature', 'humidity', 'light')
+COUNTERS = ('uptime_s', 'messages_sent', 'commands_received', 'udp_send_seq', 'device_ms')
+UNKNOWN_COUNTER = 0xFFFFFFFF
+UNKNOWN_FLAG = 0xFF
+
+# Una lectura: hora del host (time.monotonic()), millis() del ESP32 y valor.
+# Todo valor de 32 bits es un millis() válido (también justo antes de que se
+# desborde), así que si la lectura lo trae lo indica `has_device_ms`
+READING_DTYPE = np.dtype([('host_time', '<f8'), ('device_ms', '<u4'), ('value', '<f4'),
+                          ('has_device_ms', '?')])
+
+HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'layout', 'writer_pid', 'seq', 'published_at', 'wall_offset',
+              'ring_capacity', 'ring_written'],
+    'formats': ['S8', '<u4', '<u4', '<u8', '<f8', '<f8', '<u4', ('<u8', len(RING_SENSORS))],
+    'offsets': [0, 8, 12, 16, 24, 32, 40, 48],
+    'itemsize': 72,
+})
+HEADER_SIZE = 128
+
+STATE_DTYPE = np.dtype([
+    ('temperature', '<f8'), ('humidity', '<f8'), ('light', '<f8'), ('light_raw', '<f8'),
+    ('dht_error', '<f8'),
+    ('uptime_s', '<u4'), ('messages_sent', '<u4'), ('commands_received', '<u4'),
+    ('udp_send_seq', '<u4'), ('device_ms', '<u4'),
+    ('wifi_connected', 'u1'), ('leds', 'u1', (esp32_protocol.LED_COUNT,)),
+    ('ip_esp32', 'S16'), ('ip_phone', 'S16'),
+])
+STATE_SIZE = 128
+
+SEQ_OFFSET = HEADER_DTYPE.fields['seq'][1]
+
+# Los mismos formatos para struct: el lector decodifica una copia de bytes
+# (más rápido que convertir escalares de NumPy uno por uno)
+HEADER_STRUCT = struct.Struct(f"<8sIIQddI4x{len(RING_SENSORS)}Q")
+STATE_STRUCT = struct.Struct(f"<5d{len(COUNTERS)}IB{esp32_protocol.LED_COUNT}B16s16s")
+
+# Segmentos que este proceso publica (los elimina él, no el resource_tracker)
+_published = set()
+
+
+def segment_size(ring_capacity):
+    """Bytes del segmento para `ring_capacity` lecturas por sensor"""
+    return HEADER_SIZE + STATE_SIZE + len(RING_SENSORS) * ring_capacity * READING_DTYPE.itemsize
+
+
+class SharedStateError(Exception):
+    """El segmento no existe, no es de este formato o ya tiene escritor"""
+
+
+class _Segment:
+    """Vistas de NumPy sobre un segmento (comunes a escritor y lector)"""
+
+    def _map(self, shm, ring_capacity):
+        self.shm = shm
+        buf = shm.buf
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        self.seq = np.ndarray(1, '<u8', buffer=buf, offset=SEQ_OFFSET)
+        self.state = np.ndarray((), STATE_DTYPE, buffer=buf, offset=HEADER_SIZE)
+        self.rings = np.ndarray((len(RING_SENSORS), ring_capacity), READING_DTYPE, buffer=buf,
+                                offset=HEADER_SIZE + STATE_SIZE)
+        self.ring_written = self.header['ring_written']
+        self.ring_capacity = ring_capacity
+
+    def _unmap(self):
+        # Las vistas deben soltarse antes de cerrar el mmap
+        self.header = self.seq = self.state = self.rings = self.ring_written = None
+        self.shm.close()
+
+
+# ===============================
+#  Escritor (monitor serial)
+# ===============================
+class StatePublisher(_Segment):
+    """Publica el estado del ESP32 en memoria compartida (un solo escritor)
+
+    Si quedó un segmento de un monitor que terminó sin cerrarlo, se reutiliza;
+    si su escritor sigue vivo se lanza SharedStateError."""
+
+    def __init__(self, name=DEFAULT_NAME, ring_capacity=DEFAULT_RING_CAPACITY, wall_offset=None):
+        self.name = name
+        size = segment_size(ring_capacity)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            shm = self._take_over(name, size)
+        _published.add(name)
+        self._map(shm, ring_capacity)
+
+        # Impar mientras se inicializa (también si el escritor anterior murió escribiendo)
+        self.seq[0] = int(self.seq[0]) | 1
+        self.state[...] = np.zeros((), STATE_DTYPE)
+        for field in ('temperature', 'humidity', 'light', 'light_raw', 'dht_error'):
+            self.state[field] = math.nan
+        for field in COUNTERS:
+            self.state[field] = UNKNOWN_COUNTER
+        self.state['wifi_connected'] = UNKNOWN_FLAG
+        self.state['leds'] = UNKNOWN_FLAG
+        self.header['magic'] = MAGIC
+        self.header['layout'] = LAYOUT_VERSION
+        self.header['writer_pid'] = os.getpid()
+        self.header['ring_capacity'] = ring_capacity
+        self.header['ring_written'] = 0
+        self.header['wall_offset'] = time.time() - time.monotonic() if wall_offset is None else wall_offset
+        self.header['published_at'] = time.monotonic()
+        self.seq[0] += 1
+
+        # Vistas de 1 elemento: asignar en ellas es más barato que por nombre de campo
+        self._fields = {field: self.state[field].reshape(1) for field in
+                        ('temperature', 'humidity', 'light', 'light_raw', 'dht_error',
+                         'wifi_connected') + COUNTERS}
+        self._published_at = np.ndarray(1, '<f8', buffer=shm.buf,
+                                        offset=HEADER_DTYPE.fields['published_at'][1])
+
+    @staticmethod
+    def _take_over(name, size):
+        """Reutilizar un segmento huérfano con el mismo nombre"""
+        shm = _attach(name)
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        magic, pid = bytes(header['magic']), int(header['writer_pid'])
+        del header
+        if magic != MAGIC or name in _published or _process_alive(pid):
+            shm.close()
+            owner = f"el proceso {pid}" if magic == MAGIC else "otro programa"
+            raise SharedStateError(f"El segmento '{name}' ya está en uso por {owner}")
+        if shm.size < size:
+            # Huérfano de otro tamaño (otra capacidad o versión): se reemplaza
+            shm.unlink()
+            shm.close()
+            return shared_memory.SharedMemory(name=name, create=True, size=size)
+        if os.name != 'nt':
+            # Ahora es nuestro: que el resource_tracker lo limpie si morimos
+            from multiprocessing import resource_tracker
+            resource_tracker.register(shm._name, "shared_memory")
+        return shm
+
+    def publish(self, event, host_time):
+        """Reflejar un evento de esp32_protocol en el estado compartido"""
+        field, value = event.field, event.value
+        target = self._fields.get(field)
+        if target is None and not field.startswith('led') and field not in ('ip_esp32', 'ip_phone'):
+            return
+
+        self.seq[0] += 1
+        if target is not None:
+            target[0] = value
+        elif field in ('ip_esp32', 'ip_phone'):
+            self.state[field] = value.encode('ascii', 'replace')[:16]
+        else:
+            self.state['leds'][event.led - 1] = value
+        self._published_at[0] = host_time
+        self.seq[0] += 1
+
+    def append_reading(self, sensor, host_time, value, device_ms=None):
+        """Agregar una lectura al anillo del sensor; retorna su posición"""
+        index = RING_SENSORS.index(sensor)
+        written = int(self.ring_written[index])
+        position = written % self.ring_capacity
+        self.seq[0] += 1
+        self.rings[index, position] = (host_time, 0 if device_ms is None else device_ms,
+                                       value, device_ms is not None)
+        self.ring_written[index] = written + 1
+        self._published_at[0] = host_time
+        self.seq[0] += 1
+        return position
+
+    def restamp(self, sensor, position, host_time, device_ms):
+        """Corregir las marcas de tiempo de una lectura ya publicada"""
+        ring = self.rings[RING_SENSORS.index(sensor)]
+        self.seq[0] += 1
+        ring[position]['host_time'] = host_time
+        ring[position]['device_ms'] = device_ms
+        ring[position]['has_device_ms'] = True
+        self.seq[0] += 1
+
+    def close(self):
+        """Cerrar y eliminar el segmento"""
+        if self.shm is None:
+            return
+        self._fields = self._published_at = None
+        shm = self.shm
+        self._unmap()
+        shm.unlink()
+        _published.discard(self.name)
+        self.shm = None
+
+
+# ===============================
+#  Lector (otros procesos)
+# ===============================
+class StateReader(_Segment):
+    """Acceso de solo lectura al estado que publica el monitor
+
+    Las lecturas copian solo lo pedido (el estado ocupa ~100 bytes) y
+    reintentan si el escritor estaba a mitad de una actualización."""
+
+    MAX_RETRIES = 1000
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        try:
+            shm = _attach(name)
+        except FileNotFoundError:
+            raise SharedStateError(f"No hay estado publicado con el nombre '{name}' "
+                                   f"(¿está abierto el monitor?)") from None
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        magic, layout, capacity = bytes(header['magic']), int(header['layout']), int(header['ring_capacity'])
+        del header
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            shm.close()
+            raise SharedStateError(f"El segmento '{name}' no tiene el formato esperado "
+                                   f"(versión {layout}, se esperaba {LAYOUT_VERSION})")
+        self._map(shm, capacity)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Soltar el segmento (no lo elimina)"""
+        if self.shm is not None:
+            self._unmap()
+            self.shm = None
+
+    @property
+    def version(self):
+        """Contador de versión actual (par = estado consistente)"""
+        return int(self.seq[0])
+
+    def _consistent(self, copy):
+        """Ejecutar `copy()` hasta obtener una copia sin escrituras concurrentes"""
+        for _ in range(self.MAX_RETRIES):
+            before = int(self.seq[0])
+            if before & 1:
+                time.sleep(0)
+                continue
+            result = copy()
+            if int(self.seq[0]) == before:
+                return before, result
+        raise SharedStateError("El escritor no dejó leer un estado consistente")
+
+    def read(self):
+        """Último estado como dict (NaN / None = aún no recibido)"""
+        size = HEADER_SIZE + STATE_STRUCT.size
+        seq, raw = self._consistent(lambda: bytes(self.shm.buf[:size]))
+        header = HEADER_STRUCT.unpack_from(raw, 0)
+        state = STATE_STRUCT.unpack_from(raw, HEADER_SIZE)
+        published_at, wall_offset = header[4], header[5]
+
+        snapshot = {
+            'seq': seq,
+            'writer_pid': header[2],
+            'published_at': published_at,
+            'age_s': time.monotonic() - published_at,
+            'wall_time': published_at + wall_offset,
+        }
+        temperature, humidity, light, light_raw, dht_error = state[:5]
+        snapshot.update(temperature=temperature, humidity=humidity, light=light, light_raw=light_raw,
+                        dht_error=None if math.isnan(dht_error) else bool(dht_error))
+        for field, value in zip(COUNTERS, state[5:10]):
+            snapshot[field] = None if value == UNKNOWN_COUNTER else value
+        wifi = state[10]
+        snapshot['wifi_connected'] = None if wifi == UNKNOWN_FLAG else bool(wifi)
+        snapshot['leds'] = [None if led == UNKNOWN_FLAG else bool(led) for led in state[11:15]]
+        snapshot['ip_esp32'] = state[15].rstrip(b"\0").decode('ascii') or None
+        snapshot['ip_phone'] = state[16].rstrip(b"\0").decode('ascii') or None
+        return snapshot
+
+    def latest(self, sensor, n=None):
+        """Las últimas `n` lecturas del sensor (READING_DTYPE, orden cronológico)"""
+        index = RING_SENSORS.index(sensor)
+        ring = self.rings[index]
+
+        def copy():
+            written = int(self.ring_written[index])
+            count = min(written, self.ring_capacity) if n is None else min(n, written, self.ring_capacity)
+            end = written % self.ring_capacity
+            start = (end - count) % self.ring_capacity
+            if start + count <= self.ring_capacity:
+                return ring[start:start + count].copy()
+            return np.concatenate((ring[start:], ring[:end]))
+
+        return self._consistent(copy)[1]
+
+    def wait(self, version, timeout=None, interval=0.001):
+        """Esperar a que cambie el estado respecto de `version`; retorna la nueva
+        versión o None si se agotó el tiempo"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = int(self.seq[0])
+            if current != version and not current & 1:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+
+def _attach(name):
+    """Abrir un segmento existente sin que el resource_tracker lo elimine al salir"""
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name != 'nt' and name not in _published:
+        # Antes de Python 3.13 quien abre un segmento también lo registra y
+        # el resource_tracker lo borraría al terminar este proceso
+        from multiprocessing import resource_tracker
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+def _process_alive(pid):
+    """Indicar si el proceso `pid` sigue vivo"""
+    if pid == 0 or pid == os.getpid():
+        return False
+    if os.name == 'nt':
+        # En Windows el segmento desaparece con su último proceso: si existe, hay dueño
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def format_state(state):
+    """Una línea de texto con el estado (para la línea de comandos)"""
+    leds = "".join("?" if led is None else ("●" if led else "○") for led in state['leds'])
+    return (f"[v{state['seq']}] 🌡️ {state['temperature']:.1f}°C 💧 {state['humidity']:.1f}% "
+            f"☀️ {state['light']:.0f}% 💡 {leds} | millis {state['device_ms']} | "
+            f"hace {state['age_s'] * 1e3:.0f} ms")
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Lee el estado que publica el ESP32 Serial Monitor")
+    parser.add_argument('--name', default=DEFAULT_NAME, help=f"Nombre del segmento (por defecto: {DEFAULT_NAME})")
+    parser.add_argument('--watch', action='store_true', help="Imprimir cada actualización")
+    args = parser.parse_args(argv)
+
+    try:
+        reader = StateReader(args.name)
+    except SharedStateError as e:
+        sys.exit(f"❌ {e}")
+    with reader:
+        version = reader.version
+        print(format_state(reader.read()))
+        try:
+            while args.watch:
+                version = reader.wait(version)
+                print(format_state(reader.read()))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
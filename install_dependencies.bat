@@ -36,7 +36,7 @@ pip install -r requirements.txt
 if errorlevel 1 (
     echo.
     echo ❌ Error al instalar dependencias
-    echo Intenta ejecutar: pip install PyQt6 pyserial pyqtgraph
+    echo Intenta ejecutar: pip install PyQt6 pyserial pyqtgraph numpy
     pause
     exit /b 1
 )
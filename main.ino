@@ -32,6 +32,10 @@ bool estado2 = false;
 bool estado3 = false;
 bool estado4 = false;
 
+// 🔹 Velocidad del puerto serial (el monitor la detecta con "Auto").
+//    Los conversores USB de las placas ESP32 (CP2102/CH340) aceptan hasta 2000000.
+const unsigned long velocidadSerial = 115200;
+
 // 🔹 Variables para control de tiempo
 unsigned long ultimoEnvio = 0;
 const unsigned long intervaloEnvio = 250;  // 4Hz = 250ms entre envíos
@@ -391,7 +395,7 @@ void verificarConexionWiFi() {
 //  Setup
 // ===============================
 void setup() {
-  Serial.begin(115200);
+  Serial.begin(velocidadSerial);
   delay(1000); // Esperar estabilización del serial
   
   Serial.println("\n\n🚀🚀🚀 ESP32 UDP MICROCONTROLLER LAB 🚀🚀🚀");
@@ -481,7 +485,8 @@ void loop() {
   
   // Verificar si hay comandos en Serial Monitor
   if (Serial.available()) {
-    String comando = Serial.readString();
+    // Un comando por línea: el monitor puede enviar varios en una sola escritura
+    String comando = Serial.readStringUntil('\n');
     comando.trim();
     if (comando == "status" || comando == "estado") {
       mostrarEstadoSistema();
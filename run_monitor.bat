@@ -5,7 +5,7 @@ echo ========================================
 echo.
 
 REM Verificar si las dependencias están instaladas
-python -c "import PyQt6; import serial; import pyqtgraph" >nul 2>&1
+python -c "import PyQt6; import serial; import pyqtgraph; import numpy" >nul 2>&1
 if errorlevel 1 (
     echo ❌ Dependencias no instaladas
     echo Ejecuta primero: install_dependencies.bat
@@ -0,0 +1,7 @@
+"""Configuración de pytest: los módulos del monitor están en la raíz del repo"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,70 @@
+"""Pruebas de LineQueue: políticas de saturación entre SerialThread y la UI"""
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from esp32_serial_monitor import LineQueue
+
+
+SENSOR = "🔄 Leyendo sensores... 🌡️ 23.4°C, 💧 40.5% ☀️ 67% (raw:2745)"
+
+
+def device_traffic(cycles):
+    lines = []
+    for seq in range(cycles):
+        lines += [f"{SENSOR} #{seq}", f"📤 [{seq}] UDP → 192.168.43.138:4211",
+                  "   📋 TEXTO: 23.0;33.3;45;0;1;0;0;0;1", f"   ⏱️  Timestamp: {seq * 250}"]
+    return lines
+
+
+def fill(policy, lines, capacity):
+    queue = LineQueue(capacity=capacity, policy=policy)
+    queue.put_many(lines, 0.0)
+    return queue, [line for line, _ in queue.take(len(lines))]
+
+
+def test_replaced_readings_do_not_take_room():
+    lines = [f"{SENSOR} #{seq}" for seq in range(20)]
+    queue, delivered = fill('coalesce', lines, capacity=8)
+
+    stats = queue.snapshot()
+    assert stats['dropped'] == 0
+    assert stats['coalesced'] + len(delivered) == len(lines)
+    assert delivered[-1] == lines[-1]
+    assert len(queue) == 0
+
+
+def test_coalescing_keeps_more_lines_than_drop_oldest():
+    lines = device_traffic(100)
+    coalesce, kept = fill('coalesce', lines, capacity=64)
+    _, oldest = fill('drop_oldest', lines, capacity=64)
+
+    other = [line for line in kept if LineQueue.SENSOR_MARKER not in line]
+    other_oldest = [line for line in oldest if LineQueue.SENSOR_MARKER not in line]
+    assert len(other) > len(other_oldest)
+    assert kept[-1] == lines[-1]
+
+    stats = coalesce.snapshot()
+    assert stats['high_water'] <= 64
+    assert len(kept) + stats['dropped'] + stats['coalesced'] == len(lines)
+
+
+def test_depth_counts_only_live_lines():
+    queue = LineQueue(capacity=8)
+    queue.put_many([f"{SENSOR} #{seq}" for seq in range(6)], 0.0)
+    assert len(queue) == queue.snapshot()['depth'] == len(queue.take(100))
+
+
+def test_drop_newest_and_notification():
+    queue = LineQueue(capacity=4, policy='drop_newest')
+    assert queue.put_many(list("abcdef"), 0.0) is True
+    assert queue.put_many(["g"], 0.0) is False     # ya se avisó
+    assert [line for line, _ in queue.take(10)] == list("abcd")
+    assert queue.snapshot()['dropped'] == 3
+    assert queue.put_many(["h"], 0.0) is True      # se vació: nuevo aviso
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        LineQueue(policy='newest_first')
@@ -0,0 +1,48 @@
+"""Pruebas de esp32_log_analyzer: alineación temporal de las series"""
+
+import numpy as np
+
+import esp32_log_analyzer
+
+
+def write_log(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_fields_share_the_file_origin(tmp_path):
+    log = write_log(tmp_path / "sesion.txt", [
+        "[10:00:00.000] 🌡️ Temperatura: 25.0°C",
+        "[10:00:05.000] 🌡️ Temperatura: 25.5°C",
+        "[10:00:10.000] 📶 RSSI: -60 dBm",
+    ])
+    series, _, _ = esp32_log_analyzer.analyze([log], workers=1)
+
+    assert series['temperature'][0].tolist() == [0.0, 5.0]
+    assert series['rssi_dbm'][0].tolist() == [10.0]
+    assert series['rssi_dbm'][1].tolist() == [-60.0]
+
+
+def test_merged_files_keep_the_gap_between_them(tmp_path):
+    first = write_log(tmp_path / "a.txt", [
+        "[23:59:50.000] 🌡️ Temperatura: 20.0°C",
+        "[23:59:58.000] 📶 RSSI: -70 dBm",
+        "[00:00:02.000] 🌡️ Temperatura: 21.0°C",   # cruza medianoche
+    ])
+    second = write_log(tmp_path / "b.txt", [
+        "[00:01:00.000] 📶 RSSI: -65 dBm",
+        "[00:01:30.000] 🌡️ Temperatura: 22.0°C",
+    ])
+    series, _, _ = esp32_log_analyzer.analyze([first, second], workers=1)
+
+    assert series['temperature'][0].tolist() == [0.0, 12.0, 100.0]
+    assert series['rssi_dbm'][0].tolist() == [8.0, 70.0]
+
+
+def test_chunks_continue_the_same_timeline(tmp_path):
+    lines = [f"[10:00:{second:02d}.000] 🌡️ Temperatura: 25.0°C" for second in range(60)]
+    log = write_log(tmp_path / "sesion.txt", lines)
+    series, _, _ = esp32_log_analyzer.analyze([log], workers=1, chunk_size=256)
+
+    np.testing.assert_allclose(series['temperature'][0], np.arange(60.0))
+
@@ -0,0 +1,37 @@
+"""Pruebas de esp32_protocol.parse_line sobre las líneas de main.ino"""
+
+import math
+
+import esp32_protocol
+
+
+def fields(line):
+    return [(event.field, event.value) for event in esp32_protocol.parse_line(line)]
+
+
+def test_periodic_reading_line():
+    line = "🔄 Leyendo sensores... 🌡️ 23.4°C, 💧 40.5% ☀️ 67% (raw:2745)"
+    assert fields(line) == [('temperature', 23.4), ('humidity', 40.5),
+                            ('light', 67.0), ('light_raw', 2745.0)]
+
+
+def test_dht_error_then_light_on_next_line():
+    error = fields("🔄 Leyendo sensores... ❌ Error leyendo DHT11")
+    assert error[0] == ('dht_error', 1.0)
+    assert [field for field, _ in error] == ['dht_error', 'temperature', 'humidity']
+    assert all(math.isnan(value) for _, value in error[1:])
+    assert fields("☀️ 45% (raw:1843)") == [('light', 45.0), ('light_raw', 1843.0)]
+
+
+def test_udp_send_block():
+    assert fields("📤 [42] UDP → 192.168.43.138:4211") == [('udp_send_seq', 42)]
+    assert fields("   📋 TEXTO: 23.0;33.3;45;0;1;0;0;0;1") == [('udp_payload', "23.0;33.3;45;0;1;0;0;0;1")]
+    assert fields("   📊 Formato: temp;hum;luz;led1;led2;led3;led4;error_dht;wifi_ok") == []
+    assert fields("   ⏱️  Timestamp: 4294967295") == [('device_ms', 4294967295)]
+
+
+def test_status_block_counters_and_leds():
+    assert fields("   📤 Mensajes enviados: 14892") == [('messages_sent', 14892)]
+    assert fields("   📥 Comandos recibidos: 12") == [('commands_received', 12)]
+    assert fields("   LED 2 (GPIO 18): 🔴 OFF") == [('led2', False)]
+    assert fields("💡 TODOS LOS LEDs ENCENDIDOS") == [(f"led{i}", True) for i in range(1, 5)]
@@ -0,0 +1,22 @@
+"""Pruebas de esp32_shared_state: lecturas del anillo compartido"""
+
+import os
+
+import esp32_shared_state
+
+
+def test_reading_flags_device_time_separately():
+    name = f"esp32_test_{os.getpid()}"
+    publisher = esp32_shared_state.StatePublisher(name, ring_capacity=8)
+    try:
+        publisher.append_reading('temperature', 1.0, 23.0)
+        position = publisher.append_reading('temperature', 2.0, 23.5)
+        publisher.restamp('temperature', position, 2.5, 0xFFFFFFFF)   # justo antes del desborde
+
+        with esp32_shared_state.StateReader(name) as reader:
+            readings = reader.latest('temperature')
+        assert readings['has_device_ms'].tolist() == [False, True]
+        assert int(readings['device_ms'][1]) == 0xFFFFFFFF
+        assert readings['host_time'].tolist() == [1.0, 2.5]
+    finally:
+        publisher.close()